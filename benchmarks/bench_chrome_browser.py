@@ -0,0 +1,197 @@
+"""
+Benchmark the ChromeBrowser hot paths against a fake DevTools endpoint
+
+    $ python benchmarks/bench_chrome_browser.py
+    $ python benchmarks/bench_chrome_browser.py --sizes 10,1000 --repeat 5 \\
+    >         --latency 0.001 --json results.json
+    $ python benchmarks/bench_chrome_browser.py \\
+    >         --trace /tmp/chromeremote/chromelog.ndjson
+
+For every page size a fake_devtools server is started in a child process
+and load_page, _get_requests, get_content and get_cookies are timed on
+the same page repeat times. A further run with tracemalloc enabled
+records the peak Python heap of each phase, so tracing does not distort
+the timings. Neither Chrome nor a network is needed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+        __file__))))
+
+from chromeremote import AsyncChromeBrowser, ChromeBrowser  # noqa: E402
+from fake_devtools import (  # noqa: E402
+        load_trace, start_server_process, synthetic_trace)
+
+
+PHASES = ('load_page', '_get_requests', 'get_content', 'get_cookies')
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+
+def make_browser(port, work_dir, args):
+    browser_class = AsyncChromeBrowser if args.use_async else ChromeBrowser
+    return browser_class(
+            socket=port,
+            chrome_bin=sys.executable,
+            work_dir=work_dir,
+            remote_shell_timeout=5,
+            master_timeout=3600,
+            codec=args.codec,
+            wait_until=args.wait_until,
+    )
+
+
+def run_page(browser, work_dir, use_async, trace_memory=False):
+    """ Time one page with a running browser. Returns the seconds and,
+        with trace_memory, the peak traced bytes of every phase. """
+    browser.reset(work_dir)
+    loop = asyncio.new_event_loop() if use_async else None
+    calls = {
+            'load_page': lambda: browser.load_page('http://example.test/'),
+            '_get_requests': browser._get_requests,
+            'get_content': browser.get_content,
+            'get_cookies': browser.get_cookies,
+    }
+    times = {}
+    peaks = {}
+    try:
+        for phase in PHASES:
+            if trace_memory:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            result = calls[phase]()
+            if asyncio.iscoroutine(result):
+                loop.run_until_complete(result)
+            times[phase] = time.perf_counter() - start
+            if trace_memory:
+                peaks[phase] = tracemalloc.get_traced_memory()[1] - before
+        if use_async:
+            loop.run_until_complete(browser.shell.close())
+        elif browser.shell:
+            browser.shell.close()
+        browser.shell = False
+        browser.event_log.close()
+    finally:
+        if loop is not None:
+            loop.close()
+    return times, peaks
+
+
+def bench_size(events, requests, args):
+    server, port = start_server_process(
+            events,
+            latency=args.latency,
+            event_rate=args.event_rate,
+            body_size=args.body_size,
+    )
+    work_root = tempfile.mkdtemp(prefix='chromeremote-bench-')
+    try:
+        browser = make_browser(port, work_root, args)
+        samples = []
+        for i in range(args.repeat):
+            work_dir = os.path.join(work_root, 'run-{}'.format(i))
+            samples.append(run_page(browser, work_dir, args.use_async)[0])
+            shutil.rmtree(work_dir, ignore_errors=True)
+        tracemalloc.start()
+        try:
+            peaks = run_page(
+                    browser, os.path.join(work_root, 'traced'),
+                    args.use_async, trace_memory=True)[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        server.terminate()
+        server.join()
+        shutil.rmtree(work_root, ignore_errors=True)
+    result = {
+            'requests': requests,
+            'events': len(events),
+            # peak resident size of the benchmark process so far, in KiB
+            'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'phases': {},
+    }
+    for phase in PHASES:
+        values = [sample[phase] for sample in samples]
+        median = statistics.median(values)
+        result['phases'][phase] = {
+                'median': median,
+                'min': min(values),
+                'max': max(values),
+                'requests_per_second': requests / median if median else None,
+                'peak_bytes': peaks.get(phase),
+        }
+    return result
+
+
+def print_result(result):
+    print('{} requests, {} events, peak RSS {} KiB'.format(
+            result['requests'], result['events'], result['max_rss']))
+    print('  {:<14} {:>10} {:>10} {:>10} {:>12} {:>11}'.format(
+            'phase', 'median ms', 'min ms', 'max ms', 'requests/s',
+            'peak KiB'))
+    for phase, stats in result['phases'].items():
+        print('  {:<14} {:>10.1f} {:>10.1f} {:>10.1f} {:>12.0f} {:>11.0f}'
+              .format(
+                      phase,
+                      stats['median'] * 1000,
+                      stats['min'] * 1000,
+                      stats['max'] * 1000,
+                      stats['requests_per_second'] or 0,
+                      (stats['peak_bytes'] or 0) / 1024,
+              ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument(
+            '--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+            help='comma separated request counts of the synthetic pages')
+    parser.add_argument('--trace', help='replay this chromelog instead')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--body-size', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds before each response')
+    parser.add_argument('--event-rate', type=float, default=None,
+                        help='events per second, default unlimited')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='benchmark AsyncChromeBrowser')
+    parser.add_argument('--codec', help='json or orjson')
+    parser.add_argument(
+            '--wait-until', default='networkidle0',
+            help='load_page condition; networkidle0 adds its 0.5s idle time')
+    parser.add_argument('--json', help='also write the results here')
+    args = parser.parse_args()
+    results = []
+    if args.trace:
+        events = load_trace(args.trace)
+        requests = len(set(
+                event['params']['requestId'] for event in events
+                if event['method'] == 'Network.requestWillBeSent'))
+        workloads = [(events, requests)]
+    else:
+        workloads = [
+                (synthetic_trace(int(size), args.body_size), int(size))
+                for size in args.sizes.split(',')
+        ]
+    for events, requests in workloads:
+        result = bench_size(events, requests, args)
+        print_result(result)
+        results.append(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
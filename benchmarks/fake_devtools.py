@@ -0,0 +1,441 @@
+"""
+Stand-in for the Chrome remote debugging endpoint
+
+    $ python benchmarks/fake_devtools.py --port 9222 --requests 1000
+    $ python benchmarks/fake_devtools.py --port 9222 \\
+    >         --trace /tmp/chromeremote/chromelog.ndjson --latency 0.002
+
+Serves /json, /json/version, /json/new and /json/close and a websocket
+for every path. Page.navigate replays the events of a page load, either
+recorded by ChromeBrowser (chromelog.ndjson, optionally compressed, or a
+JSON list of messages) or generated for a given number of requests.
+Network.getResponseBody answers with a body of the size the page load
+announced, Network.getAllCookies, Page.captureScreenshot and the Target
+commands with small fixed results; any other command gets an empty
+result. Every response is delayed by latency seconds and events are sent
+at up to event_rate per second.
+
+Only the standard library is used, so the server can run next to any
+client without extra packages.
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing
+import socketserver
+import struct
+import threading
+import time
+
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# events that ask for a reply the server does not give
+SKIPPED_EVENTS = ('Fetch.',)
+
+
+def synthetic_trace(requests=100, body_size=2000, chunk_size=65536):
+    """ Events of a page load with requests requests. Every 20th request
+        is served from the cache, every 50th redirected and every 100th
+        fails; bodies are announced in dataReceived events of up to
+        chunk_size bytes. """
+    events = []
+    timestamp = itertools.count()
+
+    def event(method, **params):
+        params['timestamp'] = 1000 + next(timestamp) * 0.0001
+        events.append({'method': method, 'params': params})
+
+    event('Page.frameStartedLoading', frameId='F1')
+    for i in range(requests):
+        request_id = '1000.{}'.format(i)
+        url = 'http://example.test/{}'.format(i)
+        resource_type = 'Document' if i == 0 else 'Image'
+        event('Network.requestWillBeSent', requestId=request_id,
+              request={'url': url, 'method': 'GET', 'headers': {}},
+              wallTime=1500000000.0, type=resource_type)
+        if i and i % 50 == 0:
+            event('Network.requestWillBeSent', requestId=request_id,
+                  request={'url': url + '/moved', 'method': 'GET',
+                           'headers': {}},
+                  redirectResponse={
+                          'url': url,
+                          'status': 301,
+                          'headers': {'Location': url + '/moved'},
+                          'mimeType': '',
+                  },
+                  wallTime=1500000000.0, type=resource_type)
+        if i and i % 20 == 0:
+            event('Network.requestServedFromCache', requestId=request_id)
+        event('Network.responseReceived', requestId=request_id,
+              type=resource_type,
+              response={
+                      'url': url,
+                      'status': 200,
+                      'statusText': 'OK',
+                      'mimeType': 'text/html' if i == 0 else 'image/png',
+                      'headers': {'Content-Length': str(body_size)},
+                      'encodedDataLength': 200,
+                      'protocol': 'http/1.1',
+              })
+        for offset in range(0, body_size, chunk_size):
+            length = min(chunk_size, body_size - offset)
+            event('Network.dataReceived', requestId=request_id,
+                  dataLength=length, encodedDataLength=length)
+        if i and i % 100 == 0:
+            event('Network.loadingFailed', requestId=request_id,
+                  errorText='net::ERR_CONNECTION_RESET', type=resource_type)
+        else:
+            event('Network.loadingFinished', requestId=request_id,
+                  encodedDataLength=body_size + 200)
+        if i == 0:
+            event('Page.domContentEventFired')
+    event('Page.loadEventFired')
+    event('Page.frameStoppedLoading', frameId='F1')
+    return events
+
+
+def load_trace(path):
+    """ The events of a log written by ChromeBrowser: NDJSON, gzip or
+        zstd compressed NDJSON, or a JSON list of messages. """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith('.gz'):
+        data = gzip.decompress(data)
+    elif path.endswith('.zst'):
+        import zstandard
+        data = zstandard.ZstdDecompressor().stream_reader(
+                io.BytesIO(data)).read()
+    text = data.decode('utf-8').strip()
+    if text.startswith('['):
+        messages = json.loads(text)
+    else:
+        messages = [json.loads(line) for line in text.splitlines() if line]
+    return [
+            message for message in messages
+            if 'method' in message and 'id' not in message
+            and not message['method'].startswith(SKIPPED_EVENTS)
+    ]
+
+
+def body_sizes(events, default=2000):
+    """ Response body size per requestId as announced by dataReceived
+        or loadingFinished events. """
+    received = {}
+    finished = {}
+    for event in events:
+        params = event.get('params', {})
+        if event['method'] == 'Network.dataReceived':
+            request_id = params['requestId']
+            received[request_id] = \
+                received.get(request_id, 0) + params.get('dataLength', 0)
+        elif event['method'] == 'Network.loadingFinished':
+            finished[params['requestId']] = params.get(
+                    'encodedDataLength', default)
+    sizes = dict(finished)
+    sizes.update(received)
+    return sizes
+
+
+class DevToolsHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        self.buffer = b''
+        self.send_lock = threading.Lock()
+        head = self._read_head()
+        if head is None:
+            return
+        request_line, headers = head
+        path = request_line.split()[1]
+        if headers.get('upgrade', '').lower() == 'websocket':
+            self._accept_websocket(headers)
+            self._serve_websocket()
+        else:
+            self._serve_http(path)
+
+    def _read_head(self):
+        while b'\r\n\r\n' not in self.buffer:
+            chunk = self.request.recv(65536)
+            if not chunk:
+                return None
+            self.buffer += chunk
+        head, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+        lines = head.decode('latin-1').split('\r\n')
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return lines[0], headers
+
+    def _serve_http(self, path):
+        server = self.server
+        host = 'localhost:{}'.format(server.server_address[1])
+        if path.startswith('/json/version'):
+            body = {
+                    'Browser': 'FakeDevTools/1.0',
+                    'Protocol-Version': '1.3',
+                    'webSocketDebuggerUrl':
+                        'ws://{}/devtools/browser/fake'.format(host),
+            }
+        elif path.startswith('/json/new'):
+            body = server.target_info(server.new_target())
+        elif path.startswith('/json/close'):
+            body = 'Target is closing'
+        else:
+            body = [server.target_info(t) for t in list(server.targets)]
+        payload = json.dumps(body).encode('utf-8')
+        self.request.sendall(
+                b'HTTP/1.1 200 OK\r\n'
+                b'Content-Type: application/json; charset=UTF-8\r\n'
+                b'Content-Length: ' + str(len(payload)).encode() + b'\r\n'
+                b'Connection: close\r\n\r\n' + payload)
+
+    def _accept_websocket(self, headers):
+        accept = base64.b64encode(hashlib.sha1(
+                (headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()
+        ).digest()).decode()
+        self.request.sendall((
+                'HTTP/1.1 101 Switching Protocols\r\n'
+                'Upgrade: websocket\r\n'
+                'Connection: Upgrade\r\n'
+                'Sec-WebSocket-Accept: {}\r\n\r\n'.format(accept)
+        ).encode())
+
+    def _serve_websocket(self):
+        while True:
+            frame = self._read_frame()
+            if frame is None:
+                return
+            opcode, payload = frame
+            if opcode == 0x8:
+                return
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode == 0x1:
+                self._handle_command(json.loads(payload.decode('utf-8')))
+
+    def _recv_exact(self, n):
+        while len(self.buffer) < n:
+            chunk = self.request.recv(max(65536, n - len(self.buffer)))
+            if not chunk:
+                return None
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def _read_frame(self):
+        head = self._recv_exact(2)
+        if head is None:
+            return None
+        opcode = head[0] & 0x0f
+        length = head[1] & 0x7f
+        if length == 126:
+            length = struct.unpack('>H', self._recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self._recv_exact(8))[0]
+        mask = self._recv_exact(4) if head[1] & 0x80 else None
+        payload = self._recv_exact(length)
+        if payload is None:
+            return None
+        if mask:
+            # unmask a word at a time instead of byte by byte
+            key = int.from_bytes((mask * (length // 4 + 1))[:length], 'big')
+            payload = (int.from_bytes(payload, 'big') ^ key).to_bytes(
+                    length, 'big')
+        return opcode, payload
+
+    def _send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            head = struct.pack('>BB', 0x80 | opcode, length)
+        elif length < 65536:
+            head = struct.pack('>BBH', 0x80 | opcode, 126, length)
+        else:
+            head = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+        with self.send_lock:
+            self.request.sendall(head + payload)
+
+    def send_message(self, message):
+        # compact like Chrome, which clients may rely on to sniff frames
+        self._send_frame(0x1, json.dumps(
+                message, separators=(',', ':')).encode('utf-8'))
+
+    def _handle_command(self, command):
+        server = self.server
+        method = command.get('method', '')
+        params = command.get('params', {})
+        session_id = command.get('sessionId')
+        result = server.command_result(method, params)
+        if server.latency:
+            time.sleep(server.latency)
+        response = {'id': command['id'], 'result': result}
+        if session_id:
+            response['sessionId'] = session_id
+        self.send_message(response)
+        if method == 'Page.navigate':
+            threading.Thread(
+                    target=self._replay, args=(session_id,), daemon=True,
+            ).start()
+
+    def _replay(self, session_id=None):
+        server = self.server
+        interval = 1.0 / server.event_rate if server.event_rate else 0
+        start = time.monotonic()
+        try:
+            for i, event in enumerate(server.events):
+                if session_id:
+                    event = dict(event, sessionId=session_id)
+                if interval:
+                    delay = start + i * interval - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.send_message(event)
+        except OSError:
+            # the client went away during the replay
+            pass
+
+
+class DevToolsServer(socketserver.ThreadingTCPServer):
+    """ Fake debugging endpoint replaying events on Page.navigate. Pass
+        port 0 to listen on a free port, see server_address. """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+            self,
+            events,
+            port=0,
+            latency=0.0,
+            event_rate=None,
+            body_size=2000,
+            cookies=10,
+    ):
+        super().__init__(('localhost', port), DevToolsHandler)
+        self.events = events
+        self.latency = latency
+        self.event_rate = event_rate
+        self.body_size = body_size
+        self.sizes = body_sizes(events, body_size)
+        self.cookies = [
+                {
+                        'name': 'cookie{}'.format(i),
+                        'value': 'value{}'.format(i),
+                        'domain': 'example.test',
+                        'path': '/',
+                }
+                for i in range(cookies)
+        ]
+        self.targets = []
+        self._target_ids = itertools.count(1)
+        self._bodies = {}
+        self.new_target()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def new_target(self):
+        target_id = 'FAKE{:08d}'.format(next(self._target_ids))
+        self.targets.append(target_id)
+        return target_id
+
+    def target_info(self, target_id):
+        return {
+                'id': target_id,
+                'type': 'page',
+                'title': '',
+                'url': 'about:blank',
+                'webSocketDebuggerUrl': 'ws://localhost:{}/devtools/page/{}'
+                .format(self.port, target_id),
+        }
+
+    def body(self, size):
+        if size not in self._bodies:
+            self._bodies[size] = base64.b64encode(b'x' * size).decode()
+        return self._bodies[size]
+
+    def command_result(self, method, params):
+        if method == 'Page.navigate':
+            return {'frameId': 'F1', 'loaderId': 'L1'}
+        if method == 'Network.getResponseBody':
+            size = self.sizes.get(params.get('requestId'), self.body_size)
+            return {'body': self.body(size), 'base64Encoded': True}
+        if method == 'Network.getAllCookies':
+            return {'cookies': self.cookies}
+        if method == 'Page.captureScreenshot':
+            return {'data': self.body(4096)}
+        if method == 'Target.createTarget':
+            return {'targetId': self.new_target()}
+        if method == 'Target.closeTarget':
+            if params.get('targetId') in self.targets:
+                self.targets.remove(params['targetId'])
+            return {'success': True}
+        if method == 'Target.createBrowserContext':
+            return {'browserContextId': 'CTX{}'.format(
+                    next(self._target_ids))}
+        if method == 'Target.attachToTarget':
+            return {'sessionId': 'S' + params.get('targetId', '')}
+        if method == 'Browser.getVersion':
+            return {'product': 'FakeDevTools/1.0'}
+        return {}
+
+
+def _serve(ready, events, kwargs):
+    server = DevToolsServer(events, **kwargs)
+    ready.send(server.port)
+    server.serve_forever()
+
+
+def start_server_process(events, **kwargs):
+    """ Run a DevToolsServer in a child process, so it does not compete
+        with the measured client for the GIL. Returns the process and the
+        port it listens on. """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+            target=_serve, args=(sender, events, kwargs), daemon=True)
+    process.start()
+    if not receiver.poll(30):
+        process.terminate()
+        raise RuntimeError('fake DevTools server did not start')
+    return process, receiver.recv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--port', type=int, default=9222)
+    parser.add_argument('--trace', help='chromelog to replay')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='requests of the synthetic page load')
+    parser.add_argument('--body-size', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds before each response')
+    parser.add_argument('--event-rate', type=float, default=None,
+                        help='events per second, default unlimited')
+    args = parser.parse_args()
+    if args.trace:
+        events = load_trace(args.trace)
+    else:
+        events = synthetic_trace(args.requests, args.body_size)
+    server = DevToolsServer(
+            events,
+            port=args.port,
+            latency=args.latency,
+            event_rate=args.event_rate,
+            body_size=args.body_size,
+    )
+    print('replaying {} events on port {}'.format(len(events), server.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
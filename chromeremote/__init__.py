@@ -1,2 +1,20 @@
 from .remote_shell import ChromeRemoteShell
-from .chrome_browser import ChromeBrowser
+from .chrome_browser import ChromeBrowser, ChromeStartupError
+from .pool import ChromeBrowserPool
+from .crawl import CrawlSummary, Manifest, crawl
+from .request_tracker import Request, RequestTracker
+from .content_store import ContentStore
+from .interception import BlockingPolicy
+from .body_stream import StreamPolicy
+from .metrics import Metrics
+from .artifacts import ArtifactWriter
+from .har import HarWriter
+from .deadline import Budget, DeadlineExceeded
+from .launch import LaunchProfile
+from .resources import (
+        ProcessTreeSampler, ResourceLimitExceeded, ResourceLimits)
+from .wait_conditions import (
+        AllOf, DOMContentLoaded, LoadEvent, NetworkIdle, Predicate,
+        WaitCondition)
+from .async_remote_shell import AsyncChromeRemoteShell
+from .async_chrome_browser import AsyncChromeBrowser
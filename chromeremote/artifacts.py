@@ -0,0 +1,119 @@
+"""
+Write page artifacts off the thread talking to Chrome
+
+    > writer = ArtifactWriter(workers=2, max_pending=64)
+    > writer.write_base64('/tmp/page/screenshot.jpg', data)
+    > writer.write_json('/tmp/page/cookies.json', cookies)
+    > writer.flush()                  # all files written
+
+Decoding, hashing, compressing and writing run on worker threads, most of
+it with the GIL released, while the browser keeps reading the websocket.
+At most max_pending artifacts are queued; submitting more blocks until a
+worker is done, so a slow disk slows the browser down instead of letting
+the queued bodies fill the memory. With workers=0 everything is written
+right away in the calling thread.
+"""
+
+import base64
+import concurrent.futures
+import json
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactWriter(object):
+
+    def __init__(self, workers=2, max_pending=64):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.written = 0
+        self.failed = 0
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._executor = None
+
+    def submit(self, func, *args):
+        """ Run func(*args) on a worker and return a
+            concurrent.futures.Future for its result. Failures are logged
+            and counted as well as set on the future. """
+        if not self.workers:
+            future = concurrent.futures.Future()
+            try:
+                future.set_result(self._run(func, args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._slots.acquire()
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                        self.workers, thread_name_prefix='artifacts')
+            future = self._executor.submit(self._run, func, args)
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def write_bytes(self, path, data):
+        return self.submit(_write_bytes, path, data)
+
+    def write_base64(self, path, data):
+        """ Decode data, base64 as Chrome sends binary data, and write it
+            to path. """
+        return self.submit(_write_base64, path, data)
+
+    def write_json(self, path, data, indent=4):
+        return self.submit(_write_json, path, data, indent)
+
+    def flush(self, timeout=None):
+        """ Wait until everything submitted so far is written. Returns
+            False if timeout expired first. """
+        with self._lock:
+            pending = list(self._pending)
+        if not pending:
+            return True
+        done, not_done = concurrent.futures.wait(pending, timeout)
+        return not not_done
+
+    def close(self):
+        """ Write what is queued and stop the workers. """
+        self.flush()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _run(self, func, args):
+        try:
+            result = func(*args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            logger.exception('writing artifact with {} failed'.format(
+                    getattr(func, '__name__', func)))
+            raise
+        with self._lock:
+            self.written += 1
+        return result
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+
+def _write_bytes(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _write_base64(path, data):
+    _write_bytes(path, base64.b64decode(data))
+
+
+def _write_json(path, data, indent):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=indent)
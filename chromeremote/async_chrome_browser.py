@@ -0,0 +1,481 @@
+"""
+Run Chrome with debugging console enabled, driven from asyncio
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import signal
+import time
+from datetime import datetime
+from .async_remote_shell import AsyncChromeRemoteShell
+from .chrome_browser import (
+        DEFERRED_TIMEOUT, SCREENSHOT_PARAMS, ChromeBrowser,
+        ChromeStartupError)
+from .chrome_profile import clone_profile
+from .cookies import cookie_list, cookie_params, load_cookies, save_cookies
+from .deadline import Budget, DeadlineExceeded
+from .dispatcher import CommandTimeout
+from .metrics import timed
+from .wait_conditions import make_condition
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncChromeBrowser(ChromeBrowser):
+    """ asyncio counterpart of ChromeBrowser.
+
+        Takes the same arguments; start_chrome, clean_chrome, reset,
+        open_page, close_page, tab, load_page, get_content, get_cookies,
+        flush_artifacts and the cookie and cache methods are coroutines,
+        so one event loop can drive many browsers and pages at once. Tabs
+        are not multiplexed as sessions: each has its own websocket, and
+        the Target commands creating and closing them run on the blocking
+        browser connection in an executor. """
+
+    # the shell reads its own websocket from the event loop, so tabs get
+    # one each instead of a session on the blocking browser connection
+    multiplex = False
+
+    @timed('console_setup')
+    async def _start_console(self):
+        self.shell = AsyncChromeRemoteShell(
+                host='localhost',
+                port=self.chrome_sock,
+                socket_timeout=self.remote_shell_timeout,
+                codec=self.codec,
+                metrics=self.metrics,
+        )
+        if self.ws_url:
+            await self.shell.connect_url(self.ws_url)
+        else:
+            await self.shell.connect()
+        self.event_stream = self.shell.events()
+        self.shell.add_listener(self._log_message)
+        self.shell.subscribe('Network.', self.tracker.handle_event)
+        if self.har:
+            self.shell.subscribe('Network.', self._har_event)
+            self.shell.subscribe('Page.', self._har_event)
+        commands = [
+                self.shell.send_command('Page.enable'),
+                self.shell.send_command('Network.enable'),
+                self.shell.send_command('DOMStorage.enable'),
+        ]
+        if self.user_agent:
+            commands.append(self.shell.send_command(
+                    'Network.setUserAgentOverride',
+                    {'userAgent': self.user_agent},
+            ))
+        if self.clear_browser_data:
+            commands.append(
+                    self.shell.send_command('Network.clearBrowserCache'))
+            commands.append(
+                    self.shell.send_command('Network.clearBrowserCookies'))
+        for method, params in self._cookie_jar_commands():
+            commands.append(self.shell.send_command(method, params))
+        if self._make_interceptor() is not None:
+            for method, params in self.interceptor.commands():
+                commands.append(self.shell.send_command(method, params))
+        futures = [await command for command in commands]
+        for response in await asyncio.gather(*futures):
+            if 'error' in response:
+                logger.warning('setup command got {}'.format(response))
+
+    def _send_later(self, method, params=None, callback=None):
+        """ Send a command from synchronous code without waiting and call
+            callback(response) when it is answered. """
+        async def send():
+            try:
+                future = await self.shell.send_command(method, params)
+                response = await future
+            except Exception as e:
+                response = {'error': {'message': str(e)}}
+            if callback is not None:
+                callback(response)
+        return asyncio.ensure_future(send())
+
+    async def _send_chrome(self, method, params=None, timeout=None,
+                           budget=None):
+        budget = budget or self.budget
+        limit = budget.timeout(timeout)
+        future = await self.shell.send_command(method, params)
+        try:
+            response = await self.shell.wait(future, limit)
+        except CommandTimeout:
+            if timeout is None or limit < timeout:
+                self._expire(budget)
+            raise
+        if 'error' in response:
+            logger.warning('{} {}: got {}'.format(method, params, response))
+        return response
+
+    def _drop_events(self):
+        if self.shell:
+            dropped = self.event_stream.clear()
+            if dropped:
+                logger.debug('dropped {} events of the last page'.format(
+                        dropped))
+
+    async def _read_data(self, condition):
+        self.domstorage_activities = 0
+        condition.start(self, time.monotonic())
+        while not condition.done(self, time.monotonic()):
+            if self._domstorage_loop():
+                logger.debug('looks like a DOMStorage loop. stopping it...')
+                await self._send_chrome('DOMStorage.disable')
+                self.domstorage_enabled = False
+            if self._loading_timeout():
+                logger.error(
+                        'timeout of {} seconds reached - stop loading'.format(
+                                self.wait_budget.seconds)
+                )
+                self.metrics.count_timeout('loading')
+                resp = await self._send_chrome('Page.stopLoading')
+                logger.debug('got {}'.format(resp))
+                self.stop_loading = True
+                break
+            await self.check_timeout()
+            try:
+                data = await self.event_stream.get(
+                        self._event_timeout(condition))
+            except asyncio.TimeoutError:
+                continue
+            if 'method' in data:
+                self._track_event(data)
+                condition.on_event(data, time.monotonic())
+
+    @timed('chrome_launch')
+    async def start_chrome(self):
+        chrome_dir = self.profile_dir
+        # the profile is no longer inside work_dir if it is persistent
+        for directory in (chrome_dir, self.work_dir):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+        if self._reuse_profile():
+            logger.debug('Reuse Chrome profile {}'.format(chrome_dir))
+        else:
+            logger.debug('Clone Chrome profile to {}...'.format(chrome_dir))
+            await self._in_executor(
+                    clone_profile, chrome_dir, self.profile_cache,
+                    self.profile_clone)
+        logger.debug('Start Chrome...')
+        chrome_args = self._chrome_args(chrome_dir)
+        logger.debug(' '.join(chrome_args))
+        p = await asyncio.create_subprocess_exec(
+                *chrome_args,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                start_new_session=True,
+        )
+        self.chrome_pid = p.pid
+        self.chrome_process = p
+        try:
+            await self._wait_until_ready()
+        except ChromeStartupError:
+            self.metrics.count_error('chrome_launch')
+            raise
+        logger.debug(
+                'Chrome PID: {} listening on port {}'.format(
+                        p.pid, self.chrome_sock)
+        )
+        self.start_time = datetime.now()
+        self.budget = Budget(self.master_timeout, 'page')
+        self.jar_contexts = set()
+        self._watch_resources()
+
+    async def recycle(self):
+        await self.clean_chrome()
+        await self.start_chrome()
+
+    async def clean_chrome(self):
+        try:
+            await self.flush_artifacts()
+            if self.shell and self.owner is None:
+                await self._save_cookie_jar()
+        finally:
+            try:
+                if self.owner is not None:
+                    # a tab leaves Chrome to its owner
+                    await self.close_page()
+                elif self.shell:
+                    await self.shell.close()
+            finally:
+                self.shell = False
+                self.event_log.close()
+                if self.owner is not None:
+                    await self._in_executor(self.artifacts.close)
+                else:
+                    if self.browser_shell:
+                        self.browser_shell.close()
+                        self.browser_shell = None
+                    self.target_id = None
+                    self.browser_context_id = None
+                    self.ws_url = None
+                    logger.debug('Kill Chrome...')
+                    await self._stop_chrome()
+
+    async def open_page(self, isolated=False):
+        await self.close_page()
+        await self._in_executor(self._open_target, isolated)
+
+    async def close_page(self):
+        self.finish_har()
+        await self._finish_deferred()
+        if self.shell:
+            await self._save_cookie_jar()
+            await self.shell.close()
+            self.shell = False
+        if self.target_id or self.browser_context_id:
+            await self._in_executor(self._close_target)
+
+    async def reset(self, work_dir=None):
+        self.finish_har()
+        await self._in_executor(self.artifacts.flush)
+        self._reset_page(work_dir)
+
+    async def tab(self, work_dir=None, isolated=False):
+        await self._in_executor(self._browser_connection)
+        tab = self._copy_tab(work_dir)
+        await tab.open_page(isolated=isolated)
+        return tab
+
+    def is_alive(self):
+        return (self.chrome_process is not None
+                and self.chrome_process.returncode is None)
+
+    async def _wait_until_ready(self):
+        """ Poll /json/version with exponential backoff until Chrome
+            answers, for at most startup_timeout seconds. """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.startup_timeout
+        delay = 0.01
+        while True:
+            if self.chrome_process.returncode is not None:
+                raise ChromeStartupError(
+                        'Chrome exited with {} during startup'.format(
+                                self.chrome_process.returncode))
+            version = await self._in_executor(self._get_version)
+            if version is not None:
+                logger.debug('Chrome ready after {:.3f}s: {}'.format(
+                        loop.time() - started, version.get('Browser')))
+                return version
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                await self._stop_chrome()
+                raise ChromeStartupError(
+                        'Chrome not ready on port {} after {}s'.format(
+                                self.chrome_sock, self.startup_timeout))
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+
+    @timed('chrome_shutdown')
+    async def _stop_chrome(self):
+        """ SIGTERM Chrome and its children, SIGKILL them if they did not
+            exit within shutdown_delay seconds and remove the profile. """
+        p = self.chrome_process
+        if p is not None and p.returncode is None:
+            self._signal_chrome(signal.SIGTERM)
+            try:
+                await asyncio.wait_for(p.wait(), self.shutdown_delay)
+            except asyncio.TimeoutError:
+                logger.warning('Chrome did not exit, killing it')
+                self._signal_chrome(signal.SIGKILL)
+                await p.wait()
+        if self.persistent_profile:
+            return
+        logger.debug('Remove chrome profile...')
+        await self._in_executor(
+                shutil.rmtree, self.profile_dir, True)
+
+    async def import_cookies(self, cookies):
+        if not self.shell:
+            await self._start_console()
+        if isinstance(cookies, str):
+            cookies = await self._in_executor(load_cookies, cookies)
+        return await self._send_chrome(
+                'Network.setCookies', {'cookies': cookie_params(cookies)})
+
+    async def export_cookies(self, path=None, budget=None):
+        if not self.shell:
+            await self._start_console()
+        cookies = cookie_list(await self._send_chrome(
+                'Network.getAllCookies', budget=budget))
+        path = path or self.cookie_jar
+        if path:
+            await self._in_executor(save_cookies, path, cookies)
+            logger.debug('{} cookies exported to {}'.format(
+                    len(cookies), path))
+        return cookies
+
+    async def clear_cache(self):
+        if not self.shell:
+            await self._start_console()
+        return await self._send_chrome('Network.clearBrowserCache')
+
+    async def clear_cookies(self):
+        if not self.shell:
+            await self._start_console()
+        return await self._send_chrome('Network.clearBrowserCookies')
+
+    async def _save_cookie_jar(self):
+        if not self.cookie_jar or not self.is_alive():
+            return
+        try:
+            # the page budget may be spent already
+            await self.export_cookies(budget=Budget(
+                    self.remote_shell_timeout, 'cookie_jar'))
+        except (CommandTimeout, DeadlineExceeded, OSError) as e:
+            logger.warning('saving cookies to {} failed: {}'.format(
+                    self.cookie_jar, e))
+
+    async def check_timeout(self, budget=None):
+        budget = budget or self.budget
+        if budget.expired():
+            self._expire(budget)
+        self.check_resources()
+
+    async def load_page(self, url, wait_until=None):
+        if not self.shell:
+            await self._start_console()
+        self.pages_loaded += 1
+        if self.har:
+            self._start_har(url)
+        condition = make_condition(wait_until or self.wait_until)
+        with self.metrics.phase('navigate'):
+            await self._send_chrome(
+                    'Page.navigate', {'url': url},
+                    budget=self._phase_budget('navigate'))
+        self.wait_budget = self._phase_budget('wait')
+        with self.metrics.phase('wait'):
+            await self._read_data(condition)
+        if len(self.open_requests) > 0:
+            logger.debug(
+                    'open requests: {}'.format(list(self.open_requests)))
+        await self._send_chrome('Page.stopLoading')
+        with self.metrics.phase('log_flush'):
+            self.event_log.flush()
+        logger.debug('{} messages logged to {}'.format(
+                self.event_log.written, self.chrome_log_file))
+        path = os.path.join(self.work_dir, 'screenshot.jpg')
+        if self.screenshot == 'defer':
+            self.deferred.append(self._send_later(
+                    'Page.captureScreenshot', SCREENSHOT_PARAMS,
+                    lambda response: self._save_screenshot(response, path)))
+        elif self.screenshot:
+            with self.metrics.phase('screenshot'):
+                response = await self._send_chrome(
+                        'Page.captureScreenshot', SCREENSHOT_PARAMS,
+                        budget=self._phase_budget('screenshot'))
+            self._save_screenshot(response, path)
+
+    async def flush_artifacts(self, timeout=None):
+        self.finish_har()
+        await self._finish_deferred(timeout)
+        return await self._in_executor(self.artifacts.flush, timeout)
+
+    async def _finish_deferred(self, timeout=None):
+        deferred, self.deferred = self.deferred, []
+        deferred = [task for task in deferred if not task.done()]
+        if not deferred:
+            return
+        if timeout is None:
+            timeout = self.phase_budgets.get('screenshot', DEFERRED_TIMEOUT)
+        done, pending = await asyncio.wait(deferred, timeout=timeout)
+        for task in pending:
+            logger.warning('deferred command not answered in {}s'.format(
+                    timeout))
+            task.cancel()
+
+    @timed('get_content')
+    async def get_content(self, concurrency=None, body_timeout=None):
+        """ Save the response bodies of all loaded requests to content_dir,
+            with up to concurrency bodies fetched at once. """
+        if concurrency is None:
+            concurrency = self.content_concurrency
+        if body_timeout is None:
+            body_timeout = self.body_timeout
+        if not os.path.exists(self.content_dir):
+            os.makedirs(self.content_dir)
+        cache_index_file = '{}/index.json'.format(self.content_dir)
+        cache_index = {}
+        budget = self._phase_budget('content')
+        await self._finish_streams(budget.timeout(body_timeout))
+        self._get_requests()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def fetch(req):
+            async with semaphore:
+                # the fetch that ran out of budget cancelled the others
+                budget.check()
+                response = None
+                try:
+                    response = await self._send_chrome(
+                            'Network.getResponseBody',
+                            {'requestId': req.id},
+                            timeout=body_timeout or None,
+                            budget=budget,
+                    )
+                except CommandTimeout:
+                    logger.debug('TIMEOUT REACHED')
+                return self._save_content(
+                        req, response, cache_index[req.id])
+
+        reqs = [req for req in self.reqs if self._has_content(req)]
+        for req in reqs:
+            cache_index[req.id] = {
+                'url': req.url,
+                'type': req.mime_type,
+            }
+        results = await asyncio.gather(
+                *[fetch(req) for req in reqs], return_exceptions=True)
+        errors = [
+                result for result in results
+                if isinstance(result, BaseException)]
+        if errors:
+            raise next((
+                    error for error in errors
+                    if isinstance(error, DeadlineExceeded)), errors[0])
+        saved = [future for future in results if future]
+        logger.debug('{} content files queued'.format(len(saved)))
+        self._index_streams(cache_index)
+        if self.content_store is not None and saved:
+            # the index holds the hashes computed by the writes
+            await asyncio.wait([
+                    asyncio.wrap_future(future) for future in saved])
+        self.artifacts.write_json(cache_index_file, cache_index)
+        logger.debug('cache index queued.')
+
+    async def _finish_streams(self, timeout):
+        streamer = self.body_streamer
+        if streamer is None or not streamer.active:
+            return
+        deadline = time.monotonic() + (timeout or self.remote_shell_timeout)
+        while streamer.active and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if streamer.active:
+            logger.warning('{} bodies still streaming'.format(
+                    streamer.active))
+
+    @timed('get_cookies')
+    async def get_cookies(self):
+        budget = self._phase_budget('cookies')
+        await self.check_timeout(budget)
+        response = {}
+        try:
+            response = await self._send_chrome(
+                    'Network.getAllCookies',
+                    timeout=self.remote_shell_timeout,
+                    budget=budget,
+            )
+        except CommandTimeout:
+            logger.debug('TIMEOUT REACHED WAITING FOR COOKIES')
+        logger.debug(
+                'queueing cookie log for {}...'.format(self.cookie_log_file))
+        self.artifacts.write_json(self.cookie_log_file, response)
+
+    async def _in_executor(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
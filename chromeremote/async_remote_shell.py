@@ -0,0 +1,306 @@
+""" asyncio client for remote debugging Google Chrome.
+
+    > crs = AsyncChromeRemoteShell(host='localhost', port=9222)
+    > await crs.connect()
+    > async with crs.events('Network.') as events:
+    >     await crs.execute('Page.navigate', {'url': url})
+    >     async for event in events:
+    >         ...
+
+    A reader task receives every frame of the websocket, resolves the
+    future of the command a response answers and hands events to
+    subscribers and event streams. Events are codec.Frame mappings that
+    are only parsed when their content is looked at. Requires the
+    websockets package (pip install chrome_remote_shell[async]).
+"""
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import time
+import urllib.request
+
+from .codec import Frame, get_codec
+from .dispatcher import (
+        CommandCancelled, CommandError, CommandTimeout, event_matches)
+
+
+logger = logging.getLogger(__name__)
+
+
+class EventStream(object):
+    """ Async iterator over the events matching pattern. When more than
+        maxsize events are queued the oldest ones are dropped. """
+
+    def __init__(self, shell, pattern='*', maxsize=10000):
+        self.shell = shell
+        self.pattern = pattern
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize)
+        self._closed = False
+
+    def put(self, event):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.shell.remove_stream(self)
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    def clear(self):
+        """ Drop the queued events. Returns how many were dropped. """
+        dropped = 0
+        while not self._queue.empty():
+            if self._queue.get_nowait() is None:
+                # keep the end of a closed stream
+                self._queue.put_nowait(None)
+                break
+            dropped += 1
+        return dropped
+
+    async def get(self, timeout=None):
+        """ Return the next event. Raises asyncio.TimeoutError when none
+            arrives within timeout and StopAsyncIteration once the stream
+            is closed. """
+        if timeout is None:
+            event = await self._queue.get()
+        else:
+            event = await asyncio.wait_for(self._queue.get(), timeout)
+        if event is None:
+            self._queue.put_nowait(None)
+            raise StopAsyncIteration
+        return event
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+class AsyncChromeRemoteShell(object):
+
+    def __init__(self, host='localhost', port=9222, socket_timeout=3,
+                 codec=None, metrics=None):
+        """ init """
+        self.host = host
+        self.port = port
+        self.socket_timeout = socket_timeout
+        self.codec = get_codec(codec)
+        self.metrics = metrics
+        self.soc = None
+        self.tablist = None
+        self.pending = {}
+        self._ids = itertools.count(1)
+        self._subscribers = collections.defaultdict(list)
+        self._listeners = []
+        self._streams = []
+        self._reader = None
+
+    async def connect(self, tab=None, update_tabs=True):
+        """ Open a websocket connection to the tab'th tab, defaulting to
+            the last one, and start the reader task. """
+        if update_tabs or not self.tablist:
+            await self.find_tabs()
+        numtabs = len(self.tablist)
+        if not tab:
+            tab = numtabs - 1
+        wsurl = self.tablist[tab]['webSocketDebuggerUrl']
+        return await self.connect_url(wsurl)
+
+    async def connect_url(self, wsurl):
+        """ Open a websocket connection to the debugger endpoint wsurl. """
+        import websockets
+        await self.close()
+        self.soc = await asyncio.wait_for(
+                websockets.connect(wsurl, max_size=None),
+                self.socket_timeout)
+        self._reader = asyncio.ensure_future(self._read_loop())
+        return self.soc
+
+    async def close(self):
+        """ Close websocket connection to remote browser. """
+        if self.soc:
+            await self.soc.close()
+            self.soc = None
+        if self._reader:
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+    async def find_tabs(self):
+        """ Request the list of tabs from host:port without blocking the
+            event loop. """
+        self.tablist = await self._get_json('/json')
+        return self.tablist
+
+    async def _get_json(self, path):
+        url = 'http://{}:{}{}'.format(self.host, self.port, path)
+
+        def fetch():
+            with urllib.request.urlopen(url, timeout=self.socket_timeout) \
+                    as f:
+                return json.loads(f.read().decode('utf-8'))
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, fetch)
+
+    async def send_command(self, method, params=None):
+        """ Send a command and return an asyncio.Future resolving to the
+            raw response message. """
+        command_id = next(self._ids)
+        message = {'id': command_id, 'method': method}
+        if params:
+            message['params'] = params
+        future = asyncio.get_running_loop().create_future()
+        future.method = method
+        future.sent_at = time.monotonic()
+        self.pending[command_id] = future
+        text = self.codec.dumps(message)
+        try:
+            await self.soc.send(text)
+        except Exception:
+            self.pending.pop(command_id, None)
+            raise
+        if self.metrics is not None:
+            self.metrics.count_sent(method, len(text))
+        return future
+
+    async def wait(self, future, timeout=None):
+        """ Wait for the response message of a sent command. """
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            for command_id, pending in list(self.pending.items()):
+                if pending is future:
+                    del self.pending[command_id]
+            future.cancel()
+            if self.metrics is not None:
+                self.metrics.count_timeout(future.method)
+            raise CommandTimeout('{} timed out after {}s'.format(
+                    future.method, timeout))
+
+    def cancel_all(self, exception=None):
+        """ Fail every command still waiting for its response with
+            exception, CommandCancelled by default. """
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(
+                        exception or CommandCancelled(future.method))
+
+    async def execute(self, method, params=None, timeout=None):
+        """ Send a command and return its result. """
+        future = await self.send_command(method, params)
+        response = await self.wait(future, timeout)
+        if 'error' in response:
+            raise CommandError(method, response['error'])
+        return response.get('result', {})
+
+    async def open_url(self, url):
+        """ Open a URL in the connected tab. """
+        if not self.soc:
+            await self.connect(tab=0)
+        future = await self.send_command('Page.navigate', {'url': url})
+        return await self.wait(future)
+
+    def subscribe(self, method, callback):
+        """ Call callback(event) for events named method, a domain prefix
+            like 'Network.' or '*'. """
+        self._subscribers[method].append(callback)
+
+    def unsubscribe(self, method, callback):
+        try:
+            self._subscribers[method].remove(callback)
+        except ValueError:
+            pass
+
+    def add_listener(self, callback):
+        """ Call callback(message, method) for every received frame. """
+        self._listeners.append(callback)
+
+    def events(self, pattern='*', maxsize=10000):
+        """ Return an EventStream of events matching pattern. Events are
+            queued from the moment the stream is created. """
+        stream = EventStream(self, pattern, maxsize)
+        self._streams.append(stream)
+        return stream
+
+    def remove_stream(self, stream):
+        try:
+            self._streams.remove(stream)
+        except ValueError:
+            pass
+
+    async def _read_loop(self):
+        try:
+            async for raw in self.soc:
+                self._dispatch(Frame(raw, self.codec))
+        except Exception as e:
+            logger.debug('reader stopped: {}'.format(e))
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(
+                            ConnectionError('connection closed'))
+            self.pending.clear()
+            for stream in list(self._streams):
+                stream.close()
+
+    def _dispatch(self, message):
+        if not isinstance(message, Frame):
+            message = Frame.from_message(message, self.codec)
+        if message.id is not None:
+            future = self.pending.pop(message.id, None)
+            method = getattr(future, 'method', None)
+            if self.metrics is not None:
+                self._count(message, method, future)
+            self._notify_listeners(message, method)
+            if future is not None and not future.done():
+                future.set_result(message.message)
+            return
+        method = message.method or ''
+        if self.metrics is not None:
+            self._count(message, method)
+        self._notify_listeners(message, method)
+        for pattern, callbacks in list(self._subscribers.items()):
+            if not event_matches(pattern, method):
+                continue
+            for callback in list(callbacks):
+                try:
+                    callback(message)
+                except Exception:
+                    logger.exception(
+                            'subscriber for {} failed'.format(method))
+        for stream in self._streams:
+            if event_matches(stream.pattern, method):
+                stream.put(message)
+
+    def _count(self, frame, method, future=None):
+        size = len(frame.raw) if frame.raw is not None else 0
+        self.metrics.count_received(method or 'unknown', size)
+        if future is not None:
+            self.metrics.observe_rtt(
+                    method, time.monotonic() - future.sent_at)
+            if frame.is_error:
+                self.metrics.count_error(method)
+
+    def _notify_listeners(self, message, method):
+        for listener in self._listeners:
+            try:
+                listener(message, method)
+            except Exception:
+                logger.exception('listener failed on {}'.format(method))
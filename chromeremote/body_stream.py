@@ -0,0 +1,317 @@
+"""
+Stream large response bodies to disk while the page loads
+
+    > streaming = StreamPolicy(
+    >         threshold=1024 * 1024,
+    >         max_body_size=100 * 1024 * 1024,
+    >         max_page_size=500 * 1024 * 1024,
+    >         mime_types=['video/', 'application/pdf'],
+    > )
+    > browser = ChromeBrowser(chrome_bin=chrome, streaming=streaming)
+
+Responses are paused at the Fetch response stage. A body announced larger
+than threshold is taken with Fetch.takeResponseBodyAsStream and read with
+IO.read, chunk_size bytes at a time, into a file in the content directory,
+so it never has to fit into memory. Reading stops at max_body_size, or
+when the bodies saved for the page reach max_page_size, and the body is
+marked truncated. The request is failed with Aborted afterwards: once its
+body was taken as a stream Chrome cannot hand it to the page any more.
+Documents, scripts and stylesheets are therefore never streamed unless
+render_types is emptied, however large they are.
+
+get_content lists the streamed bodies in index.json instead of fetching
+them again. It does not save bodies whose type does not match mime_types,
+bodies announced larger than max_body_size or anything past max_page_size.
+The bodies that were not streamed, render types and by default those
+without a Content-Length, are still fetched whole with
+Network.getResponseBody and held in memory while they are saved. Without
+max_body_size that is not capped, and a body without a Content-Length
+is fetched whatever max_body_size says.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+from .request_tracker import dict_intval
+
+
+logger = logging.getLogger(__name__)
+
+# the page breaks without these, so they are left to Chrome by default
+RENDER_RESOURCE_TYPES = ('Document', 'Script', 'Stylesheet')
+RENDER_MIME_TYPES = (
+        'text/html', 'application/xhtml+xml', 'text/css',
+        'text/javascript', 'application/javascript',
+        'application/x-javascript',
+)
+
+
+class StreamPolicy(object):
+
+    def __init__(
+            self,
+            threshold=1024 * 1024,
+            max_body_size=None,
+            max_page_size=None,
+            mime_types=None,
+            chunk_size=256 * 1024,
+            stream_unknown_size=False,
+            render_types=RENDER_RESOURCE_TYPES,
+    ):
+        self.threshold = threshold
+        self.max_body_size = max_body_size
+        self.max_page_size = max_page_size
+        # prefixes like 'image/' or full types like 'application/pdf'
+        self.mime_types = None if mime_types is None else tuple(mime_types)
+        self.chunk_size = chunk_size
+        # responses without Content-Length are streamed only if set, since
+        # a streamed body is not delivered to the page
+        self.stream_unknown_size = stream_unknown_size
+        # resource types, and their MIME types, that are never streamed
+        self.render_types = tuple(render_types)
+
+    def streams_type(self, resource_type, mime_type):
+        """ False for the resources a page needs to render. """
+        if not self.render_types:
+            return True
+        if resource_type is not None:
+            return resource_type not in self.render_types
+        return (mime_type or '').lower() not in RENDER_MIME_TYPES
+
+    def accepts_type(self, mime_type):
+        if self.mime_types is None:
+            return True
+        return (mime_type or '').lower().startswith(self.mime_types)
+
+
+class StreamedBody(object):
+
+    __slots__ = (
+            'request_id', 'fetch_id', 'url', 'mime_type', 'path', 'size',
+            'truncated', 'error', 'hash', 'handle', 'file', 'digest',
+            'complete',
+    )
+
+    def __init__(self, request_id, fetch_id, url, mime_type):
+        self.request_id = request_id
+        self.fetch_id = fetch_id
+        self.url = url
+        self.mime_type = mime_type
+        self.path = None
+        self.size = 0
+        self.truncated = False
+        self.error = None
+        self.hash = None
+        self.handle = None
+        self.file = None
+        self.digest = None
+        self.complete = False
+
+    def entry(self):
+        """ The index.json entry of the body. """
+        entry = {
+                'url': self.url,
+                'type': self.mime_type,
+                'size': self.size,
+                'streamed': True,
+                'truncated': self.truncated,
+        }
+        if self.hash is not None:
+            entry['hash'] = self.hash
+        elif self.path is not None:
+            entry['file'] = os.path.basename(self.path)
+        if self.error is not None:
+            entry['error'] = self.error
+        return entry
+
+
+class BodyStreamer(object):
+    """ Applies a StreamPolicy to one page connection.
+
+        send(method, params, callback) sends a command without waiting and
+        calls callback(response) when the response arrives. Bodies are
+        written to content_dir, or moved to content_store once complete
+        on the artifacts writer if one is given. """
+
+    def __init__(self, policy, send, content_dir, content_store=None,
+                 artifacts=None):
+        self.policy = policy
+        self.send = send
+        self.content_store = content_store
+        self.artifacts = artifacts
+        self.content_dir = content_dir
+        self.streams = {}
+        self.page_bytes = 0
+
+    def reset(self, content_dir=None):
+        """ Forget the bodies of the last page. """
+        for stream in self.streams.values():
+            if stream.file is not None:
+                stream.file.close()
+                os.unlink(stream.file.name)
+                stream.file = None
+        self.streams = {}
+        self.page_bytes = 0
+        if content_dir is not None:
+            self.content_dir = content_dir
+
+    @property
+    def active(self):
+        return sum(1 for s in self.streams.values() if not s.complete)
+
+    def fetch_patterns(self):
+        return [{'urlPattern': '*', 'requestStage': 'Response'}]
+
+    def room(self, size=0):
+        """ Bytes that may still be saved for a body of size bytes, or
+            None if there is no limit. """
+        limits = []
+        if self.policy.max_body_size is not None:
+            limits.append(self.policy.max_body_size - size)
+        if self.policy.max_page_size is not None:
+            limits.append(self.policy.max_page_size - self.page_bytes)
+        return max(0, min(limits)) if limits else None
+
+    def accepts(self, mime_type, content_length=None):
+        """ True if a body fetched after loading should be saved. """
+        if not self.policy.accepts_type(mime_type):
+            return False
+        limit = self.policy.max_body_size
+        if limit is not None and content_length is not None \
+                and content_length > limit:
+            return False
+        return self.room() != 0
+
+    def charge(self, size):
+        """ Count size bytes saved for the page, unless that exceeds
+            max_page_size. """
+        limit = self.policy.max_page_size
+        if limit is not None and self.page_bytes + size > limit:
+            return False
+        self.page_bytes += size
+        return True
+
+    def wants(self, params):
+        """ True if the response paused with params is to be streamed. """
+        if params.get('responseStatusCode') not in (200, 206):
+            return False
+        headers = dict(
+                (header['name'].lower(), header['value'])
+                for header in params.get('responseHeaders', ()))
+        size = dict_intval('content-length', headers)
+        if size is None:
+            if not self.policy.stream_unknown_size:
+                return False
+        elif size <= self.policy.threshold:
+            return False
+        mime_type = headers.get('content-type', '').split(';')[0].strip()
+        if not self.policy.streams_type(params.get('resourceType'),
+                                        mime_type):
+            return False
+        return self.accepts(mime_type) and self.room() != 0
+
+    def start(self, params):
+        request = params['request']
+        headers = dict(
+                (header['name'].lower(), header['value'])
+                for header in params.get('responseHeaders', ()))
+        stream = StreamedBody(
+                params.get('networkId', params['requestId']),
+                params['requestId'],
+                request['url'],
+                headers.get('content-type', '').split(';')[0].strip(),
+        )
+        self.streams[stream.request_id] = stream
+        logger.debug('streaming body of {}'.format(stream.url))
+        self.send(
+                'Fetch.takeResponseBodyAsStream',
+                {'requestId': stream.fetch_id},
+                lambda response: self._opened(stream, response),
+        )
+
+    def _opened(self, stream, response):
+        if 'error' in response:
+            stream.error = response['error'].get('message')
+            self._finish(stream)
+            return
+        stream.handle = response['result']['stream']
+        try:
+            if not os.path.exists(self.content_dir):
+                os.makedirs(self.content_dir, exist_ok=True)
+            stream.path = os.path.join(self.content_dir, stream.request_id)
+            stream.file = open(stream.path + '.part', 'wb')
+        except OSError as e:
+            stream.error = str(e)
+            self._finish(stream)
+            return
+        if self.content_store is not None:
+            stream.digest = hashlib.new(self.content_store.algorithm)
+        self._read_next(stream)
+
+    def _read_next(self, stream):
+        self.send(
+                'IO.read',
+                {'handle': stream.handle, 'size': self.policy.chunk_size},
+                lambda response: self._read(stream, response),
+        )
+
+    def _read(self, stream, response):
+        if stream.complete:
+            return
+        if 'error' in response:
+            stream.error = response['error'].get('message')
+            self._finish(stream)
+            return
+        result = response['result']
+        if result.get('base64Encoded'):
+            data = base64.b64decode(result.get('data', ''))
+        else:
+            data = result.get('data', '').encode('utf-8')
+        room = self.room(stream.size)
+        if room is not None and len(data) > room:
+            data = data[:room]
+            stream.truncated = True
+        try:
+            stream.file.write(data)
+        except OSError as e:
+            stream.error = str(e)
+            self._finish(stream)
+            return
+        if stream.digest is not None:
+            stream.digest.update(data)
+        stream.size += len(data)
+        self.page_bytes += len(data)
+        if stream.truncated or result.get('eof'):
+            self._finish(stream)
+        else:
+            self._read_next(stream)
+
+    def _finish(self, stream):
+        stream.complete = True
+        if stream.handle is not None:
+            self.send('IO.close', {'handle': stream.handle})
+        self.send('Fetch.failRequest', {
+                'requestId': stream.fetch_id,
+                'errorReason': 'Aborted',
+        })
+        if stream.file is None:
+            return
+        stream.file.close()
+        stream.file = None
+        part = stream.path + '.part'
+        if self.content_store is not None:
+            stream.hash = stream.digest.hexdigest()
+            stream.path = None
+            # copying or compressing a large body takes a while
+            if self.artifacts is not None:
+                self.artifacts.submit(
+                        self.content_store.put_file, part, stream.hash)
+            else:
+                self.content_store.put_file(part, stream.hash)
+        else:
+            os.replace(part, stream.path)
+        stream.digest = None
+        logger.debug('streamed {} bytes of {}{}'.format(
+                stream.size, stream.url,
+                ' (truncated)' if stream.truncated else ''))
@@ -2,58 +2,74 @@
 Run Chrome with debugging console enabled
 """
 
-import base64
+import collections
+import concurrent.futures
+import copy
 import logging
 import os
+import shutil
 import subprocess
 import signal
 import time
 import json
 import sys
+import urllib.request
+import warnings
 import websocket
 from datetime import datetime
 from .remote_shell import ChromeRemoteShell
-from .chrome_profile import chrome_profile
+from .artifacts import ArtifactWriter
+from .body_stream import BodyStreamer
+from .chrome_profile import (
+        chrome_profile, clone_profile, persistent_profile_dir, profile_root,
+        remove_profile)
+from .codec import get_codec
+from .content_store import ContentStore
+from .cookies import cookie_list, cookie_params, load_cookies, save_cookies
+from .deadline import Budget, DeadlineExceeded
+from .dispatcher import CommandTimeout
+from .event_log import DEFAULT_EXCLUDE, EventLog
+from .har import HarWriter
+from .interception import BlockingPolicy, RequestInterceptor
+from .launch import launch_profile
+from .metrics import Metrics, timed
+from .request_tracker import REQUEST_EVENTS, RequestTracker
+# these used to be defined here and are still importable from here
+from .request_tracker import Request, dict_intval, dict_val  # noqa: F401
+from .resources import ResourceLimitExceeded, ResourceMonitor
+from .wait_conditions import make_condition
 
 
 logger = logging.getLogger(__name__)
 
+SCREENSHOT_PARAMS = {
+        'format': 'jpeg',
+        'quality': 80,
+}
+SCREENSHOT_MODES = (True, False, 'defer')
+# seconds flush_artifacts waits for a deferred screenshot, unless
+# phase_budgets has a 'screenshot' budget
+DEFERRED_TIMEOUT = 30
+# seconds of the page budget left for saving a page whose load is stopped,
+# at most a quarter of the budget
+LOADING_RESERVE = 20
 
-def dict_val(key, dictionary):
-    if key in dictionary:
-        return dictionary[key]
-    elif key.lower() in dictionary:
-        return dictionary[key.lower()]
-    return None
 
-
-def dict_intval(key, dictionary):
-    if dict_val(key, dictionary) is not None:
-        return int(dict_val(key, dictionary))
-    return None
-
-
-class Request(object):
-
-    def __init__(self, request_id):
-        self.id = request_id
-        self.failed = False
-        self.status_code = None
-        self.url = None
-        self.content_length = None
-        self.mime_type = None
-        self.complete = False
-        self.redirected = []
+class ChromeStartupError(Exception):
+    """ Chrome did not come up with its debugger listening. """
 
 
 class ChromeBrowser(object):
 
     profile = chrome_profile()
+    # tabs opened with open_page are flattened sessions on the browser
+    # connection rather than websockets of their own
+    multiplex = True
 
     def __init__(
             self,
             socket=9111,
-            startup_delay=4,
+            startup_delay=None,
             shutdown_delay=3,
             remote_shell_timeout=3,
             chrome_bin=None,
@@ -63,19 +79,64 @@ class ChromeBrowser(object):
             user_agent=False,
             master_timeout=120,
             extreme_debugging=False,
+            content_concurrency=8,
+            body_timeout=30,
+            chrome_log_compression=None,
+            chrome_log_include=None,
+            chrome_log_exclude=DEFAULT_EXCLUDE,
+            chrome_log_buffer=1000,
+            content_store=None,
+            clear_browser_data=None,
+            startup_timeout=30,
+            profile_cache=None,
+            profile_clone='auto',
+            wait_until='networkidle2',
+            blocking=None,
+            streaming=None,
+            codec=None,
+            metrics=None,
+            artifacts=None,
+            screenshot=True,
+            har=False,
+            persistent_profile=None,
+            cookie_jar=None,
+            phase_budgets=None,
+            launch=None,
+            resource_limits=None,
     ):
-        self.work_dir = work_dir
+        if screenshot not in SCREENSHOT_MODES:
+            raise ValueError('unknown screenshot mode {}'.format(screenshot))
         self.chrome_sock = socket
         self.chrome_pid = False
-        self.chrome_log_file = os.path.join(self.work_dir, 'chromelog.json')
-        self.cookie_log_file = os.path.join(self.work_dir, 'cookies.json')
-        self.content_dir = os.path.join(self.work_dir, 'content')
-        if content_dir:
-            self.content_dir = content_dir
-        self.open_requests = []
-        self.chrome_log = []
+        self.chrome_process = None
+        self.persistent_profile = persistent_profile
+        if persistent_profile:
+            self.profile_dir = persistent_profile_dir(
+                    persistent_profile, profile_cache)
+        else:
+            self.profile_dir = os.path.join(work_dir, 'chrome_profile')
+        self.cookie_jar = cookie_jar
+        # browser contexts the cookie jar was loaded into since launch
+        self.jar_contexts = set()
+        self.chrome_log_compression = chrome_log_compression
+        self.chrome_log_include = chrome_log_include
+        self.chrome_log_exclude = chrome_log_exclude
+        self.chrome_log_buffer = chrome_log_buffer
+        self._content_dir = content_dir
+        self._set_work_dir(work_dir)
+        if isinstance(content_store, str):
+            content_store = ContentStore(content_store)
+        self.content_store = content_store
+        self.tracker = RequestTracker()
         self.shell = False
-        self.startup_delay = startup_delay
+        if startup_delay is not None:
+            warnings.warn(
+                    'startup_delay is deprecated, use startup_timeout',
+                    DeprecationWarning,
+                    stacklevel=2,
+            )
+            startup_timeout = startup_delay
+        self.startup_timeout = startup_timeout
         self.shutdown_delay = shutdown_delay
         self.remote_shell_timeout = remote_shell_timeout
         self.chrome_bin = chrome_bin
@@ -86,187 +147,601 @@ class ChromeBrowser(object):
             logger.error('chrome binary not found')
             sys.exit(1)
         self.master_timeout = master_timeout
+        # seconds per phase: navigate, wait, screenshot, content, cookies
+        self.phase_budgets = dict(phase_budgets or {})
+        self.budget = Budget(master_timeout, 'page')
+        self.wait_budget = self.budget
         self.stop_loading = False
         self.domstorage_enabled = True
+        self.domstorage_activities = 0
         self.extreme_debugging = extreme_debugging
+        self.content_concurrency = content_concurrency
+        self.body_timeout = body_timeout
+        if clear_browser_data is None:
+            # a persistent profile is kept for its cache and cookies
+            clear_browser_data = not persistent_profile
+        self.clear_browser_data = clear_browser_data
+        self.ws_url = None
+        self.target_id = None
+        self.session_id = None
+        self.browser_context_id = None
+        self.browser_shell = None
+        self.owner = None
+        self.pages_loaded = 0
+        self.profile_cache = profile_cache
+        self.profile_clone = profile_clone
+        self.wait_until = wait_until
+        self.blocking = blocking
+        self.interceptor = None
+        self.streaming = streaming
+        self.body_streamer = None
+        self.codec = get_codec(codec)
+        self.metrics = metrics if metrics is not None else Metrics()
+        if artifacts is None or isinstance(artifacts, int):
+            artifacts = ArtifactWriter(
+                    workers=2 if artifacts is None else artifacts)
+        self.artifacts = artifacts
+        self.screenshot = screenshot
+        # commands answered after load_page returned: the screenshot
+        self.deferred = []
+        self.har = har
+        self.har_writer = None
+        # HAR files written to work_dir since the last reset
+        self.har_pages = 0
+        self.launch = launch_profile(launch)
+        self.resource_limits = resource_limits
+        self.resource_monitor = None
+        # why Chrome should be restarted after the current page, if at all
+        self.recycle_needed = None
 
-    def _receive_chrome(self):
-        response = json.loads(self.shell.soc.recv())
-        # logger.debug('got {}'.format(response))
-        self.chrome_log.append(response)
-        return response
+    def _set_work_dir(self, work_dir):
+        self.work_dir = work_dir
+        self.event_log = EventLog(
+                os.path.join(self.work_dir, 'chromelog.ndjson'),
+                compression=self.chrome_log_compression,
+                include=self.chrome_log_include,
+                exclude=self.chrome_log_exclude,
+                buffer_size=self.chrome_log_buffer,
+        )
+        self.chrome_log_file = self.event_log.path
+        self.chrome_log = self.event_log.recent
+        self.cookie_log_file = os.path.join(self.work_dir, 'cookies.json')
+        self.content_dir = os.path.join(self.work_dir, 'content')
+        if self._content_dir:
+            self.content_dir = self._content_dir
+
+    def reset(self, work_dir=None):
+        """ Forget everything recorded for the last page so the running
+            Chrome can be used for the next one. With work_dir the log,
+            cookie, screenshot and content files of the next page go
+            there. """
+        self.finish_har()
+        self.artifacts.flush()
+        self._reset_page(work_dir)
+
+    def _reset_page(self, work_dir=None):
+        self.event_log.close()
+        self._set_work_dir(work_dir or self.work_dir)
+        if not os.path.exists(self.work_dir):
+            os.makedirs(self.work_dir)
+        self.tracker.reset()
+        self._drop_events()
+        if self.body_streamer is not None:
+            self.body_streamer.reset(self.content_dir)
+        self.reqs = []
+        self.har_pages = 0
+        self.stop_loading = False
+        self.domstorage_enabled = True
+        self.domstorage_activities = 0
+        self.start_time = datetime.now()
+        self.budget = Budget(self.master_timeout, 'page')
+
+    def is_alive(self):
+        """ True while the Chrome process started by start_chrome runs. """
+        return (self.chrome_process is not None
+                and self.chrome_process.poll() is None)
+
+    def _browser_connection(self):
+        """ The shell connected to the browser endpoint, which creates,
+            attaches and closes the tabs. """
+        if not self.browser_shell:
+            self.browser_shell = ChromeRemoteShell(
+                    host='localhost',
+                    port=self.chrome_sock,
+                    socket_timeout=self.remote_shell_timeout,
+                    codec=self.codec,
+                    metrics=self.metrics,
+            )
+            self.browser_shell.connect_browser()
+        return self.browser_shell
+
+    def open_page(self, isolated=False):
+        """ Create a new tab, in a fresh browser context if isolated, and
+            make it the tab the next load_page runs in. """
+        self.close_page()
+        self._open_target(isolated)
+
+    def _open_target(self, isolated):
+        browser_shell = self._browser_connection()
+        if isolated:
+            self.browser_context_id = browser_shell.create_browser_context()
+        self.target_id = browser_shell.create_target(
+                'about:blank', self.browser_context_id)
+        if self.multiplex:
+            self.session_id = browser_shell.attach(self.target_id).session_id
+        else:
+            self.ws_url = 'ws://localhost:{}/devtools/page/{}'.format(
+                    self.chrome_sock, self.target_id)
+        logger.debug('opened tab {}'.format(self.target_id))
+
+    def close_page(self):
+        """ Close the tab and browser context created by open_page, after
+            saving its cookies to the cookie_jar. """
+        self.finish_har()
+        self._finish_deferred()
+        if self.shell:
+            self._save_cookie_jar()
+            self.shell.close()
+            self.shell = False
+        self._close_target()
+
+    def _close_target(self):
+        if self.target_id:
+            self.browser_shell.close_target(self.target_id)
+            self.target_id = None
+            self.session_id = None
+            self.ws_url = None
+        if self.browser_context_id:
+            self.browser_shell.dispose_browser_context(
+                    self.browser_context_id)
+            self.browser_context_id = None
+
+    def tab(self, work_dir=None, isolated=False):
+        """ A ChromeBrowser for a new tab of this Chrome, sharing its
+            browser connection, so one Chrome can load many pages at
+            once with a thread per tab. The tab writes its files to
+            work_dir; clean_chrome closes the tab, not Chrome. """
+        tab = self._copy_tab(work_dir)
+        tab.open_page(isolated=isolated)
+        return tab
+
+    def _copy_tab(self, work_dir):
+        self._browser_connection()
+        tab = copy.copy(self)
+        tab.owner = self
+        tab.shell = False
+        tab.target_id = None
+        tab.session_id = None
+        tab.browser_context_id = None
+        tab.ws_url = None
+        tab.interceptor = None
+        tab.body_streamer = None
+        tab.pages_loaded = 0
+        tab.har_writer = None
+        tab.deferred = []
+        tab.tracker = RequestTracker()
+        # a writer of its own, so flushing a tab waits for its files only
+        tab.artifacts = ArtifactWriter(
+                self.artifacts.workers, self.artifacts.max_pending)
+        # before reset, which closes the event log of the copy
+        tab._set_work_dir(work_dir or self.work_dir)
+        tab._reset_page()
+        return tab
+
+    def flush_artifacts(self, timeout=None):
+        """ Finish the HAR and wait until the screenshot, content and
+            cookie files queued so far are written. reset and clean_chrome
+            do this as well. """
+        self.finish_har()
+        self._finish_deferred(timeout)
+        return self.artifacts.flush(timeout)
+
+    def _finish_deferred(self, timeout=None):
+        """ Read the connection until the deferred commands are
+            answered, so their files are queued before a flush. """
+        deferred, self.deferred = self.deferred, []
+        deferred = [future for future in deferred if not future.done()]
+        if not deferred or not self.shell:
+            return
+        if timeout is None:
+            timeout = self.phase_budgets.get('screenshot', DEFERRED_TIMEOUT)
+        budget = Budget(timeout, 'deferred')
+        for future in deferred:
+            try:
+                future.wait(budget.timeout())
+            except (CommandTimeout, websocket.WebSocketException,
+                    OSError) as e:
+                logger.warning('deferred {} failed: {}'.format(
+                        future.method, e))
+
+    def _start_har(self, url):
+        """ Record the page loaded from url to page.har, or page-<n>.har
+            for the n-th page loaded since the last reset. """
+        self.finish_har()
+        self.har_pages += 1
+        name = 'page.har'
+        if self.har_pages > 1:
+            name = 'page-{}.har'.format(self.har_pages)
+        self.har_writer = HarWriter(
+                os.path.join(self.work_dir, name),
+                page_id='page_{}'.format(self.pages_loaded),
+                title=url,
+        )
+
+    def finish_har(self):
+        """ Write the pages of the HAR of the last load_page and close
+            it; later events are not recorded. """
+        if self.har_writer is not None:
+            self.har_writer.close()
+            self.har_writer = None
+
+    def _har_event(self, message):
+        if self.har_writer is not None:
+            self.har_writer.handle_event(message)
+
+    def _log_message(self, message, method):
+        self.event_log.write(message, method)
+        if method == 'Page.navigate' and message.id is not None:
+            # what arrived before the navigation started belongs to the
+            # previous page, even if no one called reset()
+            self._drop_events()
+
+    def _receive_chrome(self, timeout=None):
+        return self.shell.dispatcher.next_frame(timeout)
+
+    def _send_later(self, method, params=None, callback=None):
+        """ Send a command without waiting and call callback(response)
+            when it is answered. """
+        future = self.shell.send_command(method, params)
+        if callback is not None:
+            future.add_done_callback(
+                    lambda future: callback(_response(future)))
+        return future
 
-    def _send_chrome(self, data):
-        navcom = json.dumps(data)
-        self.shell.soc.send(navcom)
-        response = self._receive_chrome()
+    def _make_interceptor(self):
+        """ Set up the RequestInterceptor for blocking and streaming and
+            return it, or None if neither is configured. """
+        self.interceptor = None
+        self.body_streamer = None
+        if self.blocking is None and self.streaming is None:
+            return None
+        if self.streaming is not None:
+            self.body_streamer = BodyStreamer(
+                    self.streaming, self._send_later, self.content_dir,
+                    self.content_store, self.artifacts)
+        self.interceptor = RequestInterceptor(
+                self.blocking or BlockingPolicy(), self._send_later,
+                self.tracker, self.body_streamer)
+        self.shell.subscribe(
+                'Fetch.requestPaused', self.interceptor.on_request_paused)
+        return self.interceptor
+
+    def _send_chrome(self, method, params=None, budget=None):
+        budget = budget or self.budget
+        future = self.shell.send_command(method, params)
+        try:
+            response = future.wait(budget.timeout())
+        except CommandTimeout:
+            self._expire(budget)
         if 'error' in response:
-            logger.warning('{}: got {}'.format(data, response))
+            logger.warning('{} {}: got {}'.format(method, params, response))
         return response
 
+    @timed('console_setup')
     def _start_console(self):
-        self.shell = ChromeRemoteShell(
-                host='localhost',
-                port=self.chrome_sock,
-                socket_timeout=self.remote_shell_timeout,
-        )
-        self.shell.connect()
+        if self.session_id:
+            self.shell = self.browser_shell.session(
+                    self.session_id, self.target_id)
+        else:
+            self.shell = ChromeRemoteShell(
+                    host='localhost',
+                    port=self.chrome_sock,
+                    socket_timeout=self.remote_shell_timeout,
+                    codec=self.codec,
+                    metrics=self.metrics,
+            )
+            if self.ws_url:
+                self.shell.connect_url(self.ws_url)
+            else:
+                self.shell.connect()
+        self.shell.dispatcher.add_listener(self._log_message)
+        self.shell.subscribe('Network.', self.tracker.handle_event)
+        if self.har:
+            self.shell.subscribe('Network.', self._har_event)
+            self.shell.subscribe('Page.', self._har_event)
         logger.debug('Socket timeout: {}s'.format(self.shell.soc.gettimeout()))
-        self._send_chrome(
-                {"id": 0, "method": "Network.enable"})
-        self._send_chrome(
-                {"id": 0, "method": "DOMStorage.enable"})
+        # setup commands are pipelined and only their responses awaited
+        commands = [
+                self.shell.send_command('Page.enable'),
+                self.shell.send_command('Network.enable'),
+                self.shell.send_command('DOMStorage.enable'),
+        ]
         if self.user_agent:
-            self._send_chrome(
-                    {
-                            "id": 0,
-                            "method": "Network.setUserAgentOverride",
-                            "params": {
-                                    "userAgent": self.user_agent,
-                            }
-                    }
-            )
-        self._send_chrome(
-                {"id": 0, "method": "Network.clearBrowserCache"})
-        self._send_chrome(
-                {"id": 0, "method": "Network.clearBrowserCookies"})
+            commands.append(self.shell.send_command(
+                    'Network.setUserAgentOverride',
+                    {'userAgent': self.user_agent},
+            ))
+        if self.clear_browser_data:
+            commands.append(
+                    self.shell.send_command('Network.clearBrowserCache'))
+            commands.append(
+                    self.shell.send_command('Network.clearBrowserCookies'))
+        for method, params in self._cookie_jar_commands():
+            commands.append(self.shell.send_command(method, params))
+        if self._make_interceptor() is not None:
+            for method, params in self.interceptor.commands():
+                commands.append(self.shell.send_command(method, params))
+        for command in commands:
+            response = command.wait()
+            if 'error' in response:
+                logger.warning(
+                        '{}: got {}'.format(command.method, response))
+
+    def _cookie_jar_commands(self):
+        """ Setup commands loading the cookie jar, if there is one, once
+            per browser context and launch of Chrome. Loading it again
+            would overwrite the cookies set since. """
+        if not self.cookie_jar or not os.path.exists(self.cookie_jar):
+            return []
+        contexts = (self.owner or self).jar_contexts
+        if self.browser_context_id in contexts:
+            return []
+        contexts.add(self.browser_context_id)
+        cookies = cookie_params(load_cookies(self.cookie_jar))
+        logger.debug('loading {} cookies from {}'.format(
+                len(cookies), self.cookie_jar))
+        return [('Network.setCookies', {'cookies': cookies})]
+
+    def import_cookies(self, cookies):
+        """ Set cookies in Chrome: a file written by get_cookies or
+            export_cookies, its content or a list of cookies. """
+        if not self.shell:
+            self._start_console()
+        if isinstance(cookies, str):
+            cookies = load_cookies(cookies)
+        return self._send_chrome(
+                'Network.setCookies', {'cookies': cookie_params(cookies)})
+
+    def export_cookies(self, path=None, budget=None):
+        """ Return all cookies of Chrome and write them to path, by
+            default the cookie_jar, in the format of get_cookies. """
+        if not self.shell:
+            self._start_console()
+        cookies = cookie_list(self._send_chrome(
+                'Network.getAllCookies', budget=budget))
+        path = path or self.cookie_jar
+        if path:
+            save_cookies(path, cookies)
+            logger.debug('{} cookies exported to {}'.format(
+                    len(cookies), path))
+        return cookies
+
+    def clear_cache(self):
+        """ Empty the disk and memory cache of Chrome. """
+        if not self.shell:
+            self._start_console()
+        return self._send_chrome('Network.clearBrowserCache')
+
+    def clear_cookies(self):
+        """ Delete all cookies of Chrome, not those in the cookie_jar
+            file. """
+        if not self.shell:
+            self._start_console()
+        return self._send_chrome('Network.clearBrowserCookies')
+
+    def remove_profile(self):
+        """ Delete the profile with its cache and cookies, so the next
+            start_chrome begins with a fresh one. Chrome must not be
+            running. """
+        if self.is_alive():
+            raise RuntimeError('Chrome is still running on the profile')
+        if self.persistent_profile:
+            remove_profile(self.persistent_profile, self.profile_cache)
+        else:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def _reuse_profile(self):
+        """ True if start_chrome can use the persistent profile as it
+            is. """
+        if not self.persistent_profile:
+            return False
+        return os.path.isdir(os.path.join(self.profile_dir, profile_root))
+
+    @property
+    def open_requests(self):
+        return self.tracker.open
 
     def _get_requests(self, redirect_only=False):
-        requests = {}
-        for entry in self.chrome_log:
-            if 'method' not in entry \
-                    or not entry['method'].startswith('Network.'):
-                continue
-            rp = entry['params']
-            req_id = rp['requestId']
-            if entry['method'] == 'Network.requestWillBeSent':
-                if 'redirectResponse' in rp:
-                    rdr = rp['redirectResponse']
-                    last_req = requests[req_id]
-                    last_req.complete = True
-                    last_req.status_code = rdr['status']
-                    requests[req_id] = Request(req_id)
-                    if len(last_req.redirected) > 0:
-                        requests[req_id].redirected = last_req.redirected
-                        last_req.redirected = []
-                    requests[req_id].redirected.append(last_req)
-                else:
-                    requests[req_id] = Request(req_id)
-                requests[req_id].url = rp['request']['url']
-            elif entry['method'] == 'Network.requestServedFromCache':
-                requests[req_id] = Request(req_id)
-            elif entry['method'] == 'Network.responseReceived':
-                if req_id not in requests:
-                    continue
-                rpr = rp['response']
-                requests[req_id].mime_type = rpr['mimeType']
-                requests[req_id].status_code = rpr['status']
-                requests[req_id].content_length = dict_intval(
-                        'Content-Length', rpr['headers'])
-            elif entry['method'] == 'Network.loadingFinished':
-                if req_id not in requests:
-                    continue
-                requests[req_id].complete = True
-            elif entry['method'] == 'Network.loadingFailed':
-                requests[req_id].complete = True
-                requests[req_id].failed = True
-        for req in sorted(requests):
-            r = requests[req]
-            if r.url is None:
-                continue
-            if r.url.startswith('data'):
-                continue
-            if redirect_only:
-                if len(r.redirected) > 0:
-                    self.reqs.append(r)
-            else:
-                self.reqs.append(r)
+        if redirect_only:
+            self.reqs = self.tracker.redirected()
+        else:
+            self.reqs = self.tracker.all()
 
-    def _read_data(self, data=False):
-        domstorage_activities = 0
-        while True:
-            if data and 'method' in data:
-                if self.extreme_debugging:
-                    logger.debug('got data: {}'.format(data))
-                if data['method'] == 'Network.requestWillBeSent' \
-                        or data['method'] == 'Network.requestServedFromCache':
-                    request_id = data['params']['requestId']
-                    # logger.debug('open req {}'.format(request_id))
-                    if request_id not in self.open_requests:
-                        self.open_requests.append(request_id)
-                    domstorage_activities = 0
-                elif data['method'] == 'Network.loadingFinished':
-                    request_id = data['params']['requestId']
-                    # logger.debug('finished req {}'.format(request_id))
-                    try:
-                        self.open_requests.remove(request_id)
-                    except ValueError:
-                        logger.error(
-                                'loadingFinished but request {} not found'
-                                ' in open requests'.format(request_id)
-                        )
-                    domstorage_activities = 0
-                elif data['method'] == 'Network.loadingFailed':
-                    request_id = data['params']['requestId']
-                    logger.debug('loading failed on req {}'.format(request_id))
-                    try:
-                        self.open_requests.remove(request_id)
-                    except ValueError:
-                        logger.error(
-                                'request {} not found in open requests'.format(
-                                        request_id)
-                        )
-                    domstorage_activities = 0
-                elif data['method'].startswith('DOMStorage'):
-                    domstorage_activities += 1
-                elif data['method'] in (
-                        'Network.dataReceived',
-                        'Network.responseReceived',
-                        'Network.resourceChangedPriority',
-                ):
-                    domstorage_activities = 0
-                elif data['method'].startswith('Network.webSocket'):
-                    pass
-                else:
-                    logger.debug(
-                            'unexpected data[\'method\']: {}'.format(
-                                    data['method'])
-                    )
-            if self.domstorage_enabled and domstorage_activities > 20:
-                # exit when there is no more network traffic
+    def _track_event(self, data):
+        """ Update the DOMStorage activity counter from a received event.
+            Request state is kept by self.tracker, which is subscribed to
+            all Network events. """
+        if self.extreme_debugging:
+            logger.debug('got data: {}'.format(data))
+        method = data['method']
+        if method in REQUEST_EVENTS or method in (
+                'Network.dataReceived',
+                'Network.resourceChangedPriority',
+        ):
+            self.domstorage_activities = 0
+        elif method.startswith('DOMStorage'):
+            self.domstorage_activities += 1
+        elif method.startswith('Network.webSocket') \
+                or method == 'Fetch.requestPaused':
+            pass
+        else:
+            logger.debug(
+                    'unexpected data[\'method\']: {}'.format(method)
+            )
+
+    def _domstorage_loop(self):
+        # exit when there is no more network traffic
+        return self.domstorage_enabled and self.domstorage_activities > 20
+
+    def _loading_timeout(self):
+        return not self.stop_loading and self.wait_budget.expired()
+
+    def _drop_events(self):
+        """ Forget the events not yet read by _read_data, which belong
+            to the previous page. """
+        if self.shell:
+            dropped = self.shell.dispatcher.clear_events()
+            if dropped:
+                logger.debug('dropped {} events of the last page'.format(
+                        dropped))
+
+    def _read_data(self, condition):
+        """ Process events until condition is met or loading timed out. """
+        self.domstorage_activities = 0
+        condition.start(self, time.monotonic())
+        while not condition.done(self, time.monotonic()):
+            if self._domstorage_loop():
                 logger.debug('looks like a DOMStorage loop. stopping it...')
-                resp = self._send_chrome(
-                    {"id": 0, "method": "DOMStorage.disable"})
+                resp = self._send_chrome('DOMStorage.disable')
                 self.domstorage_enabled = False
                 # break
-            now = datetime.now()
-            runtime = now - self.start_time
-            if (not self.stop_loading
-                    and runtime.total_seconds() > self.master_timeout - 20):
+            if self._loading_timeout():
                 logger.error(
                         'timeout of {} seconds reached - stop loading'.format(
-                                self.master_timeout - 60)
+                                self.wait_budget.seconds)
                 )
-                resp = self._send_chrome(
-                    {"id": 0, "method": "Page.stopLoading"})
+                self.metrics.count_timeout('loading')
+                resp = self._send_chrome('Page.stopLoading')
                 logger.debug('got {}'.format(resp))
                 self.stop_loading = True
                 break
             self.check_timeout()
+            timeout = self._event_timeout(condition)
             try:
-                data = self._receive_chrome()
+                data = self._receive_chrome(timeout)
             except websocket.WebSocketTimeoutException:
-                logger.debug('TIMEOUT REACHED')
-                break
+                continue
+            if 'method' in data:
+                self._track_event(data)
+                condition.on_event(data, time.monotonic())
 
+    def _event_timeout(self, condition):
+        timeout = self.remote_shell_timeout
+        next_check = condition.next_check(time.monotonic())
+        if next_check is not None:
+            timeout = min(timeout, next_check)
+        # wake up when the load has to be stopped
+        return max(self.wait_budget.timeout(timeout), 0.001)
+
+    @timed('chrome_launch')
     def start_chrome(self):
-        chrome_dir = os.path.join(self.work_dir, 'chrome_profile')
-        if not os.path.exists(chrome_dir):
-            os.makedirs(chrome_dir)
-        logger.debug('Extract Chrome profile to {}...'.format(chrome_dir))
-        p = subprocess.call(
-                ['tar', 'xz', '-C', chrome_dir, '-f', chrome_profile()])
+        chrome_dir = self.profile_dir
+        # the profile is no longer inside work_dir if it is persistent
+        for directory in (chrome_dir, self.work_dir):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+        if self._reuse_profile():
+            logger.debug('Reuse Chrome profile {}'.format(chrome_dir))
+        else:
+            logger.debug('Clone Chrome profile to {}...'.format(chrome_dir))
+            clone_profile(
+                    chrome_dir, self.profile_cache, self.profile_clone)
         logger.debug('Start Chrome...')
+        chrome_args = self._chrome_args(chrome_dir)
+        logger.debug(' '.join(chrome_args))
+        p = subprocess.Popen(
+                chrome_args,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+        )
+        self.chrome_pid = p.pid
+        self.chrome_process = p
+        try:
+            self._wait_until_ready()
+        except ChromeStartupError:
+            self.metrics.count_error('chrome_launch')
+            raise
+        logger.debug(
+                'Chrome PID: {} listening on port {}'.format(
+                        p.pid, self.chrome_sock)
+        )
+        self.start_time = datetime.now()
+        self.budget = Budget(self.master_timeout, 'page')
+        self.jar_contexts = set()
+        self._watch_resources()
+
+    def _watch_resources(self):
+        self.recycle_needed = None
+        self.resource_monitor = None
+        if self.resource_limits is not None:
+            self.resource_monitor = ResourceMonitor(
+                    self.chrome_pid, self.resource_limits)
+
+    def recycle(self):
+        """ Restart Chrome with the same settings, as is due once
+            recycle_needed is set. """
+        self.clean_chrome()
+        self.start_chrome()
+
+    def _get_version(self):
+        url = 'http://localhost:{}/json/version'.format(self.chrome_sock)
+        try:
+            with urllib.request.urlopen(url, timeout=1) as f:
+                return json.loads(f.read().decode('utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _wait_until_ready(self):
+        """ Poll /json/version with exponential backoff until Chrome
+            answers, for at most startup_timeout seconds. """
+        started = time.monotonic()
+        deadline = started + self.startup_timeout
+        delay = 0.01
+        while True:
+            if self.chrome_process.poll() is not None:
+                raise ChromeStartupError(
+                        'Chrome exited with {} during startup'.format(
+                                self.chrome_process.returncode))
+            version = self._get_version()
+            if version is not None:
+                logger.debug('Chrome ready after {:.3f}s: {}'.format(
+                        time.monotonic() - started, version.get('Browser')))
+                return version
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._stop_chrome()
+                raise ChromeStartupError(
+                        'Chrome not ready on port {} after {}s'.format(
+                                self.chrome_sock, self.startup_timeout))
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+
+    @timed('chrome_shutdown')
+    def _stop_chrome(self):
+        """ SIGTERM Chrome and its children, SIGKILL them if they did not
+            exit within shutdown_delay seconds and remove the profile. """
+        p = self.chrome_process
+        if p is not None and p.poll() is None:
+            self._signal_chrome(signal.SIGTERM)
+            try:
+                p.wait(self.shutdown_delay)
+            except subprocess.TimeoutExpired:
+                logger.warning('Chrome did not exit, killing it')
+                self._signal_chrome(signal.SIGKILL)
+                p.wait()
+        if self.persistent_profile:
+            return
+        logger.debug('Remove chrome profile...')
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def _signal_chrome(self, sig):
+        try:
+            os.killpg(self.chrome_pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _chrome_args(self, chrome_dir):
         chrome_args = [
                 self.chrome_bin,
                 '--remote-debugging-port={}'.format(self.chrome_sock),
@@ -279,157 +754,338 @@ class ChromeBrowser(object):
                 '--disable-extensions']
         if self.headless:
             chrome_args.append('--headless')
-        logger.debug(' '.join(chrome_args))
-        p = subprocess.Popen(
-                chrome_args,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-        )
-        time.sleep(self.startup_delay)
-        self.chrome_pid = p.pid
-        logger.debug(
-                'Chrome PID: {} listening on port {}'.format(
-                        p.pid, self.chrome_sock)
-        )
-        self.start_time = datetime.now()
+        if self.launch is not None:
+            chrome_args.extend(self.launch.args())
+        return chrome_args
 
     def clean_chrome(self):
-        logger.debug('Kill Chrome...')
-        os.kill(int(self.chrome_pid), signal.SIGTERM)
-        logger.debug('Remove chrome profile...')
-        time.sleep(self.shutdown_delay)
-        subprocess.call(
-                ['rm', '-rf', os.path.join(self.work_dir, 'chrome_profile')])
-
-    def check_timeout(self):
-        now = datetime.now()
-        runtime = now - self.start_time
-        if runtime.total_seconds() > self.master_timeout:
-            logger.error('chrome master_timeout reached')
-            os.kill(int(self.chrome_pid), signal.SIGTERM)
-            time.sleep(self.shutdown_delay)
-            subprocess.call(
-                ['rm', '-rf', os.path.join(self.work_dir, 'chrome_profile')])
-
-    def load_page(self, url):
+        try:
+            self.flush_artifacts()
+            if self.shell and self.owner is None:
+                self._save_cookie_jar()
+        finally:
+            if self.owner is not None:
+                # a tab leaves Chrome and the browser connection to its
+                # owner
+                self.close_page()
+                self.event_log.close()
+                self.artifacts.close()
+            else:
+                self._shutdown()
+
+    def _shutdown(self):
+        """ Close the connections and stop Chrome, even if closing them
+            fails. """
+        try:
+            if self.shell:
+                self.shell.close()
+            if self.browser_shell:
+                self.browser_shell.close()
+        finally:
+            self.shell = False
+            self.browser_shell = None
+            self.target_id = None
+            self.session_id = None
+            self.browser_context_id = None
+            self.ws_url = None
+            self.event_log.close()
+            logger.debug('Kill Chrome...')
+            self._stop_chrome()
+
+    def _save_cookie_jar(self):
+        if not self.cookie_jar or not self.is_alive():
+            return
+        try:
+            # the page budget may be spent already
+            self.export_cookies(budget=Budget(
+                    self.remote_shell_timeout, 'cookie_jar'))
+        except (websocket.WebSocketException, OSError, CommandTimeout,
+                DeadlineExceeded) as e:
+            logger.warning('saving cookies to {} failed: {}'.format(
+                    self.cookie_jar, e))
+
+    def check_timeout(self, budget=None):
+        """ Raise DeadlineExceeded, after cancelling the commands still
+            in flight, if budget or the page budget ran out. """
+        budget = budget or self.budget
+        if budget.expired():
+            self._expire(budget)
+        self.check_resources()
+
+    def check_resources(self):
+        """ Sample the memory and CPU of Chrome's processes, if due, and
+            compare them to resource_limits. Past a limit recycle_needed is
+            set or, with action 'kill', Chrome is killed and
+            ResourceLimitExceeded raised. Returns the reason or None. """
+        if self.owner is not None:
+            return self.owner.check_resources()
+        monitor = self.resource_monitor
+        if monitor is None:
+            return None
+        reason = monitor.check()
+        sample = monitor.last
+        if sample is not None:
+            port = str(self.chrome_sock)
+            self.metrics.set_gauge('chrome_rss_bytes', port, sample.rss)
+            self.metrics.set_gauge(
+                    'chrome_cpu_seconds', port, sample.cpu_seconds)
+            self.metrics.set_gauge(
+                    'chrome_processes', port, sample.processes)
+        if reason is None or self.recycle_needed:
+            return reason
+        self.recycle_needed = reason
+        self.metrics.count_error('resource_limit')
+        if self.resource_limits.action == 'kill':
+            logger.error('Chrome on port {}: {}, killing it'.format(
+                    self.chrome_sock, reason))
+            self._signal_chrome(signal.SIGKILL)
+            raise ResourceLimitExceeded(sample, reason)
+        logger.warning('Chrome on port {}: {}, recycling it'.format(
+                self.chrome_sock, reason))
+        return reason
+
+    def _phase_budget(self, phase):
+        """ A sub-budget of the page budget for phase, limited by
+            phase_budgets. """
+        seconds = self.phase_budgets.get(phase)
+        if phase == 'wait' and seconds is None \
+                and self.budget.deadline is not None:
+            reserve = min(LOADING_RESERVE, self.budget.seconds / 4)
+            seconds = max(self.budget.remaining() - reserve, 0)
+        return self.budget.sub(seconds, phase)
+
+    def _expire(self, budget):
+        budget = budget.exceeded()
+        logger.error('{} budget of {}s exceeded'.format(
+                budget.name, budget.seconds))
+        self.metrics.count_timeout(
+                'master_timeout' if budget.name == 'page' else budget.name)
+        error = DeadlineExceeded(budget)
+        if self.shell:
+            self.shell.cancel_all(error)
+        raise error
+
+    def load_page(self, url, wait_until=None):
+        """ Navigate to url and wait until the page is loaded according to
+            wait_until: 'load', 'domcontentloaded', 'networkidle0',
+            'networkidle2', a WaitCondition or a predicate
+            func(browser, event). Defaults to the wait_until given to
+            __init__. """
         if not self.shell:
             self._start_console()
-        data = self._send_chrome(
-                {
-                        "id": 0,
-                        "method": "Page.navigate",
-                        "params": {
-                                "url": url
-                        }
-                }
-        )
-        self._read_data(data)
-        loopcount = 0
-        while (len(self.open_requests) > 0 and loopcount < 5
-                and not self.stop_loading):
-            self.check_timeout()
-            logger.debug('we have {} open requests: {}'.format(
-                    len(self.open_requests), self.open_requests))
-            self._read_data()
-            loopcount += 1
+        self.pages_loaded += 1
+        if self.har:
+            self._start_har(url)
+        condition = make_condition(wait_until or self.wait_until)
+        with self.metrics.phase('navigate'):
+            self._send_chrome(
+                    'Page.navigate', {'url': url},
+                    self._phase_budget('navigate'))
+        self.wait_budget = self._phase_budget('wait')
+        with self.metrics.phase('wait'):
+            self._read_data(condition)
         if len(self.open_requests) > 0:
-            logger.debug('open requests: {}'.format(self.open_requests))
-        self._send_chrome(
-                {"id": 0, "method": "Page.stopLoading"})
-        logger.debug('writing log to {}...'.format(self.chrome_log_file))
-        with open(self.chrome_log_file, 'w') as f:
-            json.dump(self.chrome_log, f, indent=4)
-        resp = self._send_chrome(
-                {
-                        "id": 0,
-                        "method": "Page.captureScreenshot",
-                        "params": {
-                            "format": "jpeg",
-                            "quality": 80
-                        }
-                }
-        )
-        while True:
-            if 'result' in resp and 'data' in resp['result']:
-                scrsht = os.path.join(self.work_dir, 'screenshot.jpg')
-                with open(scrsht, 'wb') as f:
-                    f.write(base64.b64decode(resp['result']['data']))
-                logger.debug('screenshot written to {}'.format(scrsht))
-                break
-            else:
-                logger.debug('got {}'.format(resp))
-                resp = self._receive_chrome()
-        # self._read_data()
+            logger.debug(
+                    'open requests: {}'.format(list(self.open_requests)))
+        self._send_chrome('Page.stopLoading')
+        with self.metrics.phase('log_flush'):
+            self.event_log.flush()
+        logger.debug('{} messages logged to {}'.format(
+                self.event_log.written, self.chrome_log_file))
+        path = os.path.join(self.work_dir, 'screenshot.jpg')
+        if self.screenshot == 'defer':
+            self.deferred.append(self._send_later(
+                    'Page.captureScreenshot', SCREENSHOT_PARAMS,
+                    lambda response: self._save_screenshot(response, path)))
+        elif self.screenshot:
+            with self.metrics.phase('screenshot'):
+                response = self._send_chrome(
+                        'Page.captureScreenshot', SCREENSHOT_PARAMS,
+                        self._phase_budget('screenshot'))
+            self._save_screenshot(response, path)
+
+    def _save_screenshot(self, response, path):
+        """ Queue the decoding and writing of a Page.captureScreenshot
+            response. """
+        if 'result' in response and 'data' in response['result']:
+            self.artifacts.write_base64(path, response['result']['data'])
+            logger.debug('screenshot queued for {}'.format(path))
+        else:
+            logger.debug('got {}'.format(response))
+
+    def _has_content(self, req):
+        if req.failed:
+            return False
+        if req.status_code not in (200, 206):
+            logger.debug('No Content with Status {}: {} - {}'.format(
+                    req.status_code, req.id, req.url))
+            return False
+        if req.content_length == 0:
+            logger.debug(
+                    'No Content with Content-Length 0: {} - {}'.format(
+                            req.id, req.url)
+            )
+            return False
+        if self.body_streamer is not None and not self.body_streamer.accepts(
+                req.mime_type, req.content_length):
+            logger.debug('Content not wanted: {} - {}'.format(
+                    req.id, req.url))
+            return False
+        return True
+
+    def _save_content(self, req, response, entry):
+        """ Queue the body of response for writing and return the future
+            of the write, or False if there is nothing to save. With a
+            content_store the future fills in the hash and size of
+            entry. """
+        if not response:
+            logger.error('TIMEOUT FAIL: {} - {}'.format(req.id, req.url))
+            return False
+        elif 'result' not in response:
+            logger.error('RESPONSE FAIL: {} - {}'.format(req.id, req.url))
+            logger.debug('response: {}'.format(response))
+            logger.debug('content-length: {}'.format(req.content_length))
+            return False
+        if self.body_streamer is not None:
+            result = response['result']
+            size = len(result['body'])
+            if result.get('base64Encoded'):
+                size = size * 3 // 4
+            if not self.body_streamer.charge(size):
+                logger.debug('page size limit reached: {} - {}'.format(
+                        req.id, req.url))
+                return False
+        if self.content_store is not None:
+            return self.artifacts.submit(
+                    self._store_body, response['result'], entry)
+        response['result']['content-type'] = req.mime_type
+        cfile = self.content_dir + '/{}'.format(req.id)
+        return self.artifacts.write_json(cfile, response)
+
+    def _store_body(self, result, entry):
+        entry['hash'], entry['size'] = self.content_store.put_body(
+                result['body'], result.get('base64Encoded', False))
+
+    @timed('get_content')
+    def get_content(self, concurrency=None, body_timeout=None):
+        """ Save the response bodies of all loaded requests to content_dir,
+            or to content_store with their hash and size in index.json.
 
-    def get_content(self):
+            Up to concurrency Network.getResponseBody commands are kept in
+            flight at once; a body not answered within body_timeout seconds
+            is given up. Both default to the values given to __init__.
+            The files are written in the background, see
+            flush_artifacts(). """
+        if concurrency is None:
+            concurrency = self.content_concurrency
+        if body_timeout is None:
+            body_timeout = self.body_timeout
+        concurrency = max(1, concurrency)
         if not os.path.exists(self.content_dir):
             os.makedirs(self.content_dir)
         cache_index_file = '{}/index.json'.format(self.content_dir)
         cache_index = {}
         req_count = 0
+        stored = []
+        budget = self._phase_budget('content')
+        self._finish_streams(budget.timeout(body_timeout))
         self._get_requests()
-        for req in self.reqs:
-            if req.failed:
-                continue
-            if req.status_code not in (200, 206):
-                logger.debug('No Content with Status {}: {} - {}'.format(
-                        req.status_code, req.id, req.url))
-                continue
-            if req.content_length == 0:
-                logger.debug(
-                        'No Content with Content-Length 0: {} - {}'.format(
-                                req.id, req.url)
-                )
-                continue
-            response = ''
-            cache_index[req.id] = {
-                'url': req.url,
-                'type': req.mime_type,
-            }
-            self.check_timeout()
-            response = self._send_chrome({
-                    "id": 0,
-                    "method": "Network.getResponseBody",
-                    "params": {"requestId": req.id}
-            })
-            while 'result' not in response and 'error' not in response:
-                try:
-                    response = self._receive_chrome()
-                except websocket.WebSocketTimeoutException:
-                    logger.debug('TIMEOUT REACHED')
-                    break
-                self.check_timeout()
-            if not response:
-                logger.error('TIMEOUT FAIL: {} - {}'.format(req.id, req.url))
-                continue
-            elif 'result' not in response:
-                logger.error('RESPONSE FAIL: {} - {}'.format(req.id, req.url))
-                logger.debug('response: {}'.format(response))
-                logger.debug('content-length: {}'.format(req.content_length))
-                continue
-            response['result']['content-type'] = req.mime_type
-            cfile = self.content_dir + '/{}'.format(req.id)
-            with open(cfile, 'w') as f:
-                json.dump(response, f, indent=4)
-            req_count += 1
-        logger.debug('{} content files saved'.format(req_count))
-        with open(cache_index_file, 'w') as f:
-            json.dump(cache_index, f, indent=4)
-        logger.debug('cache index written.')
+        waiting = collections.deque(
+                req for req in self.reqs if self._has_content(req))
+        in_flight = {}
+        dispatcher = self.shell.dispatcher
+        while waiting or in_flight:
+            while waiting and len(in_flight) < concurrency:
+                req = waiting.popleft()
+                cache_index[req.id] = {
+                    'url': req.url,
+                    'type': req.mime_type,
+                }
+                future = self.shell.send_command(
+                        'Network.getResponseBody', {'requestId': req.id})
+                in_flight[future] = req
+            self.check_timeout(budget)
+            timeout = None
+            if body_timeout:
+                oldest = min(future.sent_at for future in in_flight)
+                timeout = oldest + body_timeout - time.monotonic()
+            timeout = budget.timeout(timeout)
+            try:
+                done = dispatcher.wait_any(list(in_flight), timeout)
+            except websocket.WebSocketTimeoutException:
+                logger.debug('TIMEOUT REACHED')
+                self.metrics.count_timeout('Network.getResponseBody')
+                done = set()
+                for future in list(in_flight):
+                    dispatcher.cancel(future)
+                    done.add(future)
+            now = time.monotonic()
+            for future in list(in_flight):
+                if future not in done:
+                    if not body_timeout \
+                            or now - future.sent_at < body_timeout:
+                        continue
+                    dispatcher.cancel(future)
+                    self.metrics.count_timeout('Network.getResponseBody')
+                req = in_flight.pop(future)
+                response = None
+                if future.exception() is None:
+                    response = future.response
+                saved = self._save_content(
+                        req, response, cache_index[req.id])
+                if saved:
+                    req_count += 1
+                    stored.append(saved)
+        logger.debug('{} content files queued'.format(req_count))
+        self._index_streams(cache_index)
+        if self.content_store is not None:
+            # the index holds the hashes computed by the writes
+            concurrent.futures.wait(stored)
+        self.artifacts.write_json(cache_index_file, cache_index)
+        logger.debug('cache index queued.')
 
-    def get_cookies(self):
-        self.check_timeout()
-        response = self._send_chrome({
-            "id": 0,
-            "method": "Network.getAllCookies",
-        })
-        while 'result' not in response:
+    def _finish_streams(self, timeout):
+        """ Keep reading bodies still being streamed for up to timeout
+            seconds. """
+        streamer = self.body_streamer
+        if streamer is None or not streamer.active:
+            return
+        deadline = time.monotonic() + (timeout or self.remote_shell_timeout)
+        while streamer.active and time.monotonic() < deadline:
             try:
-                response = self._receive_chrome()
+                self.shell.dispatcher.pump(deadline - time.monotonic())
             except websocket.WebSocketTimeoutException:
-                logger.debug('TIMEOUT REACHED WAITING FOR COOKIES')
-                break
+                pass
+        if streamer.active:
+            logger.warning('{} bodies still streaming'.format(
+                    streamer.active))
+
+    def _index_streams(self, cache_index):
+        if self.body_streamer is None:
+            return
+        for stream in self.body_streamer.streams.values():
+            if stream.complete:
+                cache_index[stream.request_id] = stream.entry()
+
+    @timed('get_cookies')
+    def get_cookies(self):
+        budget = self._phase_budget('cookies')
+        self.check_timeout(budget)
+        response = {}
+        try:
+            response = self._send_chrome(
+                    'Network.getAllCookies', budget=budget)
+        except websocket.WebSocketTimeoutException:
+            logger.debug('TIMEOUT REACHED WAITING FOR COOKIES')
+            self.metrics.count_timeout('Network.getAllCookies')
         logger.debug(
-                'writing cookie log to {}...'.format(self.cookie_log_file))
-        with open(self.cookie_log_file, 'w') as f:
-            json.dump(response, f, indent=4)
+                'queueing cookie log for {}...'.format(self.cookie_log_file))
+        self.artifacts.write_json(self.cookie_log_file, response)
+
+
+def _response(future):
+    """ The response message of a done CommandFuture, or an error message
+        if it failed. """
+    if future.exception() is not None:
+        return {'error': {'message': str(future.exception())}}
+    return future.response
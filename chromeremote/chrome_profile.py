@@ -1,8 +1,143 @@
+import hashlib
+import logging
 import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
 
 
+logger = logging.getLogger(__name__)
+
 profile_name = 'chrometemp.tar.gz'
+profile_root = 'chrometemp'
+
+_versions = {}
+_cp_failed = set()
 
 
 def chrome_profile():
     return os.path.join(os.path.dirname(__file__), profile_name)
+
+
+def default_cache_dir():
+    if os.environ.get('CHROMEREMOTE_CACHE'):
+        return os.environ['CHROMEREMOTE_CACHE']
+    cache_home = os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'chromeremote')
+
+
+def profile_version(path=None):
+    """ Short content hash of the profile tarball, computed once. """
+    path = path or chrome_profile()
+    if path not in _versions:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                digest.update(block)
+        _versions[path] = digest.hexdigest()[:12]
+    return _versions[path]
+
+
+def profile_template(cache_dir=None):
+    """ Extract the packaged profile into cache_dir/profile-<version>
+        unless that was done before and return the template directory.
+        Point cache_dir at a tmpfs to keep the template in memory. """
+    cache_dir = cache_dir or default_cache_dir()
+    template = os.path.join(
+            cache_dir, 'profile-{}'.format(profile_version()))
+    if os.path.isdir(template):
+        return template
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=cache_dir, prefix='.profile-')
+    try:
+        with tarfile.open(chrome_profile()) as tar:
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(tmp, filter='data')
+            else:
+                tar.extractall(tmp)
+        os.rename(tmp, template)
+        logger.debug('Chrome profile template extracted to {}'.format(
+                template))
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        # another process may have created the template meanwhile
+        if not os.path.isdir(template):
+            raise
+    return template
+
+
+def clone_profile(dest, cache_dir=None, method='auto'):
+    """ Create a fresh copy of the packaged profile in dest.
+
+        method 'reflink' clones the cached template copy-on-write, 'copy'
+        copies it file by file and 'auto' lets cp use a reflink where the
+        filesystem supports one and copy otherwise. 'extract' and any
+        failure to build the template fall back to extracting the tarball.
+        Hardlinks are not offered: Chrome updates its databases in place
+        and would modify the shared template. """
+    target = os.path.join(dest, profile_root)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    if method != 'extract':
+        try:
+            source = os.path.join(profile_template(cache_dir), profile_root)
+            if method in ('auto', 'reflink') \
+                    and _cp(source, target, method == 'reflink'):
+                return method
+            if method == 'reflink':
+                raise OSError('reflink copy not supported for {}'.format(
+                        dest))
+            shutil.copytree(source, target, symlinks=True)
+            return 'copy'
+        except OSError as e:
+            logger.warning('cloning profile template failed: {}'.format(e))
+            if os.path.exists(target):
+                shutil.rmtree(target)
+    subprocess.call(['tar', 'xz', '-C', dest, '-f', chrome_profile()])
+    return 'extract'
+
+
+def persistent_profile_dir(name, cache_dir=None):
+    """ Directory of the persistent profile name, cache_dir/profiles/name,
+        or name itself if it is an absolute path. """
+    if os.path.isabs(name):
+        return name
+    if not name or os.sep in name or name in ('.', '..'):
+        raise ValueError('bad profile name {!r}'.format(name))
+    return os.path.join(cache_dir or default_cache_dir(), 'profiles', name)
+
+
+def remove_profile(name, cache_dir=None):
+    """ Delete the persistent profile name with its cache and cookies.
+        Chrome must not be running on it. """
+    path = persistent_profile_dir(name, cache_dir)
+    shutil.rmtree(path, ignore_errors=True)
+    logger.debug('removed profile {}'.format(path))
+
+
+def _cp(source, target, reflink_only):
+    # remember per pair of filesystems where cp failed
+    key = (os.stat(source).st_dev, os.stat(os.path.dirname(target)).st_dev,
+           reflink_only)
+    if key in _cp_failed:
+        return False
+    if sys.platform == 'darwin':
+        args = ['cp', '-c', '-R', source, target]
+    elif reflink_only:
+        args = ['cp', '-a', '--reflink=always', source, target]
+    else:
+        args = ['cp', '-a', '--reflink=auto', source, target]
+    try:
+        result = subprocess.call(
+                args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        result = -1
+    if result == 0:
+        return True
+    _cp_failed.add(key)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    return False
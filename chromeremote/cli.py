@@ -0,0 +1,148 @@
+"""
+The chromeremote command: crawl a list of URLs
+
+    $ chromeremote urls.txt -o /tmp/crawl --workers 4
+    $ chromeremote urls.txt -o /tmp/crawl --launch dense --max-rss 1024
+    $ cat urls.txt | chromeremote - -o /tmp/crawl
+
+urls.txt holds one URL per line; blank lines and lines starting with #
+are ignored. Running the same command again after an interruption skips
+the URLs already in the manifest of the output directory.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+from .crawl import crawl
+from .launch import PRESETS
+from .resources import ResourceLimits
+
+
+logger = logging.getLogger(__name__)
+
+CHROME_NAMES = (
+        'google-chrome', 'google-chrome-stable', 'chromium',
+        'chromium-browser', 'chrome',
+)
+
+
+def find_chrome():
+    """ The Chrome binary named by $CHROME_BIN or found on the PATH. """
+    if os.environ.get('CHROME_BIN'):
+        return os.environ['CHROME_BIN']
+    for name in CHROME_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def read_urls(f):
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def parser():
+    p = argparse.ArgumentParser(
+            prog='chromeremote',
+            description='Load a list of URLs with headless Chrome and save '
+                        'logs, screenshots, content and cookies per URL.')
+    p.add_argument('urls', help='file with one URL per line, - for stdin')
+    p.add_argument('-o', '--output', default='crawl',
+                   help='output directory (default: %(default)s)')
+    p.add_argument('-w', '--workers', type=int, default=4,
+                   help='browsers loading pages in parallel '
+                        '(default: %(default)s)')
+    p.add_argument('--base-port', type=int, default=9111,
+                   help='debugging port of the first browser, the others '
+                        'follow (default: %(default)s)')
+    p.add_argument('--chrome-bin', default=find_chrome(),
+                   help='Chrome binary (default: $CHROME_BIN or the PATH)')
+    p.add_argument('--wait-until', default='networkidle2',
+                   help='load, domcontentloaded, networkidle0 or '
+                        'networkidle2 (default: %(default)s)')
+    p.add_argument('--timeout', type=float, default=120,
+                   help='seconds per page (default: %(default)s)')
+    p.add_argument('--pages-per-browser', type=int, default=50,
+                   help='restart a browser after this many pages '
+                        '(default: %(default)s)')
+    p.add_argument('--shared-context', action='store_true',
+                   help='load all pages of a browser in one browser '
+                        'context instead of a new one per page')
+    p.add_argument('--launch', choices=sorted(PRESETS),
+                   help='Chrome command line preset')
+    p.add_argument('--max-rss', type=int, metavar='MIB',
+                   help='recycle a browser using more memory than this')
+    p.add_argument('--screenshot', choices=('on', 'off', 'defer'),
+                   default='on', help='(default: %(default)s)')
+    p.add_argument('--har', action='store_true', help='write page.har')
+    p.add_argument('--no-content', action='store_true',
+                   help='do not save response bodies')
+    p.add_argument('--no-cookies', action='store_true',
+                   help='do not save cookies')
+    p.add_argument('--retry-failed', action='store_true',
+                   help='load URLs again that failed in an earlier run')
+    p.add_argument('-v', '--verbose', action='count', default=0,
+                   help='log progress, -vv for debugging')
+    return p
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    logging.basicConfig(
+            level=(logging.WARNING, logging.INFO, logging.DEBUG)[
+                    min(args.verbose, 2)],
+            format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if not args.chrome_bin:
+        print('chromeremote: no Chrome found, use --chrome-bin',
+              file=sys.stderr)
+        return 2
+    if args.urls == '-':
+        urls = list(read_urls(sys.stdin))
+    else:
+        with open(args.urls) as f:
+            urls = list(read_urls(f))
+    browser_args = {}
+    if args.max_rss:
+        browser_args['resource_limits'] = ResourceLimits(
+                max_rss=args.max_rss << 20)
+
+    def progress(result):
+        logger.info('{} {} in {}s'.format(
+                result['status'], result['url'], result['seconds']))
+
+    try:
+        summary = crawl(
+                urls,
+                args.output,
+                workers=args.workers,
+                base_port=args.base_port,
+                retry_failed=args.retry_failed,
+                content=not args.no_content,
+                cookies=not args.no_cookies,
+                on_result=progress,
+                pages_per_browser=args.pages_per_browser,
+                isolated=not args.shared_context,
+                chrome_bin=args.chrome_bin,
+                wait_until=args.wait_until,
+                master_timeout=args.timeout,
+                launch=args.launch,
+                screenshot={'on': True, 'off': False, 'defer': 'defer'}[
+                        args.screenshot],
+                har=args.har,
+                **browser_args
+        )
+    except KeyboardInterrupt:
+        print('chromeremote: interrupted, run again to resume',
+              file=sys.stderr)
+        return 130
+    print(summary.format())
+    return 1 if summary.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
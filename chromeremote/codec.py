@@ -0,0 +1,200 @@
+"""
+Decoding of Chrome debugger frames
+
+    > codec = get_codec()           # orjson if installed, else json
+    > frame = Frame(raw, codec)
+    > frame.method                  # read from the frame without parsing it
+    > frame['params']               # parses the frame on first access
+
+Chrome writes the id of a response and the method of an event as the
+first member of a frame and the sessionId of a flattened session as the
+last, so all three can be read with string comparisons.
+A Frame is a read-only mapping that parses the JSON text the first time
+anything else is looked up: events nobody subscribed to and responses
+nobody reads are never decoded, and the event log writes the received
+text as it is.
+"""
+
+import collections.abc
+import json
+
+
+class JSONCodec(object):
+    """ The json module of the standard library. """
+
+    name = 'json'
+
+    def loads(self, raw):
+        return json.loads(raw)
+
+    def dumps(self, message):
+        return json.dumps(message, separators=(',', ':'))
+
+
+class OrjsonCodec(object):
+    """ orjson, several times faster than json (pip install orjson). """
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def loads(self, raw):
+        return self._orjson.loads(raw)
+
+    def dumps(self, message):
+        return self._orjson.dumps(message).decode('utf-8')
+
+
+CODECS = {
+        'json': JSONCodec,
+        'orjson': OrjsonCodec,
+}
+
+
+def get_codec(codec=None):
+    """ Return a codec for a name from CODECS or an object with loads()
+        and dumps(). None picks orjson when it is installed. """
+    if codec is None:
+        try:
+            return OrjsonCodec()
+        except ImportError:
+            return JSONCodec()
+    if isinstance(codec, str):
+        try:
+            return CODECS[codec]()
+        except KeyError:
+            raise ValueError('unknown codec {}'.format(codec))
+    return codec
+
+
+_ID_PREFIX = '{"id":'
+_METHOD_PREFIX = '{"method":"'
+_SESSION_KEY = ',"sessionId":"'
+
+
+def sniff(raw):
+    """ Return the (id, method, session id) of a frame without parsing
+        it, or None if the frame does not start the way Chrome writes
+        them. """
+    if not isinstance(raw, str):
+        return None
+    if raw.startswith(_ID_PREFIX):
+        end = len(_ID_PREFIX)
+        while end < len(raw) and raw[end].isdigit():
+            end += 1
+        if end == len(_ID_PREFIX) or end == len(raw) \
+                or raw[end] not in ',}':
+            return None
+        return int(raw[len(_ID_PREFIX):end]), None, _session_id(raw)
+    if raw.startswith(_METHOD_PREFIX):
+        end = raw.find('"', len(_METHOD_PREFIX))
+        if end < 0:
+            return None
+        method = raw[len(_METHOD_PREFIX):end]
+        if '\\' in method:
+            return None
+        return None, method, _session_id(raw)
+    return None
+
+
+def _session_id(raw):
+    # a frame ending in "} ends with a string member of the top level
+    # object, as any nested object would add a }; quotes inside strings
+    # are escaped, so the key found last is that member if its value has
+    # no quote
+    if not raw.endswith('"}'):
+        return None
+    start = raw.rfind(_SESSION_KEY)
+    if start < 0:
+        return None
+    value = raw[start + len(_SESSION_KEY):-2]
+    if '"' in value or '\\' in value:
+        return None
+    return value
+
+
+class Frame(collections.abc.Mapping):
+    """ A received message, parsed on first access to its content. """
+
+    __slots__ = ('raw', 'id', 'method', 'session_id', '_codec', '_message')
+
+    def __init__(self, raw, codec, message=None):
+        self.raw = raw
+        self._codec = codec
+        self._message = message
+        sniffed = sniff(raw) if message is None else None
+        if sniffed is None:
+            message = self.message
+            self.id = message.get('id')
+            self.method = message.get('method')
+            self.session_id = message.get('sessionId')
+        else:
+            self.id, self.method, self.session_id = sniffed
+
+    @classmethod
+    def from_message(cls, message, codec):
+        """ Wrap an already decoded message. """
+        return cls(None, codec, message)
+
+    @property
+    def decoded(self):
+        return self._message is not None
+
+    @property
+    def message(self):
+        """ The decoded message dict. """
+        if self._message is None:
+            self._message = self._codec.loads(self.raw)
+        return self._message
+
+    @property
+    def is_error(self):
+        """ True for an error response, found without parsing the frame
+            if Chrome wrote it. """
+        if self.id is None:
+            return False
+        if self._message is None:
+            # sniffed, so the frame starts with {"id":<digits>
+            end = self.raw.find(',')
+            return self.raw.startswith(',"error":', end)
+        return 'error' in self._message
+
+    def text(self):
+        """ The JSON text of the frame. """
+        if self.raw is None:
+            self.raw = self._codec.dumps(self._message)
+        return self.raw
+
+    def get(self, key, default=None):
+        if key == 'method' and self.method is not None:
+            return self.method
+        if key == 'id' and self.id is not None:
+            return self.id
+        return self.message.get(key, default)
+
+    def __contains__(self, key):
+        if key == 'method' and self.method is not None:
+            return True
+        if key == 'id' and self.id is not None:
+            return True
+        return key in self.message
+
+    def __getitem__(self, key):
+        if key == 'method' and self.method is not None:
+            return self.method
+        if key == 'id' and self.id is not None:
+            return self.id
+        return self.message[key]
+
+    def __iter__(self):
+        return iter(self.message)
+
+    def __len__(self):
+        return len(self.message)
+
+    def __repr__(self):
+        if self.method is not None:
+            return '<Frame {}>'.format(self.method)
+        return '<Frame id {}>'.format(self.id)
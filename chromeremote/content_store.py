@@ -0,0 +1,156 @@
+"""
+Content addressed store for response bodies
+"""
+
+import base64
+import gzip
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_SUFFIX = {
+        None: '',
+        'gzip': '.gz',
+        'zstd': '.zst',
+}
+
+
+class ContentStore(object):
+    """ Stores raw bodies under root/objects/<xx>/<digest>, where digest is
+        the hex hash of the uncompressed bytes. A body already present is
+        not written again, so a store shared by many pages and runs keeps
+        each distinct asset once.
+
+        compression is None, 'gzip' or 'zstd' (needs the zstandard
+        package). Uncompressed objects can be read with mmap(). """
+
+    def __init__(self, root, compression=None, algorithm='sha256'):
+        if compression not in COMPRESSION_SUFFIX:
+            raise ValueError(
+                    'unknown compression {}'.format(compression))
+        self.root = root
+        self.compression = compression
+        self.algorithm = algorithm
+        self.objects_dir = os.path.join(root, 'objects')
+        self.written = 0
+        self.deduplicated = 0
+
+    def path(self, digest):
+        return os.path.join(
+                self.objects_dir,
+                digest[:2],
+                digest + COMPRESSION_SUFFIX[self.compression],
+        )
+
+    def has(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """ Store data and return its digest. """
+        digest = hashlib.new(self.algorithm, data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            self.deduplicated += 1
+            return digest
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self._compress(data))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.written += 1
+        return digest
+
+    def put_file(self, path, digest=None):
+        """ Move the file at path into the store and return its digest,
+            which is computed unless given. The file is read in blocks, so
+            it may be larger than memory. """
+        if digest is None:
+            hasher = hashlib.new(self.algorithm)
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    hasher.update(block)
+            digest = hasher.hexdigest()
+        target = self.path(digest)
+        if os.path.exists(target):
+            self.deduplicated += 1
+            os.unlink(path)
+            return digest
+        directory = os.path.dirname(target)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        if self.compression is None:
+            try:
+                os.replace(path, target)
+                self.written += 1
+                return digest
+            except OSError:
+                # on another filesystem, copy it below
+                pass
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as out, open(path, 'rb') as f:
+                if self.compression == 'gzip':
+                    with gzip.GzipFile(fileobj=out, mode='wb') as z:
+                        shutil.copyfileobj(f, z, 1 << 20)
+                elif self.compression == 'zstd':
+                    import zstandard
+                    zstandard.ZstdCompressor().copy_stream(f, out)
+                else:
+                    shutil.copyfileobj(f, out, 1 << 20)
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        os.unlink(path)
+        self.written += 1
+        return digest
+
+    def put_body(self, body, base64_encoded=False):
+        """ Store a Network.getResponseBody body, decoding it once.
+            Returns the digest and the size of the raw body. """
+        if base64_encoded:
+            data = base64.b64decode(body)
+        else:
+            data = body.encode('utf-8')
+        return self.put(data), len(data)
+
+    def get(self, digest):
+        with open(self.path(digest), 'rb') as f:
+            return self._decompress(f.read())
+
+    def mmap(self, digest):
+        """ Memory map an uncompressed object read-only. """
+        if self.compression is not None:
+            raise ValueError('only uncompressed objects can be mapped')
+        with open(self.path(digest), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _compress(self, data):
+        if self.compression == 'gzip':
+            return gzip.compress(data)
+        elif self.compression == 'zstd':
+            import zstandard
+            return zstandard.ZstdCompressor().compress(data)
+        return data
+
+    def _decompress(self, data):
+        if self.compression == 'gzip':
+            return gzip.decompress(data)
+        elif self.compression == 'zstd':
+            import zstandard
+            return zstandard.ZstdDecompressor().decompress(data)
+        return data
@@ -0,0 +1,69 @@
+"""
+Cookies in the format written by ChromeBrowser.get_cookies
+
+    > cookies = load_cookies('/tmp/chromeremote/cookies.json')
+    > browser.import_cookies(cookies)
+
+get_cookies writes the Network.getAllCookies response as it is. The
+cookies in it are turned into the parameters of Network.setCookies by
+cookie_params(), which drops the members only Chrome computes.
+"""
+
+import json
+import os
+import tempfile
+
+
+# members of Network.CookieParam, everything else getAllCookies returns
+# is computed by Chrome; the deprecated sameParty is left out, since
+# newer Chrome versions no longer know it
+COOKIE_PARAMS = (
+        'name', 'value', 'url', 'domain', 'path', 'secure', 'httpOnly',
+        'sameSite', 'expires', 'priority', 'sourceScheme', 'sourcePort',
+        'partitionKey',
+)
+
+
+def cookie_list(data):
+    """ The cookies of a get_cookies response, a {'cookies': [...]}
+        result or a plain list of cookies. """
+    if isinstance(data, dict):
+        if 'result' in data:
+            data = data['result']
+        data = data.get('cookies', [])
+    return list(data)
+
+
+def load_cookies(path):
+    """ Read the cookies of a file written by get_cookies. """
+    with open(path) as f:
+        return cookie_list(json.load(f))
+
+
+def save_cookies(path, cookies):
+    """ Write cookies in the format of get_cookies. The file is replaced
+        at once, so readers never see half of it. """
+    fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)),
+            prefix='.{}.'.format(os.path.basename(path)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'result': {'cookies': cookie_list(cookies)}}, f,
+                      indent=4)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def cookie_params(cookies):
+    """ Network.setCookies parameters for cookies. Session cookies, which
+        getAllCookies returns with expires -1, stay session cookies. """
+    params = []
+    for cookie in cookie_list(cookies):
+        param = dict(
+                (key, cookie[key]) for key in COOKIE_PARAMS if key in cookie)
+        if cookie.get('session') or param.get('expires', 0) < 0:
+            param.pop('expires', None)
+        params.append(param)
+    return params
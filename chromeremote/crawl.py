@@ -0,0 +1,267 @@
+"""
+Crawl a list of URLs with a pool of browsers
+
+    > summary = crawl(urls, '/tmp/crawl', workers=4, chrome_bin=chrome)
+    > print(summary.format())
+
+Every URL gets a directory of its own below output_dir, named after its
+host and a hash of the URL, with the files of ChromeBrowser (chromelog,
+screenshot, content, cookies). A line per finished URL is appended to
+manifest.ndjson in output_dir and synced to disk, so a crawl that was
+interrupted or crashed continues with the URLs not in the manifest when
+it is started again. Failed URLs are retried only with retry_failed.
+
+The workers are threads, each driving one browser of a ChromeBrowserPool
+on ports base_port, base_port + 1, ...
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import queue
+import re
+import statistics
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from .deadline import DeadlineExceeded
+from .pool import ChromeBrowserPool
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.ndjson'
+
+
+def page_dir(url):
+    """ The directory of url below the output directory: its host and
+        the start of the SHA-1 of the URL. """
+    host = urllib.parse.urlsplit(url).hostname or 'page'
+    host = re.sub(r'[^A-Za-z0-9.-]', '_', host)[:64]
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+    return '{}-{}'.format(host, digest)
+
+
+class Manifest(object):
+    """ The results of a crawl, one JSON object per line. A line cut off
+        by a crash is ignored when the manifest is read again. """
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._broken_tail = False
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                # the next result must not be appended to a cut off line
+                self._broken_tail = not line.endswith('\n')
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    logger.warning('skipping broken line in {}'.format(
+                            self.path))
+                    continue
+                self.results[result['url']] = result
+
+    def done(self, url, retry_failed=False):
+        result = self.results.get(url)
+        if result is None:
+            return False
+        return result['status'] == 'ok' or not retry_failed
+
+    def add(self, result):
+        """ Append result and sync it to disk. """
+        line = json.dumps(result, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+                if self._broken_tail:
+                    self._file.write('\n')
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.results[result['url']] = result
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class CrawlSummary(object):
+
+    def __init__(self, results, skipped, elapsed, workers):
+        self.results = results
+        self.skipped = skipped
+        self.elapsed = elapsed
+        self.workers = workers
+        self.ok = sum(1 for result in results if result['status'] == 'ok')
+        self.failed = len(results) - self.ok
+
+    @property
+    def pages_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return len(self.results) / self.elapsed
+
+    def page_times(self):
+        return sorted(result['seconds'] for result in self.results)
+
+    def as_dict(self):
+        times = self.page_times()
+        return {
+                'pages': len(self.results),
+                'ok': self.ok,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'workers': self.workers,
+                'elapsed': round(self.elapsed, 3),
+                'pages_per_second': round(self.pages_per_second, 3),
+                'median_page_seconds': round(statistics.median(times), 3)
+                if times else None,
+                'p95_page_seconds': round(
+                        times[math.ceil(0.95 * len(times)) - 1], 3)
+                if times else None,
+        }
+
+    def format(self):
+        summary = self.as_dict()
+        lines = [
+                '{pages} pages in {elapsed:.1f}s with {workers} workers: '
+                '{pages_per_second:.2f} pages/s'.format(**summary),
+                '{ok} ok, {failed} failed, {skipped} skipped from an '
+                'earlier run'.format(**summary),
+        ]
+        if summary['median_page_seconds'] is not None:
+            lines.append(
+                    'page time: median {median_page_seconds:.2f}s, '
+                    '95th percentile {p95_page_seconds:.2f}s'.format(
+                            **summary))
+        return '\n'.join(lines)
+
+
+def crawl(
+        urls,
+        output_dir,
+        workers=4,
+        base_port=9111,
+        retry_failed=False,
+        content=True,
+        cookies=True,
+        on_result=None,
+        **pool_args
+):
+    """ Load every URL of urls with workers browsers and save it to its
+        page_dir below output_dir. URLs already in the manifest are
+        skipped. on_result(result) is called from the workers for every
+        finished URL. Further keyword arguments are passed to
+        ChromeBrowserPool and on to ChromeBrowser.
+
+        Returns a CrawlSummary of the URLs crawled in this run. On
+        KeyboardInterrupt the workers finish their current page and the
+        interrupt is raised once they stopped. """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    manifest = Manifest(os.path.join(output_dir, MANIFEST))
+    todo = queue.Queue()
+    skipped = 0
+    seen = set()
+    for url in urls:
+        url = url.strip()
+        if not url or url in seen:
+            continue
+        seen.add(url)
+        if manifest.done(url, retry_failed):
+            skipped += 1
+        else:
+            todo.put(url)
+    if todo.empty():
+        manifest.close()
+        return CrawlSummary([], skipped, 0.0, 0)
+    workers = min(workers, todo.qsize())
+    logger.info('crawling {} URLs with {} workers, {} done before'.format(
+            todo.qsize(), workers, skipped))
+    pool_args.setdefault('work_dir', os.path.join(output_dir, '.browsers'))
+    pool = ChromeBrowserPool(size=workers, base_port=base_port, **pool_args)
+    results = []
+    stop = threading.Event()
+
+    def record(result):
+        manifest.add(result)
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    def work():
+        while not stop.is_set():
+            try:
+                url = todo.get_nowait()
+            except queue.Empty:
+                return
+            record(_crawl_page(pool, url, output_dir, content, cookies))
+
+    started = time.monotonic()
+    threads = [
+            threading.Thread(target=work, name='crawl-{}'.format(n))
+            for n in range(workers)]
+    try:
+        pool.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # a timeout keeps the main thread responsive to Ctrl-C
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        logger.warning('interrupted, finishing the pages being loaded')
+        stop.set()
+        for thread in threads:
+            if thread.is_alive():
+                thread.join()
+        raise
+    finally:
+        pool.close()
+        manifest.close()
+    return CrawlSummary(
+            results, skipped, time.monotonic() - started, workers)
+
+
+def _crawl_page(pool, url, output_dir, content, cookies):
+    directory = page_dir(url)
+    result = {
+            'url': url,
+            'dir': directory,
+            'started': datetime.now(timezone.utc).isoformat(
+                    timespec='seconds'),
+    }
+    started = time.monotonic()
+    try:
+        with pool.page(work_dir=os.path.join(output_dir, directory)) \
+                as browser:
+            result['port'] = browser.chrome_sock
+            browser.load_page(url)
+            if content:
+                browser.get_content()
+            if cookies:
+                browser.get_cookies()
+            result['requests'] = len(browser.tracker.all())
+            result['stopped_loading'] = browser.stop_loading
+        result['status'] = 'ok'
+    except DeadlineExceeded as e:
+        result['status'] = 'timeout'
+        result['error'] = str(e)
+    except Exception as e:
+        logger.exception('crawling {} failed'.format(url))
+        result['status'] = 'failed'
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    result['seconds'] = round(time.monotonic() - started, 3)
+    return result
@@ -0,0 +1,89 @@
+"""
+Time budgets on the monotonic clock
+
+    > budget = Budget(120, 'page')
+    > wait = budget.sub(30, 'wait')  # ends with the page budget at the latest
+    > future.wait(wait.timeout(5))    # 5s, or less if the budget ends first
+    > wait.check()                    # raises DeadlineExceeded once expired
+
+A browser keeps one page budget, started by start_chrome and reset, and
+gives every phase of a page a sub-budget of it. When a budget runs out
+the commands still waiting for Chrome are cancelled and DeadlineExceeded
+is raised, except for the wait for the page to load, which stops loading
+and lets the page be saved as far as it got.
+"""
+
+import time
+
+
+class DeadlineExceeded(Exception):
+    """ A budget ran out. budget is the Budget that expired. """
+
+    def __init__(self, budget):
+        self.budget = budget
+        super().__init__('{} budget of {}s exceeded'.format(
+                budget.name, budget.seconds))
+
+
+class Budget(object):
+
+    __slots__ = ('name', 'seconds', 'deadline', 'parent', 'clock')
+
+    def __init__(self, seconds=None, name='page', parent=None,
+                 clock=time.monotonic):
+        """ A budget of seconds from now, or without a limit if seconds is
+            None. A sub-budget never ends after its parent. """
+        self.name = name
+        self.seconds = seconds
+        self.parent = parent
+        self.clock = clock
+        deadline = None
+        if seconds is not None:
+            deadline = clock() + seconds
+        if parent is not None and parent.deadline is not None:
+            if deadline is None or parent.deadline < deadline:
+                deadline = parent.deadline
+        self.deadline = deadline
+
+    def __repr__(self):
+        return '<Budget {} {}s>'.format(self.name, self.seconds)
+
+    def sub(self, seconds=None, name=None):
+        """ A budget for part of the work, ending after seconds or with
+            this budget, whichever comes first. """
+        return Budget(seconds, name or self.name, self, self.clock)
+
+    def remaining(self):
+        """ Seconds left, never negative, or None without a limit. """
+        if self.deadline is None:
+            return None
+        return max(self.deadline - self.clock(), 0)
+
+    def expired(self):
+        return self.deadline is not None and self.clock() >= self.deadline
+
+    def check(self):
+        """ Raise DeadlineExceeded if the budget ran out. """
+        if self.expired():
+            raise DeadlineExceeded(self.exceeded())
+
+    def exceeded(self):
+        """ The budget that made this one run out: the outermost expired
+            one of its parents, else itself. """
+        budget = self
+        parent = self.parent
+        while parent is not None:
+            if parent.expired():
+                budget = parent
+            parent = parent.parent
+        return budget
+
+    def timeout(self, timeout=None):
+        """ timeout, shortened to what is left of the budget. None if
+            there is neither. """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
@@ -0,0 +1,422 @@
+""" Pipelined command dispatcher for the Chrome remote debugging protocol.
+
+    > dispatcher = CommandDispatcher(soc)
+    > future = dispatcher.send('Network.getResponseBody',
+    >                          {'requestId': '1000.1'})
+    > body = future.result()
+
+    Every command gets its own message id, so any number of commands can
+    be in flight on one websocket. Responses are routed to the future of
+    the command they answer, events are handed to subscribers and kept in
+    a bounded buffer for consumers reading them with next_event().
+
+    The dispatcher does not run a reader thread: frames are received by
+    whoever waits on a future or an event, so the caller controls when the
+    socket is read.
+
+    Received frames are codec.Frame mappings, parsed only when their
+    content is looked at; future.response and next_event() return decoded
+    dicts.
+
+    A connection to the browser endpoint carries the flattened sessions
+    of attached targets. dispatcher.session(session_id) returns a
+    SessionDispatcher that sends its commands with that sessionId and
+    gets the events of the session, while all of them share the socket.
+    Sessions can be driven from different threads: frames are received
+    by one thread at a time and routed to whichever session they belong
+    to.
+"""
+import collections
+import itertools
+import logging
+import threading
+import time
+
+import websocket
+
+from .codec import Frame, get_codec
+
+
+logger = logging.getLogger(__name__)
+
+
+def event_matches(pattern, method):
+    """ True if method is named by pattern: an exact method name, a domain
+        prefix like 'Network.' or '*'. """
+    if pattern == '*' or pattern == method:
+        return True
+    return pattern.endswith('.') and method.startswith(pattern)
+
+
+class CommandError(Exception):
+    """ Chrome answered a command with an error. """
+
+    def __init__(self, method, error):
+        self.method = method
+        self.error = error
+        super().__init__('{}: {}'.format(method, error))
+
+
+class CommandTimeout(Exception):
+    """ No response arrived within the timeout given for a command. """
+
+
+class CommandCancelled(Exception):
+    """ The command was cancelled before its response arrived. """
+
+
+class CommandFuture(object):
+    """ Pending response to a command sent through a CommandDispatcher. """
+
+    def __init__(self, dispatcher, command_id, method, params=None):
+        self.dispatcher = dispatcher
+        self.id = command_id
+        self.method = method
+        self.params = params
+        self.sent_at = time.monotonic()
+        self._response = None
+        self._exception = None
+        self._done = False
+        self._callbacks = []
+
+    @property
+    def response(self):
+        """ The response message, decoded on first access. """
+        if isinstance(self._response, Frame):
+            return self._response.message
+        return self._response
+
+    def done(self):
+        return self._done
+
+    def set_response(self, response):
+        self._response = response
+        self._finish()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._finish()
+
+    def exception(self):
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """ Call callback(future) once the future is done. """
+        if self._done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def wait(self, timeout=None):
+        """ Pump the connection until the response arrived and return the
+            raw response message. """
+        self.dispatcher.wait(self, timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self.response
+
+    def result(self, timeout=None):
+        """ Wait for the response and return its 'result' member, raising
+            CommandError if Chrome answered with an error. """
+        response = self.wait(timeout)
+        if 'error' in response:
+            raise CommandError(self.method, response['error'])
+        return response.get('result', {})
+
+    def _finish(self):
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logger.exception(
+                        'done callback for {} failed'.format(self.method))
+
+
+class CommandDispatcher(object):
+
+    session_id = None
+
+    def __init__(self, soc, event_buffer=10000, codec=None, metrics=None):
+        self.soc = soc
+        self.codec = get_codec(codec)
+        self.metrics = metrics
+        self.connection = self
+        self.sessions = {}
+        self.pending = {}
+        self.events = collections.deque(maxlen=event_buffer)
+        self._ids = itertools.count(1)
+        self._subscribers = collections.defaultdict(list)
+        self._listeners = []
+        self._send_lock = threading.Lock()
+        # reentrant, as subscribers may wait for commands themselves
+        self._recv_lock = threading.RLock()
+
+    def session(self, session_id, event_buffer=10000):
+        """ The SessionDispatcher of a flattened session on this
+            connection. """
+        connection = self.connection
+        session = connection.sessions.get(session_id)
+        if session is None:
+            session = SessionDispatcher(connection, session_id, event_buffer)
+            connection.sessions[session_id] = session
+        return session
+
+    def send(self, method, params=None):
+        """ Send a command without waiting for its response. """
+        command_id = next(self._ids)
+        message = {'id': command_id, 'method': method}
+        if params:
+            message['params'] = params
+        if self.session_id is not None:
+            message['sessionId'] = self.session_id
+        future = CommandFuture(self, command_id, method, params)
+        self.pending[command_id] = future
+        text = self.codec.dumps(message)
+        with self._send_lock:
+            self.soc.send(text)
+        if self.metrics is not None:
+            self.metrics.count_sent(method, len(text))
+        return future
+
+    def execute(self, method, params=None, timeout=None):
+        """ Send a command and wait for its result. """
+        return self.send(method, params).result(timeout)
+
+    def cancel(self, future, exception=None):
+        """ Stop waiting for future. A late response is dropped. """
+        if self.pending.pop(future.id, None) is not None:
+            future.set_exception(
+                    exception or CommandCancelled(future.method))
+
+    def cancel_all(self, exception=None):
+        """ Cancel every command sent through this dispatcher that is
+            still waiting for its response. """
+        for future in list(self.pending.values()):
+            if future.dispatcher is self:
+                self.cancel(future, exception)
+
+    def subscribe(self, method, callback):
+        """ Call callback(frame) for every event named method. method
+            may also be a domain prefix like 'Network.' or '*' for all
+            events. """
+        self._subscribers[method].append(callback)
+
+    def unsubscribe(self, method, callback):
+        try:
+            self._subscribers[method].remove(callback)
+        except ValueError:
+            pass
+
+    def add_listener(self, callback):
+        """ Call callback(frame, method) for every received frame.
+            method is the event name or, for responses, the name of the
+            command answered. """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        try:
+            self._listeners.remove(callback)
+        except ValueError:
+            pass
+
+    def pump(self, timeout=None, until=None):
+        """ Receive and dispatch a single frame. Raises
+            websocket.WebSocketTimeoutException if nothing arrives within
+            timeout, which defaults to the socket timeout. Returns None
+            without receiving if until() is true once it is this thread's
+            turn to read. """
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        if not self._recv_lock.acquire(
+                timeout=-1 if timeout is None else max(timeout, 0)):
+            raise websocket.WebSocketTimeoutException(
+                    'connection busy for {}s'.format(timeout))
+        try:
+            if until is not None and until():
+                return None
+            if deadline is None:
+                raw = self.soc.recv()
+            else:
+                previous = self.soc.gettimeout()
+                self.soc.settimeout(
+                        max(deadline - time.monotonic(), 0.001))
+                try:
+                    raw = self.soc.recv()
+                finally:
+                    self.soc.settimeout(previous)
+            frame = Frame(raw, self.codec)
+            # dispatched before the next frame is read, keeping the order
+            self.connection.dispatch(frame)
+        finally:
+            self._recv_lock.release()
+        return frame
+
+    def dispatch(self, message):
+        """ Route a received Frame or message dict: a response to the
+            dispatcher that sent the command, an event to its session. """
+        if not isinstance(message, Frame):
+            message = Frame.from_message(message, self.codec)
+        if message.id is not None:
+            future = self.pending.pop(message.id, None)
+            method = future.method if future is not None else None
+            if self.metrics is not None:
+                self._count(message, method, future)
+            if future is None:
+                self._notify_listeners(message, method)
+                logger.debug(
+                        'dropping response to unknown command {}'.format(
+                                message.id))
+                return
+            future.dispatcher._notify_listeners(message, method)
+            future.set_response(message)
+            return
+        method = message.method
+        if self.metrics is not None:
+            self._count(message, method)
+        target = self
+        if message.session_id is not None:
+            target = self.sessions.get(message.session_id, self)
+        target._deliver(message, method)
+
+    def _deliver(self, message, method):
+        self._notify_listeners(message, method)
+        self.events.append(message)
+        for callback in self._callbacks_for(method):
+            try:
+                callback(message)
+            except Exception:
+                logger.exception('subscriber for {} failed'.format(method))
+
+    def wait(self, future, timeout=None):
+        """ Pump frames until future is done. Without a timeout this waits
+            as long as frames keep arriving and raises
+            websocket.WebSocketTimeoutException after one socket timeout of
+            silence; with a timeout the command is cancelled and
+            CommandTimeout raised once it expired. """
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        while not future.done():
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.cancel(future, CommandTimeout(
+                            '{} timed out after {}s'.format(
+                                    future.method, timeout)))
+                    if self.metrics is not None:
+                        self.metrics.count_timeout(future.method)
+                    break
+            try:
+                self.pump(remaining, until=future.done)
+            except websocket.WebSocketTimeoutException:
+                if deadline is None:
+                    raise
+
+    def wait_any(self, futures, timeout=None):
+        """ Pump frames until at least one of futures is done and return
+            the set of done futures. Returns an empty set when timeout
+            expires first; without a timeout a socket timeout is raised. """
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        while True:
+            done = set(future for future in futures if future.done())
+            if done or not futures:
+                return done
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return done
+            try:
+                self.pump(remaining, until=lambda: any(
+                        future.done() for future in futures))
+            except websocket.WebSocketTimeoutException:
+                if deadline is None:
+                    raise
+
+    def next_event(self, timeout=None):
+        """ Return the oldest buffered event, pumping frames until one
+            arrives. """
+        return self.next_frame(timeout).message
+
+    def next_frame(self, timeout=None):
+        """ Like next_event(), but return the event as an undecoded
+            Frame. """
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        while not self.events:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise websocket.WebSocketTimeoutException(
+                            'no event within {}s'.format(timeout))
+            self.pump(remaining, until=lambda: bool(self.events))
+        return self.events.popleft()
+
+    def clear_events(self):
+        """ Drop the buffered events, which subscribers have seen
+            already. Returns how many were dropped. """
+        dropped = len(self.events)
+        self.events.clear()
+        return dropped
+
+    def _count(self, frame, method, future=None):
+        size = len(frame.raw) if frame.raw is not None else 0
+        self.metrics.count_received(method or 'unknown', size)
+        if future is not None:
+            self.metrics.observe_rtt(
+                    method, time.monotonic() - future.sent_at)
+            if frame.is_error:
+                self.metrics.count_error(method)
+
+    def _notify_listeners(self, message, method):
+        for listener in self._listeners:
+            try:
+                listener(message, method)
+            except Exception:
+                logger.exception('listener failed on {}'.format(method))
+
+    def _callbacks_for(self, method):
+        if not method:
+            return []
+        callbacks = list(self._subscribers.get(method, ()))
+        domain = method.split('.', 1)[0] + '.'
+        callbacks.extend(self._subscribers.get(domain, ()))
+        callbacks.extend(self._subscribers.get('*', ()))
+        return callbacks
+
+
+class SessionDispatcher(CommandDispatcher):
+    """ A flattened session on the connection of a CommandDispatcher.
+        Commands carry its sessionId, events with that sessionId are
+        buffered and handed to its own subscribers. """
+
+    def __init__(self, connection, session_id, event_buffer=10000):
+        self.connection = connection
+        self.session_id = session_id
+        self.soc = connection.soc
+        self.codec = connection.codec
+        self.metrics = connection.metrics
+        self.sessions = connection.sessions
+        # message ids are unique per connection
+        self.pending = connection.pending
+        self._ids = connection._ids
+        self._send_lock = connection._send_lock
+        self._recv_lock = connection._recv_lock
+        self.events = collections.deque(maxlen=event_buffer)
+        self._subscribers = collections.defaultdict(list)
+        self._listeners = []
+
+    def close(self):
+        """ Stop routing events to this session and cancel its pending
+            commands. The target itself is not detached. """
+        if self.sessions.get(self.session_id) is self:
+            del self.sessions[self.session_id]
+        self.cancel_all()
@@ -0,0 +1,127 @@
+"""
+Stream received Chrome debugger messages to a NDJSON log file
+"""
+
+import collections
+import gzip
+import io
+import json
+import logging
+from .codec import Frame
+from .dispatcher import event_matches
+
+
+logger = logging.getLogger(__name__)
+
+# responses whose payload is saved elsewhere and only bloats the log
+DEFAULT_EXCLUDE = (
+        'Network.getResponseBody',
+        'Page.captureScreenshot',
+)
+
+COMPRESSION_SUFFIX = {
+        'gzip': '.gz',
+        'zstd': '.zst',
+}
+
+
+class EventLog(object):
+    """ Writes every message passed to write() as one JSON line to path.
+
+        Messages are filtered by method: an event by its name, a response
+        by the name of the command it answers. include and exclude are
+        sequences of method names, domain prefixes like 'Network.' or '*'.
+        compression is None, 'gzip' or 'zstd' (needs the zstandard
+        package). The last buffer_size messages written are kept in
+        recent. """
+
+    def __init__(
+            self,
+            path=None,
+            compression=None,
+            include=None,
+            exclude=DEFAULT_EXCLUDE,
+            buffer_size=1000,
+    ):
+        if compression is not None and compression not in COMPRESSION_SUFFIX:
+            raise ValueError(
+                    'unknown compression {}'.format(compression))
+        suffix = COMPRESSION_SUFFIX.get(compression)
+        if path and suffix and not path.endswith(suffix):
+            path += suffix
+        self.path = path
+        self.compression = compression
+        self.include = include
+        self.exclude = exclude or ()
+        self.recent = collections.deque(maxlen=buffer_size)
+        self.written = 0
+        self._file = None
+        self._raw = None
+        self._mode = 'w'
+
+    def wants(self, method):
+        if not method:
+            return self.include is None
+        for pattern in self.exclude:
+            if event_matches(pattern, method):
+                return False
+        if self.include is None:
+            return True
+        for pattern in self.include:
+            if event_matches(pattern, method):
+                return True
+        return False
+
+    def write(self, message, method=None):
+        if method is None:
+            method = message.get('method')
+        if not self.wants(method):
+            return
+        self.recent.append(message)
+        if not self.path:
+            return
+        if self._file is None:
+            self.open()
+        if isinstance(message, Frame):
+            # written as received, without decoding and encoding it again
+            line = message.text()
+        else:
+            line = json.dumps(message, separators=(',', ':'))
+        self._file.write(line)
+        self._file.write('\n')
+        self.written += 1
+
+    __call__ = write
+
+    def open(self):
+        """ Open path, truncating it on the first open and appending when
+            reopened after close(). """
+        if self.compression == 'gzip':
+            self._file = gzip.open(self.path, self._mode + 't')
+        elif self.compression == 'zstd':
+            import zstandard
+            self._raw = open(self.path, self._mode + 'b')
+            writer = zstandard.ZstdCompressor().stream_writer(self._raw)
+            self._file = io.TextIOWrapper(writer, encoding='utf-8')
+        else:
+            self._file = open(self.path, self._mode)
+        self._mode = 'a'
+        logger.debug('streaming chrome log to {}'.format(self.path))
+
+    def flush(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        if self.compression == 'zstd':
+            import zstandard
+            self._file.buffer.flush(zstandard.FLUSH_FRAME)
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+        self._file = None
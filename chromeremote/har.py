@@ -0,0 +1,348 @@
+"""
+Write a HAR 1.2 file from Network and Page events as they arrive
+
+    > har = HarWriter('/tmp/page/page.har', title=url)
+    > shell.subscribe('Network.', har.handle_event)
+    > shell.subscribe('Page.', har.handle_event)
+    > ...
+    > har.close()
+
+An entry is written as soon as its request finished, failed or was
+redirected, so only the requests still loading are kept in memory. The
+entries array therefore comes before the pages array in the file, which
+JSON readers do not mind. Requests still open at close() are written with
+what is known about them and _incomplete set.
+
+Timings are taken from response.timing where Chrome sends it and from the
+event timestamps otherwise. Besides the HAR fields every entry carries
+_resourceType, _transferSize, _fromCache ('memory' or 'disk') and, for
+failed requests, _error and _blockedReason.
+"""
+
+import datetime
+import json
+import logging
+import urllib.parse
+
+
+logger = logging.getLogger(__name__)
+
+HAR_VERSION = '1.2'
+
+HTTP_VERSIONS = {
+        'http/0.9': 'HTTP/0.9',
+        'http/1.0': 'HTTP/1.0',
+        'http/1.1': 'HTTP/1.1',
+        'h2': 'HTTP/2',
+        'h2c': 'HTTP/2',
+        'h3': 'HTTP/3',
+        'quic': 'HTTP/3',
+}
+
+
+class _Pending(object):
+
+    __slots__ = (
+            'request', 'wall_time', 'timestamp', 'resource_type',
+            'response', 'response_timestamp', 'from_cache', 'data_length',
+    )
+
+    def __init__(self, params):
+        self.request = params['request']
+        self.wall_time = params.get('wallTime')
+        self.timestamp = params.get('timestamp')
+        self.resource_type = params.get('type')
+        self.response = None
+        self.response_timestamp = None
+        self.from_cache = None
+        self.data_length = 0
+
+
+class HarWriter(object):
+
+    def __init__(self, path, page_id='page_1', title='', creator=None):
+        self.path = path
+        self.page_id = page_id
+        self.title = title
+        self.creator = creator or {
+                'name': __name__.split('.')[0], 'version': ''}
+        self.written = 0
+        self.pending = {}
+        self._file = None
+        self._started = None
+        self._page_timestamp = None
+        self._page_timings = {}
+        self._handlers = {
+                'Network.requestWillBeSent': self._request_will_be_sent,
+                'Network.requestServedFromCache': self._served_from_cache,
+                'Network.responseReceived': self._response_received,
+                'Network.dataReceived': self._data_received,
+                'Network.loadingFinished': self._loading_finished,
+                'Network.loadingFailed': self._loading_failed,
+                'Page.domContentEventFired': self._dom_content_loaded,
+                'Page.loadEventFired': self._load_event,
+        }
+
+    def handle_event(self, message):
+        """ Update the HAR from an event. Returns True if the event was
+            used. """
+        handler = self._handlers.get(message.get('method'))
+        if handler is None:
+            return False
+        handler(message['params'])
+        return True
+
+    __call__ = handle_event
+
+    def close(self):
+        """ Write the requests still open and the page, and close the
+            file. """
+        for request_id in list(self.pending):
+            self._write(self.pending.pop(request_id), incomplete=True)
+        if self._file is None:
+            self._open()
+        page = {
+                'startedDateTime': self._started or _iso_time(None),
+                'id': self.page_id,
+                'title': self.title,
+                'pageTimings': {
+                        'onContentLoad': self._page_timings.get(
+                                'onContentLoad', -1),
+                        'onLoad': self._page_timings.get('onLoad', -1),
+                },
+        }
+        self._file.write('\n],\n"pages":[{}]}}}}\n'.format(
+                json.dumps(page, separators=(',', ':'))))
+        self._file.close()
+        self._file = None
+        logger.debug('{} HAR entries written to {}'.format(
+                self.written, self.path))
+
+    def _open(self):
+        self._file = open(self.path, 'w')
+        self._file.write('{{"log":{{"version":"{}","creator":{},'
+                         '"entries":['.format(
+                                 HAR_VERSION,
+                                 json.dumps(self.creator,
+                                            separators=(',', ':'))))
+
+    def _request_will_be_sent(self, params):
+        request_id = params['requestId']
+        if 'redirectResponse' in params:
+            hop = self.pending.pop(request_id, None)
+            if hop is not None:
+                hop.response = params['redirectResponse']
+                hop.response_timestamp = params.get('timestamp')
+                self._write(hop, end=params.get('timestamp'),
+                            transfer_size=params['redirectResponse'].get(
+                                    'encodedDataLength', 0))
+        pending = _Pending(params)
+        if self._started is None:
+            self._started = _iso_time(pending.wall_time)
+            self._page_timestamp = pending.timestamp
+        self.pending[request_id] = pending
+
+    def _served_from_cache(self, params):
+        pending = self.pending.get(params['requestId'])
+        if pending is not None:
+            pending.from_cache = 'memory'
+
+    def _response_received(self, params):
+        pending = self.pending.get(params['requestId'])
+        if pending is None:
+            return
+        pending.response = params['response']
+        pending.response_timestamp = params.get('timestamp')
+        if pending.from_cache is None \
+                and pending.response.get('fromDiskCache'):
+            pending.from_cache = 'disk'
+
+    def _data_received(self, params):
+        pending = self.pending.get(params['requestId'])
+        if pending is not None:
+            pending.data_length += params.get('dataLength', 0)
+
+    def _loading_finished(self, params):
+        pending = self.pending.pop(params['requestId'], None)
+        if pending is not None:
+            self._write(pending, end=params.get('timestamp'),
+                        transfer_size=params.get('encodedDataLength'))
+
+    def _loading_failed(self, params):
+        pending = self.pending.pop(params['requestId'], None)
+        if pending is not None:
+            self._write(pending, end=params.get('timestamp'),
+                        error=params.get('errorText'),
+                        blocked_reason=params.get('blockedReason'))
+
+    def _dom_content_loaded(self, params):
+        self._page_timing('onContentLoad', params.get('timestamp'))
+
+    def _load_event(self, params):
+        self._page_timing('onLoad', params.get('timestamp'))
+
+    def _page_timing(self, name, timestamp):
+        if timestamp is not None and self._page_timestamp is not None:
+            self._page_timings[name] = round(
+                    (timestamp - self._page_timestamp) * 1000, 3)
+
+    def _write(self, pending, end=None, transfer_size=None, error=None,
+               blocked_reason=None, incomplete=False):
+        entry = self._entry(pending, end, transfer_size)
+        if error is not None:
+            entry['_error'] = error
+        if blocked_reason is not None:
+            entry['_blockedReason'] = blocked_reason
+        if incomplete:
+            entry['_incomplete'] = True
+        if self._file is None:
+            self._open()
+        elif self.written:
+            self._file.write(',')
+        self._file.write('\n')
+        self._file.write(json.dumps(entry, separators=(',', ':')))
+        self.written += 1
+
+    def _entry(self, pending, end, transfer_size):
+        request = pending.request
+        response = pending.response or {}
+        http_version = HTTP_VERSIONS.get(
+                (response.get('protocol') or '').lower(), 'unknown')
+        request_headers = response.get('requestHeaders') \
+            or request.get('headers', {})
+        entry = {
+                'pageref': self.page_id,
+                'startedDateTime': _iso_time(pending.wall_time),
+                'request': {
+                        'method': request.get('method', 'GET'),
+                        'url': request['url'],
+                        'httpVersion': http_version,
+                        'cookies': [],
+                        'headers': _headers(request_headers),
+                        'queryString': [
+                                {'name': name, 'value': value}
+                                for name, value in urllib.parse.parse_qsl(
+                                        urllib.parse.urlsplit(
+                                                request['url']).query,
+                                        keep_blank_values=True)],
+                        'headersSize': -1,
+                        'bodySize': len(request.get('postData', '')),
+                },
+                'cache': {},
+                '_resourceType': pending.resource_type,
+        }
+        if 'postData' in request:
+            entry['request']['postData'] = {
+                    'mimeType': _header(request_headers, 'Content-Type')
+                    or '',
+                    'text': request['postData'],
+            }
+        headers = response.get('headers', {})
+        headers_size = response.get('encodedDataLength', -1)
+        if pending.from_cache:
+            transfer_size = 0
+            headers_size = 0
+        if transfer_size is None:
+            body_size = -1
+        elif headers_size is not None and headers_size >= 0:
+            # responseReceived counts the bytes received so far, which are
+            # the headers, loadingFinished all of them
+            body_size = max(transfer_size - headers_size, 0)
+        else:
+            body_size = transfer_size
+        entry['response'] = {
+                'status': response.get('status', 0),
+                'statusText': response.get('statusText', ''),
+                'httpVersion': http_version,
+                'cookies': [],
+                'headers': _headers(headers),
+                'content': {
+                        'size': pending.data_length,
+                        'mimeType': response.get('mimeType', ''),
+                },
+                'redirectURL': _header(headers, 'Location') or '',
+                'headersSize': headers_size
+                if headers_size is not None else -1,
+                'bodySize': body_size,
+        }
+        entry['_transferSize'] = transfer_size \
+            if transfer_size is not None else -1
+        if pending.from_cache:
+            entry['_fromCache'] = pending.from_cache
+        if response.get('remoteIPAddress'):
+            entry['serverIPAddress'] = response['remoteIPAddress']
+        if response.get('connectionId'):
+            entry['connection'] = str(response['connectionId'])
+        entry['timings'] = _timings(pending, response, end)
+        # ssl is part of connect
+        entry['time'] = round(sum(
+                value for name, value in entry['timings'].items()
+                if name != 'ssl' and value > 0), 3)
+        return entry
+
+
+def _timings(pending, response, end):
+    """ The HAR timings in ms of a request ending at the timestamp end. """
+    timing = response.get('timing')
+    timings = {
+            'blocked': -1, 'dns': -1, 'connect': -1, 'ssl': -1,
+            'send': 0, 'wait': 0, 'receive': 0,
+    }
+    if timing:
+        start = timing['requestTime']
+        first = [timing[name] for name in (
+                'dnsStart', 'connectStart', 'sendStart')
+                if timing.get(name, -1) >= 0]
+        timings['blocked'] = _ms(first[0] / 1000 if first else 0)
+        for name, begin, finish in (
+                ('dns', 'dnsStart', 'dnsEnd'),
+                ('connect', 'connectStart', 'connectEnd'),
+                ('ssl', 'sslStart', 'sslEnd')):
+            if timing.get(begin, -1) >= 0:
+                timings[name] = _ms(
+                        (timing[finish] - timing[begin]) / 1000)
+        timings['send'] = _ms(
+                (timing['sendEnd'] - timing['sendStart']) / 1000)
+        timings['wait'] = _ms(
+                (timing['receiveHeadersEnd'] - timing['sendEnd']) / 1000)
+        if end is not None:
+            timings['receive'] = _ms(
+                    end - start - timing['receiveHeadersEnd'] / 1000)
+        return timings
+    # served from a cache or failed early: only the events are known
+    started = pending.timestamp
+    responded = pending.response_timestamp
+    if started is not None and responded is not None:
+        timings['wait'] = _ms(responded - started)
+    if end is not None:
+        if responded is not None:
+            timings['receive'] = _ms(end - responded)
+        elif started is not None:
+            timings['wait'] = _ms(end - started)
+    return timings
+
+
+def _ms(seconds):
+    return max(round(seconds * 1000, 3), 0)
+
+
+def _headers(headers):
+    return [{'name': name, 'value': value}
+            for name, value in headers.items()]
+
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _iso_time(wall_time):
+    if wall_time is None:
+        moment = datetime.datetime.now(datetime.timezone.utc)
+    else:
+        moment = datetime.datetime.fromtimestamp(
+                wall_time, datetime.timezone.utc)
+    return moment.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
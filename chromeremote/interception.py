@@ -0,0 +1,149 @@
+"""
+Block requests before Chrome spends time and bandwidth on them
+
+    > policy = BlockingPolicy(
+    >         url_patterns=['*doubleclick.net*', '*.mp4'],
+    >         resource_types=['Image', 'Media', 'Font'],
+    >         max_response_size=5 * 1024 * 1024,
+    > )
+    > browser = ChromeBrowser(chrome_bin=chrome, blocking=policy)
+
+URL patterns are passed to Network.setBlockedURLs, which needs no round
+trip per request. Resource types and the response size limit pause the
+matching requests with the Fetch domain and fail them from a dispatcher
+subscriber. The size limit only pauses the responses of
+size_limit_types, by default the types carrying large files, so
+documents, scripts and XHRs are not held up by a round trip each.
+"""
+
+import logging
+from .request_tracker import dict_intval
+
+
+logger = logging.getLogger(__name__)
+
+# Network.ResourceType values
+RESOURCE_TYPES = (
+        'Document', 'Stylesheet', 'Image', 'Media', 'Font', 'Script',
+        'TextTrack', 'XHR', 'Fetch', 'Prefetch', 'EventSource', 'WebSocket',
+        'Manifest', 'SignedExchange', 'Ping', 'CSPViolationReport',
+        'Preflight', 'Other',
+)
+
+# resource types whose responses max_response_size is checked for
+SIZE_LIMIT_TYPES = ('Image', 'Media', 'Font', 'Other')
+
+
+class BlockingPolicy(object):
+
+    def __init__(
+            self,
+            url_patterns=(),
+            resource_types=(),
+            max_response_size=None,
+            size_limit_types=SIZE_LIMIT_TYPES,
+    ):
+        for resource_type in tuple(resource_types) + tuple(size_limit_types):
+            if resource_type not in RESOURCE_TYPES:
+                raise ValueError(
+                        'unknown resource type {}'.format(resource_type))
+        self.url_patterns = list(url_patterns)
+        self.resource_types = set(resource_types)
+        self.max_response_size = max_response_size
+        # requests of a blocked type never reach the response stage
+        self.size_limit_types = set(size_limit_types) - self.resource_types
+
+    def fetch_patterns(self):
+        """ Fetch.enable patterns pausing the requests to check. """
+        patterns = [
+                {
+                        'urlPattern': '*',
+                        'resourceType': resource_type,
+                        'requestStage': 'Request',
+                }
+                for resource_type in sorted(self.resource_types)
+        ]
+        if self.max_response_size is not None:
+            patterns.extend(
+                    {
+                            'urlPattern': '*',
+                            'resourceType': resource_type,
+                            'requestStage': 'Response',
+                    }
+                    for resource_type in sorted(self.size_limit_types)
+            )
+        return patterns
+
+
+class RequestInterceptor(object):
+    """ Applies a BlockingPolicy to one page connection.
+
+        send(method, params) sends a command without waiting for its
+        response; blocked requests are recorded in tracker. Responses not
+        blocked are handed to streamer, a body_stream.BodyStreamer, if it
+        wants them. """
+
+    def __init__(self, policy, send, tracker=None, streamer=None):
+        self.policy = policy
+        self.send = send
+        self.tracker = tracker
+        self.streamer = streamer
+        self.blocked = 0
+
+    def commands(self):
+        """ The (method, params) commands that set up blocking. """
+        commands = []
+        if self.policy.url_patterns:
+            commands.append((
+                    'Network.setBlockedURLs',
+                    {'urls': self.policy.url_patterns},
+            ))
+        patterns = self.fetch_patterns()
+        if patterns:
+            commands.append(('Fetch.enable', {'patterns': patterns}))
+        return commands
+
+    def fetch_patterns(self):
+        patterns = self.policy.fetch_patterns()
+        if self.streamer is not None:
+            for pattern in self.streamer.fetch_patterns():
+                if pattern not in patterns:
+                    patterns.append(pattern)
+        return patterns
+
+    def on_request_paused(self, event):
+        params = event['params']
+        reason = self.block_reason(params)
+        if reason is None:
+            if self.streamer is not None and self.streamer.wants(params):
+                self.streamer.start(params)
+                return
+            self.send('Fetch.continueRequest',
+                      {'requestId': params['requestId']})
+            return
+        self.blocked += 1
+        logger.debug('blocking {} ({})'.format(
+                params['request']['url'], reason))
+        if self.tracker is not None and 'networkId' in params:
+            self.tracker.mark_blocked(params['networkId'], reason)
+        self.send('Fetch.failRequest', {
+                'requestId': params['requestId'],
+                'errorReason': 'BlockedByClient',
+        })
+
+    def block_reason(self, params):
+        if 'responseStatusCode' in params or 'responseErrorReason' in params:
+            limit = self.policy.max_response_size
+            if limit is None or params.get('resourceType') \
+                    not in self.policy.size_limit_types:
+                return None
+            headers = dict(
+                    (header['name'].lower(), header['value'])
+                    for header in params.get('responseHeaders', ()))
+            size = dict_intval('content-length', headers)
+            if size is not None and size > limit:
+                return 'size'
+            return None
+        if params.get('resourceType') in self.policy.resource_types:
+            return 'resource type'
+        return None
@@ -0,0 +1,105 @@
+"""
+Chrome command line presets
+
+    > launch = LaunchProfile('dense', renderer_process_limit=4)
+    > browser = ChromeBrowser(chrome_bin=chrome, launch=launch)
+
+'dense' trades speed for memory to pack many browsers on one host: few
+renderer processes, a small disk cache and JS heap, no site isolation and
+no background services. 'fast' keeps background tabs and timers running
+at full speed and turns off everything Chrome does besides loading the
+page. The explicit arguments of LaunchProfile override the preset.
+"""
+
+# switches shared by both presets: services a crawler never needs
+_QUIET = (
+        '--no-first-run',
+        '--disable-background-networking',
+        '--disable-component-update',
+        '--disable-default-apps',
+        '--disable-sync',
+        '--metrics-recording-only',
+        '--mute-audio',
+)
+
+PRESETS = {
+        'default': (),
+        'fast': _QUIET + (
+                '--disable-gpu',
+                '--disable-background-timer-throttling',
+                '--disable-backgrounding-occluded-windows',
+                '--disable-renderer-backgrounding',
+                '--disable-ipc-flooding-protection',
+                '--disable-hang-monitor',
+        ),
+        'dense': _QUIET + (
+                '--disable-gpu',
+                '--disable-dev-shm-usage',
+                '--renderer-process-limit=2',
+                '--disk-cache-size={}'.format(32 << 20),
+                '--js-flags=--max-old-space-size=256',
+                '--disable-site-isolation-trials',
+                '--disable-features=site-per-process,BackForwardCache,'
+                'MediaRouter,OptimizationHints',
+                '--aggressive-cache-discard',
+        ),
+}
+
+
+class LaunchProfile(object):
+    """ Extra Chrome switches: those of a preset from PRESETS, then the
+        ones given as arguments, then flags. A later switch replaces an
+        earlier one of the same name.
+
+        disk_cache_size is in bytes, js_heap_size in MiB. gpu=False adds
+        --disable-gpu, sandbox=False --no-sandbox, which Chrome needs to
+        run as root. """
+
+    def __init__(
+            self,
+            preset='default',
+            flags=(),
+            renderer_process_limit=None,
+            disk_cache_size=None,
+            js_heap_size=None,
+            gpu=None,
+            sandbox=True,
+    ):
+        if preset not in PRESETS:
+            raise ValueError('unknown launch preset {}'.format(preset))
+        self.preset = preset
+        self.flags = tuple(flags)
+        self.renderer_process_limit = renderer_process_limit
+        self.disk_cache_size = disk_cache_size
+        self.js_heap_size = js_heap_size
+        self.gpu = gpu
+        self.sandbox = sandbox
+
+    def args(self):
+        switches = list(PRESETS[self.preset])
+        if self.renderer_process_limit is not None:
+            switches.append('--renderer-process-limit={}'.format(
+                    self.renderer_process_limit))
+        if self.disk_cache_size is not None:
+            switches.append('--disk-cache-size={}'.format(
+                    self.disk_cache_size))
+        if self.js_heap_size is not None:
+            switches.append('--js-flags=--max-old-space-size={}'.format(
+                    self.js_heap_size))
+        if self.gpu is False:
+            switches.append('--disable-gpu')
+        if not self.sandbox:
+            switches.append('--no-sandbox')
+        switches.extend(self.flags)
+        merged = {}
+        for switch in switches:
+            merged.pop(switch.split('=', 1)[0], None)
+            merged[switch.split('=', 1)[0]] = switch
+        return list(merged.values())
+
+
+def launch_profile(launch):
+    """ A LaunchProfile for a preset name, a LaunchProfile or None. """
+    if launch is None or isinstance(launch, LaunchProfile):
+        return launch
+    return LaunchProfile(launch)
@@ -0,0 +1,265 @@
+"""
+Timings and counters of browsers and debugger connections
+
+    > metrics = Metrics()
+    > metrics.add_hook(lambda kind, name, value: ...)
+    > browser = ChromeBrowser(chrome_bin=chrome, metrics=metrics)
+    > ...
+    > metrics.snapshot()            # dict, see to_json()
+    > metrics.to_prometheus()       # text exposition format
+
+Every browser records the duration of its phases (chrome_launch,
+console_setup, navigate, wait, screenshot, log_flush, get_content,
+get_cookies, chrome_shutdown), its shells count messages and bytes per
+method in both directions and the round trip time of every command.
+Sizes are counted in characters of the JSON text, which equals bytes for
+the ASCII Chrome mostly sends. Timeouts and error responses are counted
+by name. One Metrics may be shared by all browsers of a pool.
+Browsers with resource limits also set gauges of the memory and CPU use
+of their Chrome, labelled with its debugging port.
+
+Hooks are called as hook(kind, name, value) for every phase ('phase',
+seconds), command round trip ('rtt', seconds), timeout ('timeout', 1)
+and error ('error', 1).
+"""
+
+import asyncio
+import bisect
+import collections
+import contextlib
+import functools
+import json
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+        0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+        2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class Histogram(object):
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # counts[i] holds observations <= buckets[i], the last one the rest
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """ (upper bound, observations <= bound) pairs as exported. """
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def as_dict(self):
+        return {
+                'count': self.count,
+                'sum': self.sum,
+                'buckets': dict(
+                        ('+Inf' if bound == float('inf') else bound, count)
+                        for bound, count in self.cumulative()),
+        }
+
+
+class Metrics(object):
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._hooks = []
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phases = {}
+            self.rtt = {}
+            self.received = collections.Counter()
+            self.received_bytes = collections.Counter()
+            self.sent = collections.Counter()
+            self.sent_bytes = collections.Counter()
+            self.timeouts = collections.Counter()
+            self.errors = collections.Counter()
+            self.gauges = collections.defaultdict(dict)
+
+    def add_hook(self, hook):
+        """ Call hook(kind, name, value) for every phase, round trip,
+            timeout and error recorded. """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        try:
+            self._hooks.remove(hook)
+        except ValueError:
+            pass
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """ Record the duration of the with block as phase name, also when
+            it raises. """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe_phase(name, time.monotonic() - start)
+
+    def observe_phase(self, name, seconds):
+        self._observe(self.phases, name, seconds)
+        self._call_hooks('phase', name, seconds)
+
+    def observe_rtt(self, method, seconds):
+        self._observe(self.rtt, method, seconds)
+        self._call_hooks('rtt', method, seconds)
+
+    def count_received(self, method, size):
+        with self._lock:
+            self.received[method] += 1
+            self.received_bytes[method] += size
+
+    def count_sent(self, method, size):
+        with self._lock:
+            self.sent[method] += 1
+            self.sent_bytes[method] += size
+
+    def count_timeout(self, name):
+        with self._lock:
+            self.timeouts[name] += 1
+        self._call_hooks('timeout', name, 1)
+
+    def count_error(self, name):
+        with self._lock:
+            self.errors[name] += 1
+        self._call_hooks('error', name, 1)
+
+    def set_gauge(self, name, key, value):
+        """ Set gauge name of key, a browser for example, to value. """
+        with self._lock:
+            self.gauges[name][key] = value
+
+    def snapshot(self):
+        """ All metrics as a dict of plain values. """
+        with self._lock:
+            return {
+                    'phases': dict(
+                            (name, histogram.as_dict())
+                            for name, histogram in self.phases.items()),
+                    'rtt': dict(
+                            (name, histogram.as_dict())
+                            for name, histogram in self.rtt.items()),
+                    'received': dict(self.received),
+                    'received_bytes': dict(self.received_bytes),
+                    'sent': dict(self.sent),
+                    'sent_bytes': dict(self.sent_bytes),
+                    'timeouts': dict(self.timeouts),
+                    'errors': dict(self.errors),
+                    'gauges': dict(
+                            (name, dict(values))
+                            for name, values in self.gauges.items()),
+            }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self, prefix='chromeremote'):
+        """ The metrics in the Prometheus text exposition format. """
+        lines = []
+        with self._lock:
+            _histograms(lines, prefix + '_phase_seconds', 'phase',
+                        self.phases, 'Duration of browser phases.')
+            _histograms(lines, prefix + '_command_rtt_seconds', 'method',
+                        self.rtt, 'Round trip time of commands.')
+            for name, label, counter, text in (
+                    ('messages_received_total', 'method', self.received,
+                     'Messages received by method.'),
+                    ('received_bytes_total', 'method', self.received_bytes,
+                     'Bytes received by method.'),
+                    ('messages_sent_total', 'method', self.sent,
+                     'Commands sent by method.'),
+                    ('sent_bytes_total', 'method', self.sent_bytes,
+                     'Bytes sent by method.'),
+                    ('timeouts_total', 'name', self.timeouts,
+                     'Timeouts by command or phase.'),
+                    ('errors_total', 'name', self.errors,
+                     'Error responses and failures by name.'),
+            ):
+                name = '{}_{}'.format(prefix, name)
+                lines.append('# HELP {} {}'.format(name, text))
+                lines.append('# TYPE {} counter'.format(name))
+                for key, value in sorted(counter.items()):
+                    lines.append('{}{{{}="{}"}} {}'.format(
+                            name, label, _escape(key), value))
+            for name, values in sorted(self.gauges.items()):
+                name = '{}_{}'.format(prefix, name)
+                lines.append('# TYPE {} gauge'.format(name))
+                for key, value in sorted(values.items()):
+                    lines.append('{}{{browser="{}"}} {}'.format(
+                            name, _escape(key), value))
+        return '\n'.join(lines) + '\n'
+
+    def _observe(self, histograms, name, value):
+        with self._lock:
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def _call_hooks(self, kind, name, value):
+        for hook in self._hooks:
+            try:
+                hook(kind, name, value)
+            except Exception:
+                logger.exception('metrics hook failed on {} {}'.format(
+                        kind, name))
+
+
+def timed(name):
+    """ Decorator recording every call of a method, or coroutine, as
+        phase name in self.metrics. """
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(self, *args, **kwargs):
+                with self.metrics.phase(name):
+                    return await func(self, *args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(self, *args, **kwargs):
+                with self.metrics.phase(name):
+                    return func(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def _histograms(lines, name, label, histograms, text):
+    lines.append('# HELP {} {}'.format(name, text))
+    lines.append('# TYPE {} histogram'.format(name))
+    for key, histogram in sorted(histograms.items()):
+        key = _escape(key)
+        for bound, count in histogram.cumulative():
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append('{}_bucket{{{}="{}",le="{}"}} {}'.format(
+                    name, label, key, le, count))
+        lines.append('{}_sum{{{}="{}"}} {}'.format(
+                name, label, key, histogram.sum))
+        lines.append('{}_count{{{}="{}"}} {}'.format(
+                name, label, key, histogram.count))
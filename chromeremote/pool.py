@@ -0,0 +1,193 @@
+"""
+Pool of running Chrome browsers reused across many page loads
+"""
+
+import contextlib
+import logging
+import os
+import queue
+import threading
+from .chrome_browser import ChromeBrowser
+from .deadline import DeadlineExceeded
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChromeBrowserPool(object):
+    """ Keeps size Chrome processes running on the debugging ports
+        base_port, base_port + 1, ... and hands them out one page job at a
+        time:
+
+        > with ChromeBrowserPool(size=4, chrome_bin=chrome) as pool:
+        >     with pool.page(work_dir='/tmp/crawl/1') as browser:
+        >         browser.load_page(url)
+        >         browser.get_content()
+
+        Every job gets a new tab, in its own browser context if isolated
+        is set. A browser is restarted after pages_per_browser pages, when
+        it crashed, when a job failed or when it went past its
+        resource_limits. Further keyword arguments are
+        passed to ChromeBrowser; a persistent_profile and a cookie_jar
+        get the slot appended, and the profile keeps its cache only with
+        isolated=False, as isolated contexts start empty. """
+
+    def __init__(
+            self,
+            size=4,
+            base_port=9111,
+            pages_per_browser=50,
+            isolated=True,
+            work_dir='/tmp/chromeremote',
+            acquire_timeout=None,
+            browser_class=ChromeBrowser,
+            **browser_args
+    ):
+        self.size = size
+        self.base_port = base_port
+        self.pages_per_browser = pages_per_browser
+        self.isolated = isolated
+        self.work_dir = work_dir
+        self.acquire_timeout = acquire_timeout
+        self.browser_class = browser_class
+        self.browser_args = browser_args
+        self.browsers = {}
+        self.restarts = 0
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        try:
+            for slot in range(self.size):
+                self._idle.put(self._launch(slot))
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        """ Stop all browsers of the pool. """
+        for browser in list(self.browsers.values()):
+            self._stop(browser)
+        self.browsers.clear()
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        self._started = False
+
+    def acquire(self, work_dir=None):
+        """ Wait for an idle browser and prepare a new tab in it. The
+            output files of the job are written to work_dir. """
+        self.start()
+        browser = self._idle.get(timeout=self.acquire_timeout)
+        try:
+            if not browser.is_alive():
+                browser = self._restart(browser)
+            browser.reset(work_dir)
+            try:
+                browser.open_page(isolated=self.isolated)
+            except Exception:
+                logger.exception(
+                        'browser on port {} failed, restarting it'.format(
+                                browser.chrome_sock))
+                browser = self._restart(browser)
+                browser.reset(work_dir)
+                browser.open_page(isolated=self.isolated)
+        except BaseException:
+            self._idle.put(browser)
+            raise
+        return browser
+
+    def release(self, browser, failed=False):
+        """ Close the tab of a finished job, wait for its files and return
+            the browser to the pool, restarting it if needed. """
+        try:
+            browser.close_page()
+            browser.flush_artifacts()
+        except Exception:
+            logger.exception('closing tab failed')
+            failed = True
+        try:
+            if browser.recycle_needed:
+                logger.info('recycling browser on port {}: {}'.format(
+                        browser.chrome_sock, browser.recycle_needed))
+                failed = True
+            if failed or not browser.is_alive() \
+                    or browser.pages_loaded >= self.pages_per_browser:
+                browser = self._restart(browser)
+        finally:
+            self._idle.put(browser)
+
+    @contextlib.contextmanager
+    def page(self, work_dir=None):
+        browser = self.acquire(work_dir)
+        try:
+            yield browser
+        except DeadlineExceeded:
+            # a slow page, Chrome itself is fine: only its tab is closed
+            self.release(browser)
+            raise
+        except BaseException:
+            self.release(browser, failed=True)
+            raise
+        self.release(browser)
+
+    def _launch(self, slot):
+        browser_args = dict(self.browser_args)
+        if browser_args.get('persistent_profile'):
+            # a profile can only be used by one Chrome at a time
+            browser_args['persistent_profile'] = '{}-{}'.format(
+                    browser_args['persistent_profile'], slot)
+        else:
+            browser_args.setdefault('clear_browser_data', not self.isolated)
+        if browser_args.get('cookie_jar'):
+            # every Chrome saves its own cookies
+            root, ext = os.path.splitext(browser_args['cookie_jar'])
+            browser_args['cookie_jar'] = '{}-{}{}'.format(root, slot, ext)
+        browser = self.browser_class(
+                socket=self.base_port + slot,
+                work_dir=os.path.join(
+                        self.work_dir, 'browser-{}'.format(slot)),
+                **browser_args
+        )
+        browser.pool_slot = slot
+        self.browsers[slot] = browser
+        try:
+            browser.start_chrome()
+        except Exception:
+            logger.exception(
+                    'starting browser on port {} failed'.format(
+                            browser.chrome_sock))
+            self._stop(browser)
+            del self.browsers[slot]
+            raise
+        return browser
+
+    def _restart(self, browser):
+        logger.debug('restarting browser on port {} after {} pages'.format(
+                browser.chrome_sock, browser.pages_loaded))
+        self._stop(browser)
+        self.restarts += 1
+        return self._launch(browser.pool_slot)
+
+    def _stop(self, browser):
+        if not browser.chrome_pid:
+            return
+        try:
+            browser.clean_chrome()
+        except Exception:
+            logger.exception('stopping browser on port {} failed'.format(
+                    browser.chrome_sock))
@@ -2,7 +2,7 @@
 
     > crs = ChromeRemoteShell(host='localhost', port=92222, socket_timeout=3)
 
-    crs.tablist has a list of details on open tabs.
+    crs.find_tabs() fetches crs.tablist, a list of details on open tabs.
 
     > crs.connect(tab=index, updateTabs=True)
 
@@ -15,22 +15,51 @@
     responses for commands, but also spontaeneous events will be
     send by the browser. For this kind of advance usage, select/pol
     on soc is advised.
+
+    crs.dispatcher correlates responses with commands by message id:
+
+    > future = crs.send_command('Page.navigate', {'url': url})
+    > crs.subscribe('Network.', callback)
+    > result = future.result()
+
+    Many commands can be in flight at once, events received while waiting
+    are passed to subscribers and buffered for crs.next_event().
+
+    Many tabs can share one websocket to the browser endpoint:
+
+    > crs.connect_browser()
+    > target_id = crs.create_target('about:blank')
+    > tab = crs.attach(target_id)
+    > tab.send_command('Page.navigate', {'url': url})
+
+    tab is a TargetSession, a shell for the flattened session of the
+    target. Its commands carry the sessionId and it only sees the events
+    of its target, without an HTTP request or a websocket handshake per
+    tab.
+
+    Frames are decoded with orjson when it is installed; pass codec='json'
+    to use the standard library. Pass a metrics.Metrics as metrics to
+    count messages and time commands.
 """
 import json
 import urllib.request
 import websocket
+from .dispatcher import CommandDispatcher
 
 
 class ChromeRemoteShell(object):
 
-    def __init__(self, host='localhost', port=9222, socket_timeout=3):
+    def __init__(self, host='localhost', port=9222, socket_timeout=3,
+                 codec=None, metrics=None):
         """ init """
         self.host = host
         self.port = port
         self.socket_timeout = socket_timeout
+        self.codec = codec
+        self.metrics = metrics
         self.soc = None
+        self.dispatcher = None
         self.tablist = None
-        self.find_tabs()
 
     def connect(self, tab=None, update_tabs=True):
         """Open a websocket connection to remote browser, determined by
@@ -44,12 +73,20 @@ class ChromeRemoteShell(object):
         if not tab:
             tab = numtabs - 1
         wsurl = self.tablist[tab]['webSocketDebuggerUrl']
+        return self.connect_url(wsurl)
+
+    def connect_url(self, wsurl):
+        """Open a websocket connection to the debugger endpoint wsurl."""
         if self.soc and self.soc.connected:
             self.soc.close()
         websocket.setdefaulttimeout(3)
-        self.soc = websocket.WebSocket()
+        # frames are validated by the JSON decoder, websocket-client's
+        # own UTF-8 check is pure Python and slower than decoding them
+        self.soc = websocket.WebSocket(skip_utf8_validation=True)
         self.soc.settimeout(self.socket_timeout)
         self.soc.connect(wsurl)
+        self.dispatcher = CommandDispatcher(
+                self.soc, codec=self.codec, metrics=self.metrics)
         return self.soc
 
     def close(self):
@@ -57,6 +94,29 @@ class ChromeRemoteShell(object):
         if self.soc:
             self.soc.close()
             self.soc = None
+            self.dispatcher = None
+
+    def send_command(self, method, params=None):
+        """Send a command and return a CommandFuture for its response."""
+        return self.dispatcher.send(method, params)
+
+    def execute(self, method, params=None, timeout=None):
+        """Send a command and wait for its result."""
+        return self.dispatcher.execute(method, params, timeout)
+
+    def cancel_all(self, exception=None):
+        """Stop waiting for all commands of this shell still in flight."""
+        if self.dispatcher is not None:
+            self.dispatcher.cancel_all(exception)
+
+    def subscribe(self, method, callback):
+        """Call callback(event) for events named method, a domain prefix
+           like 'Network.' or '*'."""
+        self.dispatcher.subscribe(method, callback)
+
+    def next_event(self, timeout=None):
+        """Return the next event received from the browser."""
+        return self.dispatcher.next_event(timeout)
 
     def find_tabs(self):
         """Connect to host:port and request list of tabs
@@ -67,13 +127,91 @@ class ChromeRemoteShell(object):
         self.tablist = json.loads(f.read().decode('utf-8'))
         return self.tablist
 
+    def find_version(self):
+        """Request browser version details from host:port, including the
+           browser-level webSocketDebuggerUrl."""
+        f = urllib.request.urlopen('http://{}:{}/json/version'.format(
+                self.host, self.port))
+        return json.loads(f.read().decode('utf-8'))
+
+    def connect_browser(self):
+        """Open a websocket connection to the browser endpoint, which
+           accepts Target.* commands for all tabs."""
+        version = self.find_version()
+        return self.connect_url(version['webSocketDebuggerUrl'])
+
+    def create_browser_context(self):
+        """Create an isolated browser context, like an incognito profile,
+           and return its id."""
+        return self.execute(
+                'Target.createBrowserContext')['browserContextId']
+
+    def dispose_browser_context(self, browser_context_id):
+        """Close a browser context and all of its targets."""
+        return self.execute(
+                'Target.disposeBrowserContext',
+                {'browserContextId': browser_context_id})
+
+    def create_target(self, url='about:blank', browser_context_id=None):
+        """Open a new tab, in browser_context_id if given, and return its
+           target id."""
+        params = {'url': url}
+        if browser_context_id:
+            params['browserContextId'] = browser_context_id
+        return self.execute('Target.createTarget', params)['targetId']
+
+    def close_target(self, target_id):
+        """Close a tab without waiting for Chrome to confirm it."""
+        return self.send_command('Target.closeTarget', {'targetId': target_id})
+
+    def attach(self, target_id):
+        """Attach to a target over this connection, usually the browser
+           endpoint, and return a TargetSession for it."""
+        session_id = self.execute(
+                'Target.attachToTarget',
+                {'targetId': target_id, 'flatten': True})['sessionId']
+        return self.session(session_id, target_id)
+
+    def session(self, session_id, target_id=None):
+        """A TargetSession for an attached session of this connection."""
+        return TargetSession(self, session_id, target_id)
+
     def open_url(self, url):
         """Open a URL in the oldest tab."""
         if not self.soc or not self.soc.connected:
             self.connect(tab=0)
         # force the 'oldest' tab to load url
-        navcom = json.dumps({"id": 0,
-                             "method": "Page.navigate",
-                             "params": {"url": url}})
-        self.soc.send(navcom)
-        return self.soc.recv()
+        future = self.send_command('Page.navigate', {'url': url})
+        return future.wait()
+
+
+class TargetSession(ChromeRemoteShell):
+    """ Shell for a flattened session on the websocket of a browser
+        connection. Closing it only stops routing the events of the
+        session to it; the connection stays open. """
+
+    def __init__(self, connection, session_id, target_id=None):
+        super().__init__(
+                host=connection.host,
+                port=connection.port,
+                socket_timeout=connection.socket_timeout,
+                codec=connection.codec,
+                metrics=connection.metrics,
+        )
+        self.connection = connection
+        self.session_id = session_id
+        self.target_id = target_id
+        self.soc = connection.soc
+        self.dispatcher = connection.dispatcher.session(session_id)
+
+    def connect(self, tab=None, update_tabs=True):
+        raise TypeError('a TargetSession uses the browser connection')
+
+    def connect_url(self, wsurl):
+        raise TypeError('a TargetSession uses the browser connection')
+
+    def close(self):
+        if self.dispatcher is not None:
+            self.dispatcher.close()
+            self.dispatcher = None
+            self.soc = None
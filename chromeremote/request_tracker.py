@@ -0,0 +1,199 @@
+"""
+Track the state of network requests from Network.* events as they arrive
+"""
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+REQUEST_EVENTS = (
+        'Network.requestWillBeSent',
+        'Network.requestServedFromCache',
+        'Network.responseReceived',
+        'Network.loadingFinished',
+        'Network.loadingFailed',
+)
+
+
+def dict_val(key, dictionary):
+    if key in dictionary:
+        return dictionary[key]
+    elif key.lower() in dictionary:
+        return dictionary[key.lower()]
+    return None
+
+
+def dict_intval(key, dictionary):
+    if dict_val(key, dictionary) is not None:
+        return int(dict_val(key, dictionary))
+    return None
+
+
+class Request(object):
+
+    __slots__ = (
+            'id',
+            'failed',
+            'status_code',
+            'url',
+            'content_length',
+            'mime_type',
+            'complete',
+            'redirected',
+            'from_cache',
+            'error_text',
+            'blocked',
+            'blocked_reason',
+    )
+
+    def __init__(self, request_id):
+        self.id = request_id
+        self.failed = False
+        self.status_code = None
+        self.url = None
+        self.content_length = None
+        self.mime_type = None
+        self.complete = False
+        self.redirected = []
+        self.from_cache = False
+        self.error_text = None
+        self.blocked = False
+        self.blocked_reason = None
+
+    def __repr__(self):
+        return '<Request {} {} {}>'.format(
+                self.id, self.status_code, self.url)
+
+    def chain(self):
+        """ The redirect hops leading to this request, then the request. """
+        return self.redirected + [self]
+
+
+class RequestTracker(object):
+    """ Keeps one Request per requestId, updated by handle_event() for every
+        Network event received. open holds the requests still loading. """
+
+    def __init__(self):
+        self.requests = {}
+        self.open = {}
+        self._block_reasons = {}
+        self._handlers = {
+                'Network.requestWillBeSent': self._request_will_be_sent,
+                'Network.requestServedFromCache': self._served_from_cache,
+                'Network.responseReceived': self._response_received,
+                'Network.loadingFinished': self._loading_finished,
+                'Network.loadingFailed': self._loading_failed,
+        }
+
+    def reset(self):
+        self.requests.clear()
+        self.open.clear()
+        self._block_reasons.clear()
+
+    def handle_event(self, message):
+        """ Update request state from an event. Returns True if the event
+            was a request lifecycle event. """
+        handler = self._handlers.get(message.get('method'))
+        if handler is None:
+            return False
+        handler(message['params'])
+        return True
+
+    def get(self, request_id):
+        return self.requests.get(request_id)
+
+    def all(self, include_data=False):
+        """ All requests with a URL ordered by requestId, without data:
+            URLs unless include_data is set. """
+        reqs = []
+        for req_id in sorted(self.requests):
+            r = self.requests[req_id]
+            if r.url is None:
+                continue
+            if not include_data and r.url.startswith('data'):
+                continue
+            reqs.append(r)
+        return reqs
+
+    def completed(self):
+        return [r for r in self.all() if r.complete and not r.failed]
+
+    def failed(self):
+        return [r for r in self.all() if r.failed]
+
+    def redirected(self):
+        return [r for r in self.all() if len(r.redirected) > 0]
+
+    def blocked(self):
+        return [r for r in self.all() if r.blocked]
+
+    def mark_blocked(self, request_id, reason):
+        """ Record why a request was blocked, before or after its
+            loadingFailed event arrived. """
+        req = self.requests.get(request_id)
+        if req is not None and req.blocked:
+            req.blocked_reason = reason
+        else:
+            self._block_reasons[request_id] = reason
+
+    def _request_will_be_sent(self, rp):
+        req_id = rp['requestId']
+        req = Request(req_id)
+        last_req = self.requests.get(req_id)
+        if 'redirectResponse' in rp and last_req is not None:
+            last_req.complete = True
+            last_req.status_code = rp['redirectResponse']['status']
+            req.redirected = last_req.redirected
+            last_req.redirected = []
+            req.redirected.append(last_req)
+        req.url = rp['request']['url']
+        self.requests[req_id] = req
+        self.open[req_id] = req
+
+    def _served_from_cache(self, rp):
+        req_id = rp['requestId']
+        req = self.requests.get(req_id)
+        if req is None:
+            req = self.requests[req_id] = Request(req_id)
+        req.from_cache = True
+        if not req.complete:
+            self.open[req_id] = req
+
+    def _response_received(self, rp):
+        req = self.requests.get(rp['requestId'])
+        if req is None:
+            return
+        rpr = rp['response']
+        req.mime_type = rpr['mimeType']
+        req.status_code = rpr['status']
+        req.content_length = dict_intval('Content-Length', rpr['headers'])
+
+    def _loading_finished(self, rp):
+        req_id = rp['requestId']
+        if self.open.pop(req_id, None) is None:
+            logger.error(
+                    'loadingFinished but request {} not found'
+                    ' in open requests'.format(req_id)
+            )
+        req = self.requests.get(req_id)
+        if req is not None:
+            req.complete = True
+
+    def _loading_failed(self, rp):
+        req_id = rp['requestId']
+        logger.debug('loading failed on req {}'.format(req_id))
+        if self.open.pop(req_id, None) is None:
+            logger.error(
+                    'request {} not found in open requests'.format(req_id))
+        req = self.requests.get(req_id)
+        if req is None:
+            req = self.requests[req_id] = Request(req_id)
+        req.complete = True
+        req.failed = True
+        req.error_text = rp.get('errorText')
+        if rp.get('blockedReason') \
+                or req.error_text == 'net::ERR_BLOCKED_BY_CLIENT':
+            req.blocked = True
+            req.blocked_reason = self._block_reasons.pop(
+                    req_id, rp.get('blockedReason', 'client'))
@@ -0,0 +1,150 @@
+"""
+Watch the memory and CPU used by a Chrome process tree
+
+    > sampler = ProcessTreeSampler(browser.chrome_pid)
+    > sample = sampler.sample()
+    > sample.rss, sample.cpu_percent, sample.processes
+
+Chrome is started in a session of its own, so its tree is every process
+whose session id is the pid of Chrome, read from /proc. rss is the sum of
+the resident sizes of these processes in bytes; pages they share are
+counted once per process, so it errs on the high side. cpu_percent is the
+CPU time used since the previous sample relative to the time passed, 100
+per busy core. Where there is no /proc, samples are empty.
+"""
+
+import collections
+import logging
+import os
+import time
+
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+ResourceSample = collections.namedtuple(
+        'ResourceSample', ('processes', 'rss', 'cpu_seconds', 'cpu_percent'))
+
+
+class ResourceLimitExceeded(Exception):
+    """ The Chrome process tree used more memory or CPU than allowed. """
+
+    def __init__(self, sample, reason):
+        self.sample = sample
+        self.reason = reason
+        super().__init__(reason)
+
+
+class ResourceLimits(object):
+    """ Thresholds for a browser's process tree, checked at most every
+        interval seconds while pages load.
+
+        max_rss is in bytes, max_cpu in percent averaged over cpu_window
+        seconds. A browser over a limit is recycled, restarted after the
+        current page, or, with action 'kill', killed at once, failing the
+        page with ResourceLimitExceeded. """
+
+    def __init__(self, max_rss=None, max_cpu=None, cpu_window=30,
+                 interval=2.0, action='recycle'):
+        if action not in ('recycle', 'kill'):
+            raise ValueError('unknown action {}'.format(action))
+        self.max_rss = max_rss
+        self.max_cpu = max_cpu
+        self.cpu_window = cpu_window
+        self.interval = interval
+        self.action = action
+
+    def exceeded(self, sample, cpu_percent=None):
+        """ The reason sample breaks a limit, or None. cpu_percent is the
+            average over the CPU window, the sample's own by default. """
+        if cpu_percent is None:
+            cpu_percent = sample.cpu_percent
+        if self.max_rss is not None and sample.rss > self.max_rss:
+            return 'RSS of {} MiB over {} MiB'.format(
+                    sample.rss >> 20, self.max_rss >> 20)
+        if self.max_cpu is not None and cpu_percent is not None \
+                and cpu_percent > self.max_cpu:
+            return 'CPU at {:.0f}% over {}%'.format(
+                    cpu_percent, self.max_cpu)
+        return None
+
+
+class ProcessTreeSampler(object):
+
+    def __init__(self, pid, proc='/proc', clock=time.monotonic):
+        self.pid = pid
+        self.proc = proc
+        self.clock = clock
+        self._last = None
+
+    def sample(self):
+        processes = 0
+        rss = 0
+        ticks = 0
+        for pid, fields in self._stats():
+            # fields start at the state, the third field of stat
+            if int(fields[3]) != self.pid and pid != self.pid:
+                continue
+            processes += 1
+            ticks += int(fields[11]) + int(fields[12])
+            rss += int(fields[21]) * PAGE_SIZE
+        now = self.clock()
+        cpu_seconds = ticks / CLOCK_TICKS
+        cpu_percent = None
+        if self._last is not None and now > self._last[0]:
+            cpu_percent = max(
+                    100 * (cpu_seconds - self._last[1])
+                    / (now - self._last[0]), 0)
+        self._last = (now, cpu_seconds)
+        return ResourceSample(processes, rss, cpu_seconds, cpu_percent)
+
+    def _stats(self):
+        try:
+            names = os.listdir(self.proc)
+        except OSError:
+            return
+        for name in names:
+            if not name.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.proc, name, 'stat')) as f:
+                    stat = f.read()
+            except OSError:
+                # the process exited meanwhile
+                continue
+            # the command name in parentheses may contain anything
+            yield int(name), stat[stat.rfind(')') + 2:].split()
+
+
+class ResourceMonitor(object):
+    """ Samples the tree of a Chrome process against ResourceLimits, at
+        most every limits.interval seconds. """
+
+    def __init__(self, pid, limits, clock=time.monotonic):
+        self.limits = limits
+        self.clock = clock
+        self.sampler = ProcessTreeSampler(pid, clock=clock)
+        self.last = None
+        self._next = 0
+        self._cpu = collections.deque()
+
+    def check(self):
+        """ Take a sample if one is due and return the reason it breaks
+            a limit, or None. """
+        now = self.clock()
+        if now < self._next:
+            return None
+        self._next = now + self.limits.interval
+        sample = self.last = self.sampler.sample()
+        self._cpu.append((now, sample.cpu_seconds))
+        while len(self._cpu) > 2 \
+                and self._cpu[1][0] <= now - self.limits.cpu_window:
+            self._cpu.popleft()
+        cpu_percent = None
+        first = self._cpu[0]
+        if now > first[0]:
+            cpu_percent = 100 * (sample.cpu_seconds - first[1]) \
+                / (now - first[0])
+        return self.limits.exceeded(sample, cpu_percent)
@@ -0,0 +1,172 @@
+"""
+Conditions deciding when load_page considers a page loaded
+
+    > browser.load_page(url, wait_until='load')
+    > browser.load_page(url, wait_until=NetworkIdle(idle_time=1,
+    >                                               max_inflight=2))
+    > browser.load_page(url, wait_until=lambda browser, event: ...)
+
+load_page waits until done() is true. A condition sees every event
+received while waiting through on_event() and tells with next_check()
+when it might become true without another event arriving.
+"""
+
+
+class WaitCondition(object):
+
+    def start(self, browser, now):
+        pass
+
+    def on_event(self, event, now):
+        pass
+
+    def done(self, browser, now):
+        raise NotImplementedError
+
+    def next_check(self, now):
+        """ Seconds until done() should be asked again even if no event
+            arrives, or None if only an event can complete it. """
+        return None
+
+
+class PageEvent(WaitCondition):
+    """ Done once the event named method was received. """
+
+    def __init__(self, method):
+        self.method = method
+        self.fired = False
+
+    def start(self, browser, now):
+        self.fired = False
+
+    def on_event(self, event, now):
+        if event.get('method') == self.method:
+            self.fired = True
+
+    def done(self, browser, now):
+        return self.fired
+
+
+class LoadEvent(PageEvent):
+
+    def __init__(self):
+        super().__init__('Page.loadEventFired')
+
+
+class DOMContentLoaded(PageEvent):
+
+    def __init__(self):
+        super().__init__('Page.domContentEventFired')
+
+
+class NetworkIdle(WaitCondition):
+    """ Done when no more than max_inflight requests were open for
+        idle_time seconds, or at the latest after_load seconds after the
+        load event, as requests like an EventSource never finish. """
+
+    def __init__(self, idle_time=0.5, max_inflight=0, after_load=5.0):
+        self.idle_time = idle_time
+        self.max_inflight = max_inflight
+        self.after_load = after_load
+        self.quiet_since = None
+        self.loaded_at = None
+
+    def start(self, browser, now):
+        self.quiet_since = None
+        self.loaded_at = None
+
+    def on_event(self, event, now):
+        if event.get('method') == 'Page.loadEventFired' \
+                and self.loaded_at is None:
+            self.loaded_at = now
+
+    def done(self, browser, now):
+        if self.loaded_at is not None and self.after_load is not None \
+                and now - self.loaded_at >= self.after_load:
+            return True
+        if len(browser.open_requests) > self.max_inflight:
+            self.quiet_since = None
+            return False
+        if self.quiet_since is None:
+            self.quiet_since = now
+        return now - self.quiet_since >= self.idle_time
+
+    def next_check(self, now):
+        checks = []
+        if self.quiet_since is not None:
+            checks.append(self.quiet_since + self.idle_time - now)
+        if self.loaded_at is not None and self.after_load is not None:
+            checks.append(self.loaded_at + self.after_load - now)
+        if not checks:
+            return None
+        return max(0, min(checks))
+
+
+class Predicate(WaitCondition):
+    """ Done when func(browser, event) returns true. func is called for
+        every event and with event None when the wait starts. """
+
+    def __init__(self, func):
+        self.func = func
+        self.result = False
+        self._browser = None
+
+    def start(self, browser, now):
+        self._browser = browser
+        self.result = bool(self.func(browser, None))
+
+    def on_event(self, event, now):
+        if not self.result:
+            self.result = bool(self.func(self._browser, event))
+
+    def done(self, browser, now):
+        return self.result
+
+
+class AllOf(WaitCondition):
+    """ Done when all conditions are done, e.g.
+        AllOf(LoadEvent(), NetworkIdle()). """
+
+    def __init__(self, *conditions):
+        self.conditions = [make_condition(c) for c in conditions]
+
+    def start(self, browser, now):
+        for condition in self.conditions:
+            condition.start(browser, now)
+
+    def on_event(self, event, now):
+        for condition in self.conditions:
+            condition.on_event(event, now)
+
+    def done(self, browser, now):
+        # ask every condition so each one keeps its timers current
+        results = [c.done(browser, now) for c in self.conditions]
+        return all(results)
+
+    def next_check(self, now):
+        checks = [c.next_check(now) for c in self.conditions]
+        checks = [check for check in checks if check is not None]
+        return min(checks) if checks else None
+
+
+CONDITIONS = {
+        'load': LoadEvent,
+        'domcontentloaded': DOMContentLoaded,
+        'networkidle0': lambda: NetworkIdle(max_inflight=0),
+        'networkidle2': lambda: NetworkIdle(max_inflight=2),
+}
+
+
+def make_condition(spec):
+    """ Return a fresh WaitCondition for a name from CONDITIONS, a
+        callable predicate or a WaitCondition. """
+    if isinstance(spec, WaitCondition):
+        return spec
+    if isinstance(spec, str):
+        try:
+            return CONDITIONS[spec.lower()]()
+        except KeyError:
+            raise ValueError('unknown wait condition {}'.format(spec))
+    if callable(spec):
+        return Predicate(spec)
+    raise TypeError('not a wait condition: {!r}'.format(spec))
@@ -13,5 +13,12 @@ setup(
         install_requires=[
             'websocket-client',
         ],
+        extras_require={
+            'async': ['websockets'],
+            'fast': ['orjson'],
+        },
+        entry_points={
+            'console_scripts': ['chromeremote=chromeremote.cli:main'],
+        },
         zip_safe=False,
 )
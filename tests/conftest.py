@@ -0,0 +1,53 @@
+import os
+import socket
+import sys
+
+import pytest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS), 'benchmarks'))
+
+from fake_devtools import start_server_process, synthetic_trace  # noqa
+
+FAKE_CHROME = os.path.join(TESTS, 'fake_chrome.py')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def devtools():
+    """ Start a fake DevTools endpoint replaying events on navigate and
+        return its port. """
+    processes = []
+
+    def start(events=None, **kwargs):
+        if events is None:
+            events = synthetic_trace(20, 100)
+        process, port = start_server_process(events, **kwargs)
+        processes.append(process)
+        return port
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.join()
+
+
+@pytest.fixture
+def browser_args(tmp_path):
+    """ Arguments of a ChromeBrowser talking to a fake endpoint without
+        starting Chrome. """
+    work_dir = tmp_path / 'work'
+    work_dir.mkdir()
+    return {
+            'chrome_bin': sys.executable,
+            'work_dir': str(work_dir),
+            'remote_shell_timeout': 2,
+            'master_timeout': 60,
+            'wait_until': 'load',
+    }
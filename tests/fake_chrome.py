@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the Chrome binary: serves a fake_devtools endpoint on the
+--remote-debugging-port it is started with, until it gets SIGTERM.
+"""
+
+import os
+import signal
+import sys
+
+sys.path.insert(0, os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        'benchmarks'))
+
+from fake_devtools import DevToolsServer, synthetic_trace  # noqa: E402
+
+
+def main():
+    port = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--remote-debugging-port='):
+            port = int(arg.split('=', 1)[1])
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    server = DevToolsServer(synthetic_trace(20, 100), port=port)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import base64
+import json
+import os
+import threading
+
+import pytest
+
+from chromeremote.artifacts import ArtifactWriter
+
+
+def fail():
+    raise OSError('disk full')
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_writes_files(tmp_path, workers):
+    writer = ArtifactWriter(workers=workers)
+    writer.write_bytes(str(tmp_path / 'a.bin'), b'abc')
+    writer.write_base64(str(tmp_path / 'b.jpg'),
+                        base64.b64encode(b'jpeg').decode('ascii'))
+    writer.write_json(str(tmp_path / 'c.json'), {'x': 1})
+    assert writer.flush()
+    assert (tmp_path / 'a.bin').read_bytes() == b'abc'
+    assert (tmp_path / 'b.jpg').read_bytes() == b'jpeg'
+    assert json.loads((tmp_path / 'c.json').read_text()) == {'x': 1}
+    assert writer.written == 3
+    writer.close()
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_failures_are_counted(workers):
+    writer = ArtifactWriter(workers=workers)
+    future = writer.submit(fail)
+    writer.flush()
+    assert isinstance(future.exception(), OSError)
+    assert writer.failed == 1
+    assert writer.written == 0
+    writer.close()
+
+
+def test_flush_timeout():
+    writer = ArtifactWriter(workers=1)
+    release = threading.Event()
+    writer.submit(release.wait)
+    assert not writer.flush(timeout=0.05)
+    release.set()
+    assert writer.flush(timeout=5)
+    writer.close()
+
+
+def test_max_pending_blocks_submit():
+    writer = ArtifactWriter(workers=1, max_pending=1)
+    release = threading.Event()
+    writer.submit(release.wait)
+    submitted = threading.Event()
+
+    def submit():
+        writer.submit(lambda: None)
+        submitted.set()
+
+    thread = threading.Thread(target=submit)
+    thread.start()
+    assert not submitted.wait(0.1)
+    release.set()
+    assert submitted.wait(5)
+    thread.join()
+    writer.close()
+    assert writer.written == 2
+
+
+def test_close_stops_workers(tmp_path):
+    writer = ArtifactWriter(workers=1)
+    writer.write_bytes(str(tmp_path / 'a'), b'')
+    writer.close()
+    assert os.path.exists(str(tmp_path / 'a'))
+    assert writer._executor is None
+    # a closed writer starts new workers when used again
+    writer.write_bytes(str(tmp_path / 'b'), b'')
+    writer.close()
+    assert os.path.exists(str(tmp_path / 'b'))
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import warnings
+
+from chromeremote import AsyncChromeBrowser
+from conftest import synthetic_trace
+
+
+def run(coroutine):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        return asyncio.run(coroutine)
+
+
+def test_open_page_closes_the_last_tab(devtools, browser_args):
+    port = devtools()
+
+    async def main():
+        browser = AsyncChromeBrowser(socket=port, **browser_args)
+        await browser.reset()
+        await browser.open_page(isolated=True)
+        await browser.load_page('http://a.test/')
+        first = browser.shell
+        await browser.open_page()
+        await browser.load_page('http://b.test/')
+        tab = await browser.tab(os.path.join(browser.work_dir, 'tab'))
+        await tab.load_page('http://c.test/')
+        await tab.clean_chrome()
+        await browser.close_page()
+        return first, browser, tab
+
+    first, browser, tab = run(main())
+    assert first._reader is None
+    assert browser.shell is False
+    assert browser.target_id is None
+    assert tab.artifacts is not browser.artifacts
+
+
+def test_events_of_the_last_page_are_dropped(devtools, browser_args):
+    port = devtools(synthetic_trace(50, 100), event_rate=2000)
+
+    async def main():
+        browser = AsyncChromeBrowser(
+                socket=port, screenshot=False, **browser_args)
+        await browser.reset()
+        await browser.load_page('http://a.test/',
+                                wait_until='domcontentloaded')
+        await asyncio.sleep(0.2)
+        await browser.reset()
+        await browser.load_page('http://b.test/', wait_until='load')
+        await browser.shell.close()
+        return len(browser.tracker.all())
+
+    assert run(main()) == 50
+
+
+def test_deferred_screenshot_is_flushed(devtools, browser_args):
+    port = devtools(latency=0.05)
+
+    async def main():
+        browser = AsyncChromeBrowser(
+                socket=port, screenshot='defer', **browser_args)
+        await browser.reset()
+        await browser.load_page('http://a.test/')
+        await browser.flush_artifacts()
+        await browser.shell.close()
+
+    run(main())
+    assert os.path.exists(
+            os.path.join(browser_args['work_dir'], 'screenshot.jpg'))
+
+
+def test_close_page_finishes_the_har(devtools, browser_args):
+    port = devtools()
+
+    async def main():
+        browser = AsyncChromeBrowser(
+                socket=port, har=True, screenshot=False, **browser_args)
+        await browser.reset()
+        await browser.load_page('http://a.test/')
+        await browser.load_page('http://b.test/')
+        await browser.close_page()
+        return browser
+
+    browser = run(main())
+    assert browser.har_writer is None
+    for name in ('page.har', 'page-2.har'):
+        assert os.path.exists(os.path.join(browser.work_dir, name))
@@ -0,0 +1,109 @@
+import base64
+import hashlib
+import os
+
+from chromeremote.artifacts import ArtifactWriter
+from chromeremote.body_stream import BodyStreamer, StreamPolicy
+from chromeremote.content_store import ContentStore
+
+
+def paused(resource_type=None, mime_type='video/mp4', size=5 << 20):
+    params = {
+            'responseStatusCode': 200,
+            'responseHeaders': [
+                    {'name': 'Content-Length', 'value': str(size)},
+                    {'name': 'Content-Type', 'value': mime_type}],
+    }
+    if resource_type is not None:
+        params['resourceType'] = resource_type
+    return params
+
+
+def test_page_resources_are_not_streamed():
+    streamer = BodyStreamer(StreamPolicy(), None, '/tmp')
+    assert streamer.wants(paused('Media'))
+    assert not streamer.wants(paused('Media', size=1000))
+    for resource_type in ('Document', 'Script', 'Stylesheet'):
+        assert not streamer.wants(paused(resource_type))
+    assert not streamer.wants(paused(mime_type='text/html; charset=utf-8'))
+    assert not streamer.wants(paused(mime_type='application/javascript'))
+
+
+def test_render_types_can_be_streamed():
+    policy = StreamPolicy(render_types=())
+    assert BodyStreamer(policy, None, '/tmp').wants(paused('Document'))
+
+
+def test_mime_types():
+    streamer = BodyStreamer(
+            StreamPolicy(mime_types=['application/pdf']), None, '/tmp')
+    assert not streamer.wants(paused('Media'))
+    assert streamer.wants(paused('Other', 'application/pdf'))
+
+
+class FakeIO(object):
+    """ Answers the Fetch and IO commands of a streamer right away. """
+
+    def __init__(self, body, chunk_size=4):
+        self.chunks = [body[n:n + chunk_size]
+                       for n in range(0, len(body), chunk_size)]
+        self.sent = []
+
+    def send(self, method, params, callback=None):
+        self.sent.append(method)
+        if method == 'Fetch.takeResponseBodyAsStream':
+            callback({'result': {'stream': 'handle'}})
+        elif method == 'IO.read':
+            chunk = self.chunks.pop(0)
+            callback({'result': {
+                    'data': base64.b64encode(chunk).decode('ascii'),
+                    'base64Encoded': True,
+                    'eof': not self.chunks,
+            }})
+
+
+def start(streamer):
+    params = paused('Media', size=20)
+    params.update(requestId='interception-1', networkId='1',
+                  request={'url': 'http://a.test/v.mp4'})
+    streamer.start(params)
+    return streamer.streams['1']
+
+
+def test_stream_to_content_store(tmp_path):
+    store = ContentStore(str(tmp_path / 'store'))
+    io = FakeIO(b'0123456789')
+    streamer = BodyStreamer(
+            StreamPolicy(threshold=0), io.send, str(tmp_path / 'content'),
+            store)
+    stream = start(streamer)
+    assert stream.complete
+    assert stream.hash == store.put(b'0123456789')
+    assert stream.entry()['size'] == 10
+    assert io.sent[-2:] == ['IO.close', 'Fetch.failRequest']
+    assert os.listdir(str(tmp_path / 'content')) == []
+
+
+def test_store_on_artifact_writer(tmp_path):
+    store = ContentStore(str(tmp_path / 'store'))
+    writer = ArtifactWriter(workers=1)
+    streamer = BodyStreamer(
+            StreamPolicy(threshold=0), FakeIO(b'0123456789').send,
+            str(tmp_path / 'content'), store, writer)
+    stream = start(streamer)
+    assert stream.hash == hashlib.sha256(b'0123456789').hexdigest()
+    writer.close()
+    assert store.get(stream.hash) == b'0123456789'
+    assert writer.written == 1
+
+
+def test_stream_is_truncated(tmp_path):
+    io = FakeIO(b'0123456789')
+    streamer = BodyStreamer(
+            StreamPolicy(threshold=0, max_body_size=6), io.send,
+            str(tmp_path))
+    stream = start(streamer)
+    assert stream.truncated
+    with open(os.path.join(str(tmp_path), '1'), 'rb') as f:
+        assert f.read() == b'012345'
+    assert streamer.page_bytes == 6
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from chromeremote import (
+        Budget, ChromeBrowser, ChromeBrowserPool, DeadlineExceeded,
+        NetworkIdle)
+from conftest import FAKE_CHROME, free_port, synthetic_trace
+
+
+def make_browser(port, browser_args, **kwargs):
+    args = dict(browser_args, socket=port)
+    args.update(kwargs)
+    browser = ChromeBrowser(**args)
+    browser.reset()
+    return browser
+
+
+def test_load_page_and_content(devtools, browser_args):
+    browser = make_browser(devtools(), browser_args)
+    browser.load_page('http://example.test/')
+    browser.get_content()
+    browser.get_cookies()
+    browser.flush_artifacts()
+    browser.shell.close()
+    work_dir = browser_args['work_dir']
+    assert len(browser.tracker.all()) == 20
+    assert os.path.exists(os.path.join(work_dir, 'screenshot.jpg'))
+    assert os.path.exists(os.path.join(work_dir, 'cookies.json'))
+    assert os.path.exists(os.path.join(work_dir, 'content', 'index.json'))
+
+
+def test_events_of_the_last_page_are_dropped(devtools, browser_args):
+    port = devtools(synthetic_trace(50, 100), event_rate=2000)
+    browser = make_browser(port, browser_args, screenshot=False)
+    browser.load_page('http://a.test/', wait_until='domcontentloaded')
+    time.sleep(0.2)
+    # reads the rest of the first page, up to its load event
+    browser._send_chrome('Runtime.evaluate')
+    browser.reset()
+    browser.load_page('http://b.test/', wait_until='load')
+    browser.shell.close()
+    assert len(browser.tracker.all()) == 50
+
+
+def test_network_idle_gives_up_after_load(devtools, browser_args):
+    events = synthetic_trace(10, 100)
+    events.insert(2, {
+            'method': 'Network.requestWillBeSent',
+            'params': {'requestId': 'hanging', 'type': 'EventSource',
+                       'request': {'url': 'http://a.test/events'}},
+    })
+    browser = make_browser(devtools(events), browser_args, screenshot=False)
+    started = time.monotonic()
+    browser.load_page('http://a.test/',
+                      wait_until=NetworkIdle(after_load=0.5))
+    browser.shell.close()
+    assert time.monotonic() - started < 5
+    assert not browser.stop_loading
+
+
+def test_deferred_screenshot_is_flushed(devtools, browser_args):
+    port = devtools(latency=0.05)
+    browser = make_browser(port, browser_args, screenshot='defer')
+    browser.load_page('http://a.test/')
+    browser.flush_artifacts()
+    browser.shell.close()
+    assert os.path.exists(
+            os.path.join(browser_args['work_dir'], 'screenshot.jpg'))
+
+
+def test_tab_flushes_only_its_own_files(devtools, browser_args):
+    browser = make_browser(devtools(), browser_args)
+    tab = browser.tab(os.path.join(browser_args['work_dir'], 'tab'))
+    assert tab.artifacts is not browser.artifacts
+    release = threading.Event()
+    browser.artifacts.submit(release.wait)
+    try:
+        tab.load_page('http://a.test/')
+        tab.get_cookies()
+        assert tab.flush_artifacts(timeout=5)
+    finally:
+        release.set()
+    tab.clean_chrome()
+    assert os.path.exists(os.path.join(tab.work_dir, 'cookies.json'))
+    assert browser.flush_artifacts(timeout=5)
+    browser.browser_shell.close()
+
+
+def test_har_per_page(devtools, browser_args):
+    browser = make_browser(devtools(), browser_args, har=True,
+                           screenshot=False)
+    work_dir = browser_args['work_dir']
+    browser.load_page('http://a.test/')
+    browser.load_page('http://b.test/')
+    browser.flush_artifacts()
+    with open(os.path.join(work_dir, 'page.har')) as f:
+        first = json.load(f)['log']
+    with open(os.path.join(work_dir, 'page-2.har')) as f:
+        second = json.load(f)['log']
+    assert first['pages'][0]['title'] == 'http://a.test/'
+    assert second['pages'][0]['title'] == 'http://b.test/'
+    assert len(second['entries']) == 20
+    browser.reset(os.path.join(work_dir, 'next'))
+    browser.load_page('http://c.test/')
+    browser.close_page()
+    assert os.path.exists(os.path.join(work_dir, 'next', 'page.har'))
+
+
+def test_clean_chrome_after_deadline(tmp_path):
+    browser = ChromeBrowser(
+            socket=free_port(), chrome_bin=FAKE_CHROME,
+            work_dir=str(tmp_path / 'work'), wait_until='load',
+            remote_shell_timeout=1,
+            cookie_jar=str(tmp_path / 'jar.json'))
+    browser.start_chrome()
+    try:
+        browser.load_page('http://a.test/')
+        browser.budget = Budget(0)
+        with pytest.raises(DeadlineExceeded):
+            browser.get_content()
+    finally:
+        browser.clean_chrome()
+    assert not browser.is_alive()
+    assert not os.path.exists(browser.profile_dir)
+    assert os.path.exists(str(tmp_path / 'jar.json'))
+
+
+def test_pool_slots_keep_their_own_cookie_jar(tmp_path):
+    jar = str(tmp_path / 'jar.json')
+    with ChromeBrowserPool(
+            size=2, base_port=free_port(), chrome_bin=FAKE_CHROME,
+            work_dir=str(tmp_path), isolated=False, wait_until='load',
+            remote_shell_timeout=1, cookie_jar=jar) as pool:
+        jars = sorted(b.cookie_jar for b in pool.browsers.values())
+        for url in ('http://a.test/', 'http://b.test/'):
+            with pool.page() as browser:
+                browser.load_page(url)
+                # loaded with the first page, not again
+                assert browser._cookie_jar_commands() == []
+    assert jars == [str(tmp_path / 'jar-0.json'),
+                    str(tmp_path / 'jar-1.json')]
+    assert os.path.exists(jars[0])
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from chromeremote import chrome_profile
+from chromeremote.chrome_profile import (
+        clone_profile, profile_root, profile_template, profile_version)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'cache')
+
+
+@pytest.fixture
+def dest(tmp_path):
+    path = tmp_path / 'work'
+    path.mkdir()
+    return str(path)
+
+
+def cloned(dest):
+    return os.listdir(os.path.join(dest, profile_root))
+
+
+def test_template_is_extracted_once(cache_dir):
+    template = profile_template(cache_dir)
+    assert os.path.basename(template) == 'profile-' + profile_version()
+    assert profile_template(cache_dir) == template
+    assert os.listdir(cache_dir) == [os.path.basename(template)]
+
+
+@pytest.mark.parametrize('method', ['auto', 'copy', 'extract'])
+def test_methods(cache_dir, dest, method):
+    assert clone_profile(dest, cache_dir, method) == method
+    assert cloned(dest) == os.listdir(
+            os.path.join(profile_template(cache_dir), profile_root))
+
+
+def test_auto_falls_back_to_copy(cache_dir, dest, monkeypatch):
+    monkeypatch.setattr(chrome_profile, '_cp', lambda *args: False)
+    assert clone_profile(dest, cache_dir) == 'copy'
+    assert cloned(dest)
+
+
+def test_reflink_falls_back_to_extract(cache_dir, dest, monkeypatch):
+    monkeypatch.setattr(chrome_profile, '_cp', lambda *args: False)
+    assert clone_profile(dest, cache_dir, 'reflink') == 'extract'
+    assert cloned(dest)
+
+
+def test_broken_template_falls_back_to_extract(dest, monkeypatch):
+    def broken(cache_dir=None):
+        raise OSError('read-only cache')
+    monkeypatch.setattr(chrome_profile, 'profile_template', broken)
+    assert clone_profile(dest) == 'extract'
+    assert cloned(dest)
+
+
+def test_old_profile_is_replaced(cache_dir, dest):
+    clone_profile(dest, cache_dir, 'copy')
+    stale = os.path.join(dest, profile_root, 'stale')
+    open(stale, 'w').close()
+    clone_profile(dest, cache_dir, 'copy')
+    assert not os.path.exists(stale)
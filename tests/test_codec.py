@@ -0,0 +1,72 @@
+import pytest
+
+from chromeremote.codec import (
+        Frame, JSONCodec, _session_id, get_codec, sniff)
+
+
+def test_sniff_response():
+    assert sniff('{"id":12,"result":{}}') == (12, None, None)
+
+
+def test_sniff_event():
+    assert sniff('{"method":"Page.loadEventFired","params":{}}') \
+        == (None, 'Page.loadEventFired', None)
+
+
+def test_sniff_session():
+    raw = '{"method":"Network.dataReceived","params":{},"sessionId":"S1"}'
+    assert sniff(raw) == (None, 'Network.dataReceived', 'S1')
+    assert sniff('{"id":3,"result":{},"sessionId":"S1"}') == (3, None, 'S1')
+
+
+def test_sniff_gives_up_on_other_layouts():
+    assert sniff('{"result":{},"id":3}') is None
+    assert sniff('{"id":3x}') is None
+    assert sniff(b'{"id":3}') is None
+    assert sniff('{"method":"A.b\\"c"}') is None
+
+
+def test_sniff_truncated_frames():
+    assert sniff('{"id":12') is None
+    assert sniff('{"id":') is None
+    assert sniff('{"method":"Page.load') is None
+
+
+def test_session_id_only_at_the_top_level():
+    # a sessionId inside params is followed by the closing brace of params
+    assert _session_id('{"method":"A.b","params":{"sessionId":"X"}}') \
+        is None
+    assert _session_id('{"method":"A.b","params":{"sessionId":"X"},'
+                       '"sessionId":"Y"}') == 'Y'
+    assert _session_id('{"method":"A.b","sessionId":"a\\"b"}') is None
+
+
+def test_frame_parses_lazily():
+    frame = Frame('{"id":1,"error":{"code":-32000}}', JSONCodec())
+    assert frame.id == 1
+    assert 'id' in frame
+    assert not frame.decoded
+    assert frame['error']['code'] == -32000
+    assert frame.decoded
+
+
+def test_frame_falls_back_to_parsing():
+    frame = Frame('{"params":{},"method":"A.b","sessionId":"S"}',
+                  JSONCodec())
+    assert frame.method == 'A.b'
+    assert frame.id is None
+    assert frame.session_id == 'S'
+    assert dict(frame) == {'params': {}, 'method': 'A.b', 'sessionId': 'S'}
+
+
+def test_frame_from_message():
+    frame = Frame.from_message({'id': 2, 'result': {}}, JSONCodec())
+    assert frame.id == 2
+    assert frame.text() == '{"id":2,"result":{}}'
+
+
+def test_get_codec():
+    assert get_codec('json').name == 'json'
+    assert get_codec().name in ('json', 'orjson')
+    with pytest.raises(ValueError):
+        get_codec('msgpack')
@@ -0,0 +1,141 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from chromeremote.chrome_browser import ChromeBrowser
+from chromeremote.content_store import ContentStore
+from chromeremote.dispatcher import CommandDispatcher
+
+
+BODY = b'body shared by every request'
+
+
+class BodySocket(object):
+    """ Answers every command with the same base64 encoded body. """
+
+    def __init__(self):
+        self.answers = []
+        self.timeout = 1
+
+    def send(self, text):
+        command = json.loads(text)
+        self.answers.append(json.dumps({
+                'id': command['id'],
+                'result': {
+                        'body': base64.b64encode(BODY).decode('ascii'),
+                        'base64Encoded': True,
+                },
+        }))
+
+    def recv(self):
+        return self.answers.pop(0)
+
+    def gettimeout(self):
+        return self.timeout
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+
+class BodyShell(object):
+    """ The part of ChromeRemoteShell get_content uses. """
+
+    def __init__(self):
+        self.dispatcher = CommandDispatcher(BodySocket())
+
+    def send_command(self, method, params=None):
+        return self.dispatcher.send(method, params)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ContentStore(str(tmp_path / 'store'))
+
+
+def test_put_deduplicates(store):
+    digest = store.put(BODY)
+    assert store.put(BODY) == digest
+    assert store.put_body(BODY.decode('utf-8')) == (digest, len(BODY))
+    encoded = base64.b64encode(BODY).decode('ascii')
+    assert store.put_body(encoded, base64_encoded=True) == (
+            digest, len(BODY))
+    assert store.written == 1
+    assert store.deduplicated == 3
+    assert store.get(digest) == BODY
+    assert os.listdir(os.path.dirname(store.path(digest))) == [
+            os.path.basename(store.path(digest))]
+
+
+def test_put_file_deduplicates(tmp_path, store):
+    digest = store.put(BODY)
+    for name in ('a', 'b'):
+        path = str(tmp_path / name)
+        with open(path, 'wb') as f:
+            f.write(BODY)
+        assert store.put_file(path) == digest
+        assert not os.path.exists(path)
+    assert store.written == 1
+    assert store.deduplicated == 2
+    assert store.get(digest) == BODY
+
+
+def test_gzip_objects(tmp_path):
+    store = ContentStore(str(tmp_path / 'store'), compression='gzip')
+    digest = store.put(BODY)
+    assert store.path(digest).endswith('.gz')
+    assert store.get(digest) == BODY
+    with pytest.raises(ValueError):
+        store.mmap(digest)
+
+
+def test_mmap(store):
+    digest = store.put(BODY)
+    assert store.mmap(digest)[:] == BODY
+    assert store.mmap(store.put(b'')) == b''
+
+
+def loaded(tracker, request_id, url):
+    tracker.handle_event({
+            'method': 'Network.requestWillBeSent',
+            'params': {'requestId': request_id, 'request': {'url': url}},
+    })
+    tracker.handle_event({
+            'method': 'Network.responseReceived',
+            'params': {
+                    'requestId': request_id,
+                    'response': {'mimeType': 'text/plain', 'status': 200,
+                                 'headers': {}},
+            },
+    })
+    tracker.handle_event({
+            'method': 'Network.loadingFinished',
+            'params': {'requestId': request_id},
+    })
+
+
+def test_index_maps_requests_to_hash(tmp_path, store):
+    browser = ChromeBrowser(
+            chrome_bin='chrome',
+            work_dir=str(tmp_path / 'work'),
+            content_store=store,
+    )
+    browser.start_time = datetime.now()
+    browser.shell = BodyShell()
+    loaded(browser.tracker, '1', 'http://a.test/app.js')
+    loaded(browser.tracker, '2', 'http://b.test/app.js')
+    browser.get_content()
+    browser.artifacts.flush()
+    with open(os.path.join(browser.content_dir, 'index.json')) as f:
+        index = json.load(f)
+    digest = store.put(BODY)
+    assert {request_id: entry['hash']
+            for request_id, entry in index.items()} == {
+            '1': digest, '2': digest}
+    assert index['1']['url'] == 'http://a.test/app.js'
+    assert index['2']['size'] == len(BODY)
+    # both bodies may be stored at once, but into one object
+    assert os.listdir(os.path.dirname(store.path(digest))) == [
+            os.path.basename(store.path(digest))]
@@ -0,0 +1,35 @@
+import os
+
+from chromeremote.cookies import (
+        cookie_list, cookie_params, load_cookies, save_cookies)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'jar.json')
+    cookies = [{'name': 'a', 'value': '1', 'domain': 'a.test', 'path': '/',
+                'expires': -1, 'session': True, 'size': 2}]
+    save_cookies(path, cookies)
+    save_cookies(path, cookies)
+    assert load_cookies(path) == cookies
+    # written through a temporary file that is renamed
+    assert os.listdir(str(tmp_path)) == ['jar.json']
+
+
+def test_cookie_params():
+    params = cookie_params({'result': {'cookies': [
+            {'name': 'a', 'value': '1', 'expires': -1, 'size': 2},
+            {'name': 'b', 'value': '2', 'expires': 2000000000}]}})
+    assert params == [{'name': 'a', 'value': '1'},
+                      {'name': 'b', 'value': '2', 'expires': 2000000000}]
+    assert cookie_list([{'name': 'a'}]) == [{'name': 'a'}]
+
+
+def test_computed_and_deprecated_members_are_dropped():
+    params = cookie_params([{
+            'name': 'a', 'value': '1', 'domain': 'a.test', 'size': 2,
+            'session': False, 'expires': 2000000000, 'sameParty': False,
+            'sourceScheme': 'Secure', 'priority': 'Medium'}])
+    assert params == [{
+            'name': 'a', 'value': '1', 'domain': 'a.test',
+            'expires': 2000000000, 'sourceScheme': 'Secure',
+            'priority': 'Medium'}]
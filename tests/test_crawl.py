@@ -0,0 +1,53 @@
+import json
+
+from chromeremote.crawl import CrawlSummary, Manifest, crawl, page_dir
+
+
+def test_page_dir():
+    assert page_dir('http://A.test:8080/x?y').startswith('a.test-')
+    assert page_dir('http://a.test/1') != page_dir('http://a.test/2')
+    assert page_dir('about:blank').startswith('page-')
+
+
+def test_manifest_resumes(tmp_path):
+    path = str(tmp_path / 'manifest.ndjson')
+    manifest = Manifest(path)
+    manifest.add({'url': 'http://a.test/', 'status': 'ok'})
+    manifest.add({'url': 'http://b.test/', 'status': 'failed'})
+    manifest.close()
+    # a crash while writing the third result
+    with open(path, 'a') as f:
+        f.write('{"url":"http://c.te')
+
+    manifest = Manifest(path)
+    assert manifest.done('http://a.test/')
+    assert manifest.done('http://b.test/')
+    assert not manifest.done('http://b.test/', retry_failed=True)
+    assert not manifest.done('http://c.test/')
+    manifest.add({'url': 'http://c.test/', 'status': 'ok'})
+    manifest.close()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert json.loads(lines[-1])['url'] == 'http://c.test/'
+    assert Manifest(path).done('http://c.test/')
+
+
+def test_nothing_left_to_crawl(tmp_path):
+    manifest = Manifest(str(tmp_path / 'manifest.ndjson'))
+    manifest.add({'url': 'http://a.test/', 'status': 'ok'})
+    manifest.close()
+    summary = crawl(['http://a.test/', '', 'http://a.test/'],
+                    str(tmp_path), chrome_bin='chrome')
+    assert summary.skipped == 1
+    assert not summary.results
+
+
+def test_summary():
+    results = [{'status': 'ok', 'seconds': s} for s in (1, 2, 3)]
+    results.append({'status': 'timeout', 'seconds': 10})
+    summary = CrawlSummary(results, 2, 8.0, 2).as_dict()
+    assert summary['ok'] == 3
+    assert summary['failed'] == 1
+    assert summary['pages_per_second'] == 0.5
+    assert summary['median_page_seconds'] == 2.5
+    assert summary['p95_page_seconds'] == 10
@@ -0,0 +1,53 @@
+import pytest
+
+from chromeremote.deadline import Budget, DeadlineExceeded
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_unlimited():
+    budget = Budget(None)
+    assert budget.remaining() is None
+    assert budget.timeout(5) == 5
+    assert budget.timeout() is None
+    assert not budget.expired()
+
+
+def test_timeout_is_capped_by_the_budget():
+    clock = Clock()
+    budget = Budget(10, clock=clock)
+    assert budget.timeout(3) == 3
+    clock.now += 8
+    assert budget.timeout(3) == 2
+    assert budget.remaining() == 2
+
+
+def test_sub_budget_ends_with_its_parent():
+    clock = Clock()
+    page = Budget(10, 'page', clock=clock)
+    wait = page.sub(30, 'wait')
+    assert wait.deadline == page.deadline
+    short = page.sub(2, 'screenshot')
+    clock.now += 3
+    assert short.expired()
+    assert short.exceeded() is short
+    clock.now += 10
+    with pytest.raises(DeadlineExceeded) as error:
+        wait.check()
+    # the page budget is to blame, not the wait
+    assert error.value.budget is page
+
+
+def test_remaining_is_never_negative():
+    clock = Clock()
+    budget = Budget(1, clock=clock)
+    clock.now += 5
+    assert budget.remaining() == 0
+    assert budget.timeout(3) == 0
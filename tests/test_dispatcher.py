@@ -0,0 +1,130 @@
+import collections
+import json
+
+import pytest
+import websocket
+
+from chromeremote.dispatcher import (
+        CommandDispatcher, CommandError, CommandTimeout)
+
+
+class FakeSocket(object):
+    """ Answers nothing by itself: frames are queued with feed(). """
+
+    def __init__(self):
+        self.sent = []
+        self.frames = collections.deque()
+        self.timeout = 1
+
+    def feed(self, **message):
+        self.frames.append(json.dumps(message, separators=(',', ':')))
+
+    def send(self, text):
+        self.sent.append(json.loads(text))
+
+    def recv(self):
+        if not self.frames:
+            raise websocket.WebSocketTimeoutException('no frame')
+        return self.frames.popleft()
+
+    def gettimeout(self):
+        return self.timeout
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+
+@pytest.fixture
+def soc():
+    return FakeSocket()
+
+
+def test_responses_go_to_their_future(soc):
+    dispatcher = CommandDispatcher(soc)
+    first = dispatcher.send('A.first')
+    second = dispatcher.send('A.second', {'x': 1})
+    assert [m['id'] for m in soc.sent] == [first.id, second.id]
+    assert soc.sent[1]['params'] == {'x': 1}
+    soc.feed(id=second.id, result={'n': 2})
+    soc.feed(id=first.id, result={'n': 1})
+    assert first.result() == {'n': 1}
+    assert second.done()
+    assert second.result() == {'n': 2}
+
+
+def test_error_response_raises(soc):
+    dispatcher = CommandDispatcher(soc)
+    future = dispatcher.send('A.fail')
+    soc.feed(id=future.id, error={'message': 'nope'})
+    with pytest.raises(CommandError):
+        future.result()
+
+
+def test_timeout_cancels(soc):
+    dispatcher = CommandDispatcher(soc)
+    future = dispatcher.send('A.slow')
+    with pytest.raises(CommandTimeout):
+        future.wait(0.05)
+    assert future.id not in dispatcher.pending
+    # a late response is dropped
+    soc.feed(id=future.id, result={})
+    dispatcher.pump(0.05)
+
+
+def test_events_are_buffered_and_subscribed(soc):
+    dispatcher = CommandDispatcher(soc)
+    seen = []
+    dispatcher.subscribe(
+            'Network.', lambda message: seen.append(message['method']))
+    soc.feed(method='Network.dataReceived', params={})
+    soc.feed(method='Page.loadEventFired', params={})
+    assert dispatcher.next_event(1)['method'] == 'Network.dataReceived'
+    assert dispatcher.next_event(1)['method'] == 'Page.loadEventFired'
+    assert seen == ['Network.dataReceived']
+
+
+def test_clear_events(soc):
+    dispatcher = CommandDispatcher(soc)
+    soc.feed(method='Page.loadEventFired', params={})
+    soc.feed(method='Network.dataReceived', params={})
+    dispatcher.pump(0.05)
+    dispatcher.pump(0.05)
+    assert dispatcher.clear_events() == 2
+    with pytest.raises(websocket.WebSocketTimeoutException):
+        dispatcher.next_event(0.05)
+
+
+def test_sessions_get_their_own_events(soc):
+    dispatcher = CommandDispatcher(soc, codec='json')
+    one = dispatcher.session('S1')
+    two = dispatcher.session('S2')
+    assert dispatcher.session('S1') is one
+    soc.feed(method='Page.loadEventFired', params={}, sessionId='S2')
+    soc.feed(method='Page.frameNavigated', params={}, sessionId='S1')
+    soc.feed(method='Target.targetCreated', params={})
+    assert one.next_event(1)['method'] == 'Page.frameNavigated'
+    assert two.next_event(1)['method'] == 'Page.loadEventFired'
+    assert dispatcher.next_event(1)['method'] == 'Target.targetCreated'
+
+
+def test_session_commands_carry_the_session(soc):
+    dispatcher = CommandDispatcher(soc, codec='json')
+    session = dispatcher.session('S1')
+    future = session.send('Page.navigate', {'url': 'about:blank'})
+    assert soc.sent[-1]['sessionId'] == 'S1'
+    responses = []
+    session.add_listener(lambda frame, method: responses.append(method))
+    soc.feed(id=future.id, result={}, sessionId='S1')
+    assert future.result() == {}
+    assert responses == ['Page.navigate']
+
+
+def test_closed_session_cancels_its_commands(soc):
+    dispatcher = CommandDispatcher(soc, codec='json')
+    session = dispatcher.session('S1')
+    mine = session.send('A.b')
+    other = dispatcher.send('A.c')
+    session.close()
+    assert mine.done()
+    assert not other.done()
+    assert 'S1' not in dispatcher.sessions
@@ -0,0 +1,81 @@
+import gzip
+import json
+
+import pytest
+
+from chromeremote.event_log import EventLog
+
+
+EVENT = {'method': 'Network.requestWillBeSent', 'params': {}}
+SHOT = {'id': 3, 'result': {'data': 'aGVsbG8='}}
+
+
+def read_lines(path, opener=open):
+    with opener(path, 'rt') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_writes_one_line_per_message(tmp_path):
+    log = EventLog(str(tmp_path / 'chromelog.ndjson'))
+    log.write(EVENT)
+    log.write({'id': 1, 'result': {}}, 'Page.navigate')
+    log.close()
+    assert read_lines(log.path) == [EVENT, {'id': 1, 'result': {}}]
+    assert log.written == 2
+
+
+def test_default_exclude_drops_payload_responses(tmp_path):
+    log = EventLog(str(tmp_path / 'chromelog.ndjson'))
+    log.write(SHOT, 'Page.captureScreenshot')
+    log.write({'id': 4, 'result': {}}, 'Network.getResponseBody')
+    log.write(EVENT)
+    log.close()
+    assert read_lines(log.path) == [EVENT]
+    assert list(log.recent) == [EVENT]
+
+
+def test_include_prefix():
+    log = EventLog(include=['Page.'], exclude=None)
+    assert log.wants('Page.loadEventFired')
+    assert not log.wants('Network.requestWillBeSent')
+    assert not log.wants(None)
+
+
+def test_reopen_appends(tmp_path):
+    log = EventLog(str(tmp_path / 'chromelog.ndjson'))
+    log.write(EVENT)
+    log.close()
+    log.write(EVENT)
+    log.close()
+    assert len(read_lines(log.path)) == 2
+
+
+def test_gzip(tmp_path):
+    log = EventLog(str(tmp_path / 'chromelog.ndjson'), compression='gzip')
+    assert log.path.endswith('.ndjson.gz')
+    log.write(EVENT)
+    log.close()
+    assert read_lines(log.path, gzip.open) == [EVENT]
+
+
+def test_zstd(tmp_path):
+    zstandard = pytest.importorskip('zstandard')
+    log = EventLog(str(tmp_path / 'chromelog.ndjson'), compression='zstd')
+    log.write(EVENT)
+    log.close()
+    with open(log.path, 'rb') as f:
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(
+                f.read())
+    assert json.loads(data.decode('utf-8')) == EVENT
+
+
+def test_unknown_compression():
+    with pytest.raises(ValueError):
+        EventLog(compression='bz2')
+
+
+def test_recent_is_bounded():
+    log = EventLog(buffer_size=2)
+    for n in range(5):
+        log.write({'method': 'Page.frameNavigated', 'n': n})
+    assert [message['n'] for message in log.recent] == [3, 4]
@@ -0,0 +1,49 @@
+import json
+
+from chromeremote.har import HarWriter
+
+
+def event(method, **params):
+    return {'method': method, 'params': params}
+
+
+def test_har_file(tmp_path):
+    path = tmp_path / 'page.har'
+    har = HarWriter(str(path), title='http://a.test/')
+    har.handle_event(event(
+            'Network.requestWillBeSent', requestId='1', timestamp=10.0,
+            wallTime=1500000000.0, type='Document',
+            request={'url': 'http://a.test/?q=1', 'method': 'GET',
+                     'headers': {'Accept': '*/*'}}))
+    har.handle_event(event(
+            'Network.responseReceived', requestId='1', timestamp=10.2,
+            response={'status': 200, 'statusText': 'OK',
+                      'mimeType': 'text/html', 'protocol': 'h2',
+                      'headers': {'Content-Type': 'text/html'},
+                      'encodedDataLength': 100}))
+    har.handle_event(event(
+            'Network.dataReceived', requestId='1', dataLength=500))
+    har.handle_event(event(
+            'Network.loadingFinished', requestId='1', timestamp=10.5,
+            encodedDataLength=600))
+    har.handle_event(event(
+            'Network.requestWillBeSent', requestId='2', timestamp=10.6,
+            wallTime=1500000000.6, type='Script',
+            request={'url': 'http://a.test/app.js', 'headers': {}}))
+    har.handle_event(event('Page.loadEventFired', timestamp=11.0))
+    assert not har.handle_event(event('Page.frameNavigated'))
+    har.close()
+
+    log = json.loads(path.read_text())['log']
+    assert log['version'] == '1.2'
+    first, second = log['entries']
+    assert first['request']['queryString'] == [{'name': 'q', 'value': '1'}]
+    assert first['response']['httpVersion'] == 'HTTP/2'
+    assert first['response']['content']['size'] == 500
+    assert first['response']['bodySize'] == 500
+    assert first['_transferSize'] == 600
+    assert first['timings']['wait'] == 200
+    assert first['timings']['receive'] == 300
+    assert second['_incomplete']
+    assert log['pages'][0]['pageTimings']['onLoad'] == 1000
+    assert log['pages'][0]['startedDateTime'].startswith('2017-07-14')
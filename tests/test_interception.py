@@ -0,0 +1,114 @@
+import pytest
+
+from chromeremote.interception import BlockingPolicy, RequestInterceptor
+from chromeremote.request_tracker import RequestTracker
+
+
+MB = 1024 * 1024
+
+
+def paused(resource_type, url='http://a.test/x', request_id='interception-1',
+           network_id='1', **params):
+    params.update({
+            'requestId': request_id,
+            'networkId': network_id,
+            'resourceType': resource_type,
+            'request': {'url': url},
+    })
+    return {'method': 'Fetch.requestPaused', 'params': params}
+
+
+def response(resource_type, size=None, **params):
+    headers = []
+    if size is not None:
+        headers.append({'name': 'Content-Length', 'value': str(size)})
+    return paused(resource_type, responseStatusCode=200,
+                  responseHeaders=headers, **params)
+
+
+def interceptor(policy, tracker=None):
+    sent = []
+    return RequestInterceptor(
+            policy, lambda method, params: sent.append((method, params)),
+            tracker), sent
+
+
+def test_unknown_resource_type():
+    with pytest.raises(ValueError):
+        BlockingPolicy(resource_types=['Video'])
+    with pytest.raises(ValueError):
+        BlockingPolicy(max_response_size=MB, size_limit_types=['Video'])
+
+
+def test_url_patterns_need_no_fetch():
+    blocker, sent = interceptor(BlockingPolicy(url_patterns=['*.mp4']))
+    assert blocker.commands() == [
+            ('Network.setBlockedURLs', {'urls': ['*.mp4']})]
+
+
+def test_size_limit_only_pauses_large_types():
+    policy = BlockingPolicy(
+            resource_types=['Font'], max_response_size=MB)
+    patterns = policy.fetch_patterns()
+    assert {'urlPattern': '*', 'resourceType': 'Font',
+            'requestStage': 'Request'} in patterns
+    response_types = [p['resourceType'] for p in patterns
+                      if p['requestStage'] == 'Response']
+    assert response_types == ['Image', 'Media', 'Other']
+    assert all('resourceType' in p for p in patterns)
+
+
+def test_blocks_resource_type():
+    tracker = RequestTracker()
+    blocker, sent = interceptor(
+            BlockingPolicy(resource_types=['Image']), tracker)
+    blocker.on_request_paused(paused('Image'))
+    blocker.on_request_paused(paused('Script', request_id='interception-2'))
+    assert sent == [
+            ('Fetch.failRequest', {'requestId': 'interception-1',
+                                   'errorReason': 'BlockedByClient'}),
+            ('Fetch.continueRequest', {'requestId': 'interception-2'}),
+    ]
+    assert blocker.blocked == 1
+    tracker.handle_event({
+            'method': 'Network.requestWillBeSent',
+            'params': {'requestId': '1',
+                       'request': {'url': 'http://a.test/x'}},
+    })
+    tracker.handle_event({
+            'method': 'Network.loadingFailed',
+            'params': {'requestId': '1',
+                       'errorText': 'net::ERR_BLOCKED_BY_CLIENT'},
+    })
+    assert tracker.get('1').blocked_reason == 'resource type'
+
+
+def test_blocks_large_responses():
+    blocker, sent = interceptor(BlockingPolicy(max_response_size=MB))
+    assert blocker.block_reason(
+            response('Media', 2 * MB)['params']) == 'size'
+    assert blocker.block_reason(
+            response('Media', MB)['params']) is None
+    assert blocker.block_reason(response('Media')['params']) is None
+    # paused for another reason, e.g. body streaming
+    assert blocker.block_reason(
+            response('Document', 2 * MB)['params']) is None
+
+
+def test_custom_size_limit_types():
+    blocker, sent = interceptor(BlockingPolicy(
+            max_response_size=MB, size_limit_types=['Script']))
+    assert [p['resourceType'] for p in blocker.fetch_patterns()] == [
+            'Script']
+    assert blocker.block_reason(
+            response('Script', 2 * MB)['params']) == 'size'
+    assert blocker.block_reason(
+            response('Image', 2 * MB)['params']) is None
+
+
+def test_no_size_limit():
+    blocker, sent = interceptor(BlockingPolicy(resource_types=['Media']))
+    assert blocker.block_reason(
+            response('Image', 100 * MB)['params']) is None
+    assert blocker.block_reason(paused('Media')['params']) \
+        == 'resource type'
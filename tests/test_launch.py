@@ -0,0 +1,69 @@
+import sys
+
+import pytest
+
+from chromeremote import ChromeBrowser, LaunchProfile
+from chromeremote.launch import PRESETS, launch_profile
+
+
+def test_default_preset_adds_nothing():
+    assert LaunchProfile().args() == []
+
+
+def test_presets():
+    fast = LaunchProfile('fast').args()
+    assert fast == list(PRESETS['fast'])
+    assert '--disable-renderer-backgrounding' in fast
+    dense = LaunchProfile('dense').args()
+    assert '--renderer-process-limit=2' in dense
+    assert '--disable-background-networking' in dense
+    with pytest.raises(ValueError):
+        LaunchProfile('small')
+
+
+def test_arguments_override_the_preset():
+    args = LaunchProfile(
+            'dense', renderer_process_limit=4, disk_cache_size=1024,
+            js_heap_size=128).args()
+    assert '--renderer-process-limit=4' in args
+    assert '--renderer-process-limit=2' not in args
+    assert '--disk-cache-size=1024' in args
+    assert '--js-flags=--max-old-space-size=128' in args
+    assert len(args) == len(PRESETS['dense'])
+
+
+def test_flags_come_last_and_win():
+    args = LaunchProfile(
+            'dense', renderer_process_limit=4,
+            flags=['--renderer-process-limit=8', '--lang=fr']).args()
+    assert '--renderer-process-limit=8' in args
+    assert '--renderer-process-limit=4' not in args
+    assert args[-1] == '--lang=fr'
+
+
+def test_gpu_and_sandbox():
+    assert LaunchProfile(gpu=False, sandbox=False).args() == [
+            '--disable-gpu', '--no-sandbox']
+    # already in the preset, so not repeated
+    assert LaunchProfile('fast', gpu=False).args().count(
+            '--disable-gpu') == 1
+
+
+def test_launch_profile():
+    assert launch_profile(None) is None
+    profile = LaunchProfile('fast')
+    assert launch_profile(profile) is profile
+    assert launch_profile('dense').preset == 'dense'
+
+
+def test_browser_passes_the_switches_to_chrome(tmp_path):
+    browser = ChromeBrowser(
+            socket=1, chrome_bin=sys.executable, work_dir=str(tmp_path),
+            launch=LaunchProfile('dense', flags=['--lang=fr']))
+    args = browser._chrome_args(str(tmp_path))
+    assert '--renderer-process-limit=2' in args
+    assert args[-1] == '--lang=fr'
+    plain = ChromeBrowser(
+            socket=1, chrome_bin=sys.executable, work_dir=str(tmp_path))
+    assert '--renderer-process-limit=2' not in plain._chrome_args(
+            str(tmp_path))
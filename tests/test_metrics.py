@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from chromeremote.dispatcher import CommandDispatcher
+from chromeremote.metrics import Histogram, Metrics, timed
+
+
+class EchoSocket(object):
+    """ Answers every command with an empty result or, for methods
+        starting with Fail, an error. """
+
+    def __init__(self):
+        self.answers = []
+        self.timeout = 1
+
+    def send(self, text):
+        command = json.loads(text)
+        answer = {'id': command['id'], 'result': {}}
+        if command['method'].startswith('Fail'):
+            answer = {'id': command['id'], 'error': {'message': 'no'}}
+        self.answers.append(json.dumps(answer, separators=(',', ':')))
+
+    def recv(self):
+        return self.answers.pop(0)
+
+    def gettimeout(self):
+        return self.timeout
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+
+def test_histogram_buckets():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 7):
+        histogram.observe(value)
+    # a value equal to a bound is counted in that bound's bucket
+    assert histogram.counts == [2, 2, 1]
+    assert histogram.cumulative() == [
+            (0.1, 2), (1.0, 4), (float('inf'), 5)]
+    assert histogram.as_dict() == {
+            'count': 5,
+            'sum': pytest.approx(8.65),
+            'buckets': {0.1: 2, 1.0: 4, '+Inf': 5},
+    }
+
+
+def test_prometheus_export():
+    metrics = Metrics(buckets=(0.5,))
+    metrics.observe_phase('navigate', 0.25)
+    metrics.observe_phase('navigate', 2)
+    metrics.count_received('Network.dataReceived', 120)
+    metrics.count_timeout('Page.captureScreenshot')
+    lines = metrics.to_prometheus().splitlines()
+    assert '# TYPE chromeremote_phase_seconds histogram' in lines
+    assert 'chromeremote_phase_seconds_bucket' \
+        '{phase="navigate",le="0.5"} 1' in lines
+    assert 'chromeremote_phase_seconds_bucket' \
+        '{phase="navigate",le="+Inf"} 2' in lines
+    assert 'chromeremote_phase_seconds_sum{phase="navigate"} 2.25' in lines
+    assert 'chromeremote_phase_seconds_count{phase="navigate"} 2' in lines
+    assert 'chromeremote_messages_received_total' \
+        '{method="Network.dataReceived"} 1' in lines
+    assert 'chromeremote_received_bytes_total' \
+        '{method="Network.dataReceived"} 120' in lines
+    assert 'chromeremote_timeouts_total' \
+        '{name="Page.captureScreenshot"} 1' in lines
+
+
+def test_prometheus_escapes_labels():
+    metrics = Metrics()
+    metrics.count_error('a"b\\c')
+    assert 'chromeremote_errors_total{name="a\\"b\\\\c"} 1' \
+        in metrics.to_prometheus(prefix='chromeremote').splitlines()
+
+
+def test_phase_is_recorded_when_it_raises():
+    metrics = Metrics()
+    seen = []
+    metrics.add_hook(lambda kind, name, value: seen.append((kind, name)))
+    with pytest.raises(ValueError):
+        with metrics.phase('wait'):
+            raise ValueError()
+    assert metrics.phases['wait'].count == 1
+    assert seen == [('phase', 'wait')]
+
+
+def test_failing_hook_is_ignored():
+    metrics = Metrics()
+    metrics.add_hook(lambda kind, name, value: 1 / 0)
+    metrics.count_error('x')
+    assert metrics.snapshot()['errors'] == {'x': 1}
+
+
+def test_timed():
+    class Browser(object):
+        metrics = Metrics()
+
+        @timed('get_cookies')
+        def get_cookies(self):
+            return 'cookies'
+
+    assert Browser().get_cookies() == 'cookies'
+    assert Browser.metrics.phases['get_cookies'].count == 1
+
+
+def test_dispatcher_counts_messages():
+    metrics = Metrics()
+    dispatcher = CommandDispatcher(EchoSocket(), metrics=metrics)
+    dispatcher.execute('Page.enable')
+    dispatcher.send('Fail.now').wait()
+    snapshot = metrics.snapshot()
+    assert snapshot['sent'] == {'Page.enable': 1, 'Fail.now': 1}
+    assert snapshot['received'] == {'Page.enable': 1, 'Fail.now': 1}
+    assert snapshot['rtt']['Page.enable']['count'] == 1
+    assert snapshot['errors'] == {'Fail.now': 1}
@@ -0,0 +1,118 @@
+import pytest
+
+from chromeremote.pool import ChromeBrowserPool
+
+
+class StubBrowser(object):
+    """ Records what the pool does with it instead of running Chrome. """
+
+    fail_ports = ()
+    stopped = []
+
+    def __init__(self, socket, work_dir, clear_browser_data, **kwargs):
+        self.chrome_sock = socket
+        self.work_dir = work_dir
+        self.chrome_pid = None
+        self.pages_loaded = 0
+        self.tab_open = False
+        self.recycle_needed = None
+
+    def start_chrome(self):
+        self.chrome_pid = self.chrome_sock
+        if self.chrome_sock in self.fail_ports:
+            raise OSError('chrome did not start')
+
+    def is_alive(self):
+        return bool(self.chrome_pid)
+
+    def reset(self, work_dir=None):
+        if work_dir:
+            self.work_dir = work_dir
+
+    def open_page(self, isolated=False):
+        self.tab_open = True
+
+    def close_page(self):
+        self.tab_open = False
+        self.pages_loaded += 1
+
+    def flush_artifacts(self):
+        pass
+
+    def clean_chrome(self):
+        StubBrowser.stopped.append(self.chrome_sock)
+        self.chrome_pid = None
+
+
+@pytest.fixture(autouse=True)
+def stopped():
+    StubBrowser.stopped = []
+    return StubBrowser.stopped
+
+
+def test_page_hands_out_and_restarts(tmp_path, stopped):
+    pool = ChromeBrowserPool(
+            size=1, base_port=9500, pages_per_browser=2,
+            work_dir=str(tmp_path), browser_class=StubBrowser)
+    with pool:
+        with pool.page(str(tmp_path / 'job-1')) as browser:
+            assert browser.tab_open
+            assert browser.work_dir == str(tmp_path / 'job-1')
+        assert not browser.tab_open
+        with pool.page() as same:
+            assert same is browser
+        with pool.page() as restarted:
+            assert restarted is not browser
+    assert pool.restarts == 1
+    assert stopped == [9500, 9500]
+    assert pool.browsers == {}
+
+
+def test_browser_over_its_resource_limits_is_recycled(tmp_path):
+    pool = ChromeBrowserPool(
+            size=1, work_dir=str(tmp_path), browser_class=StubBrowser)
+    with pool:
+        with pool.page() as browser:
+            browser.recycle_needed = 'RSS of 900 MiB over 800 MiB'
+        with pool.page() as other:
+            assert other is not browser
+            assert other.recycle_needed is None
+    assert pool.restarts == 1
+
+
+def test_failed_job_restarts_browser(tmp_path):
+    pool = ChromeBrowserPool(
+            size=1, work_dir=str(tmp_path), browser_class=StubBrowser)
+    with pytest.raises(ValueError):
+        with pool.page() as browser:
+            raise ValueError('job failed')
+    with pool.page() as other:
+        assert other is not browser
+    pool.close()
+
+
+def test_close_drains_idle_browsers(tmp_path, stopped):
+    pool = ChromeBrowserPool(
+            size=2, base_port=9500, work_dir=str(tmp_path),
+            browser_class=StubBrowser)
+    pool.start()
+    pool.close()
+    assert pool._idle.empty()
+    assert sorted(stopped) == [9500, 9501]
+    with pool.page() as browser:
+        assert browser.is_alive()
+    assert pool._idle.qsize() == 2
+    pool.close()
+
+
+def test_launch_failure_is_raised(tmp_path, monkeypatch, stopped):
+    monkeypatch.setattr(StubBrowser, 'fail_ports', (9501,))
+    pool = ChromeBrowserPool(
+            size=2, base_port=9500, work_dir=str(tmp_path),
+            browser_class=StubBrowser)
+    with pytest.raises(OSError):
+        pool.start()
+    assert sorted(stopped) == [9500, 9501]
+    assert pool.browsers == {}
+    assert pool._idle.empty()
+    assert not pool._started
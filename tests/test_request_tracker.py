@@ -0,0 +1,86 @@
+from chromeremote.chrome_browser import Request as OldRequest, dict_intval
+from chromeremote.request_tracker import Request, RequestTracker
+
+
+def event(method, **params):
+    return {'method': method, 'params': params}
+
+
+def sent(request_id, url, redirect_status=None):
+    params = {'requestId': request_id, 'request': {'url': url}}
+    if redirect_status is not None:
+        params['redirectResponse'] = {'status': redirect_status}
+    return event('Network.requestWillBeSent', **params)
+
+
+def test_redirect_chain():
+    tracker = RequestTracker()
+    tracker.handle_event(sent('1', 'http://a.test/'))
+    tracker.handle_event(sent('1', 'http://a.test/b', 301))
+    tracker.handle_event(sent('1', 'http://a.test/c', 302))
+    tracker.handle_event(event(
+            'Network.responseReceived', requestId='1',
+            response={'mimeType': 'text/html', 'status': 200,
+                      'headers': {'content-length': '5'}}))
+    tracker.handle_event(event('Network.loadingFinished', requestId='1'))
+    request = tracker.get('1')
+    chain = request.chain()
+    assert [r.url for r in chain] == [
+            'http://a.test/', 'http://a.test/b', 'http://a.test/c']
+    assert [r.status_code for r in chain] == [301, 302, 200]
+    assert all(r.complete for r in chain)
+    assert request.content_length == 5
+    assert tracker.redirected() == [request]
+    assert not tracker.open
+
+
+def test_failed():
+    tracker = RequestTracker()
+    tracker.handle_event(sent('1', 'http://a.test/ad.js'))
+    tracker.handle_event(event(
+            'Network.loadingFailed', requestId='1',
+            errorText='net::ERR_CONNECTION_REFUSED'))
+    request = tracker.get('1')
+    assert request.failed
+    assert request.error_text == 'net::ERR_CONNECTION_REFUSED'
+    assert tracker.failed() == [request]
+
+
+def test_blocked_reason_before_and_after_failure():
+    tracker = RequestTracker()
+    tracker.handle_event(sent('1', 'http://a.test/ad.js'))
+    tracker.handle_event(sent('2', 'http://a.test/big.mp4'))
+    tracker.mark_blocked('1', 'resource type')
+    for request_id in ('1', '2'):
+        tracker.handle_event(event(
+                'Network.loadingFailed', requestId=request_id,
+                errorText='net::ERR_BLOCKED_BY_CLIENT'))
+    tracker.mark_blocked('2', 'size')
+    assert tracker.get('1').blocked_reason == 'resource type'
+    assert tracker.get('2').blocked_reason == 'size'
+    assert tracker.blocked() == [tracker.get('1'), tracker.get('2')]
+
+
+def test_blocked_by_url():
+    tracker = RequestTracker()
+    tracker.handle_event(sent('1', 'http://ads.test/'))
+    tracker.handle_event(event(
+            'Network.loadingFailed', requestId='1',
+            errorText='net::ERR_BLOCKED_BY_CLIENT',
+            blockedReason='inspector'))
+    request = tracker.get('1')
+    assert request.blocked
+    assert request.blocked_reason == 'inspector'
+
+
+def test_data_urls_are_left_out():
+    tracker = RequestTracker()
+    tracker.handle_event(sent('1', 'data:image/png;base64,AAAA'))
+    tracker.handle_event(sent('2', 'http://a.test/'))
+    assert [r.id for r in tracker.all()] == ['2']
+    assert len(tracker.all(include_data=True)) == 2
+
+
+def test_old_imports():
+    assert OldRequest is Request
+    assert dict_intval('Content-Length', {'content-length': '3'}) == 3
@@ -0,0 +1,108 @@
+import os
+import shutil
+
+import pytest
+
+from chromeremote.resources import (
+        CLOCK_TICKS, PAGE_SIZE, ProcessTreeSampler, ResourceLimits,
+        ResourceMonitor)
+
+# stat files of chrome (100), a renderer in its session (101) and an
+# unrelated shell (200)
+PROC = os.path.join(os.path.dirname(__file__), 'data', 'proc')
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def set_ticks(proc, pid, utime, stime):
+    path = os.path.join(proc, str(pid), 'stat')
+    with open(path) as f:
+        stat = f.read()
+    head, fields = stat[:stat.rfind(')') + 2], stat[stat.rfind(')') + 2:]
+    fields = fields.split()
+    fields[11], fields[12] = str(utime), str(stime)
+    with open(path, 'w') as f:
+        f.write(head + ' '.join(fields) + '\n')
+
+
+def test_sample_sums_the_session_of_chrome():
+    sample = ProcessTreeSampler(100, proc=PROC).sample()
+    assert sample.processes == 2
+    assert sample.rss == (2560 + 1024) * PAGE_SIZE
+    assert sample.cpu_seconds == (150 + 50 + 300 + 100) / CLOCK_TICKS
+    assert sample.cpu_percent is None
+
+
+def test_cpu_percent_since_the_previous_sample(tmp_path):
+    proc = str(tmp_path / 'proc')
+    shutil.copytree(PROC, proc)
+    clock = Clock()
+    sampler = ProcessTreeSampler(100, proc=proc, clock=clock)
+    sampler.sample()
+    clock.now += 10
+    set_ticks(proc, 101, 300 + 5 * CLOCK_TICKS, 100)
+    assert sampler.sample().cpu_percent == pytest.approx(50)
+
+
+def test_exited_processes_are_skipped(tmp_path):
+    proc = str(tmp_path / 'proc')
+    shutil.copytree(PROC, proc)
+    os.remove(os.path.join(proc, '101', 'stat'))
+    sample = ProcessTreeSampler(100, proc=proc).sample()
+    assert sample.processes == 1
+    assert sample.rss == 2560 * PAGE_SIZE
+
+
+def test_no_proc(tmp_path):
+    sample = ProcessTreeSampler(100, proc=str(tmp_path / 'none')).sample()
+    assert sample.processes == 0
+    assert sample.rss == 0
+
+
+def test_limits():
+    sample = ProcessTreeSampler(100, proc=PROC).sample()
+    assert ResourceLimits().exceeded(sample) is None
+    assert 'RSS' in ResourceLimits(max_rss=PAGE_SIZE).exceeded(sample)
+    assert ResourceLimits(max_cpu=50).exceeded(sample, 20) is None
+    assert 'CPU at 80%' in ResourceLimits(max_cpu=50).exceeded(sample, 80)
+    with pytest.raises(ValueError):
+        ResourceLimits(action='restart')
+
+
+def test_monitor_samples_every_interval():
+    clock = Clock()
+    monitor = ResourceMonitor(
+            100, ResourceLimits(max_rss=PAGE_SIZE, interval=2), clock=clock)
+    monitor.sampler.proc = PROC
+    assert 'RSS' in monitor.check()
+    first = monitor.last
+    clock.now += 1
+    assert monitor.check() is None
+    assert monitor.last is first
+    clock.now += 1
+    assert monitor.check() is not None
+    assert monitor.last is not first
+
+
+def test_monitor_averages_cpu_over_the_window(tmp_path):
+    proc = str(tmp_path / 'proc')
+    shutil.copytree(PROC, proc)
+    clock = Clock()
+    monitor = ResourceMonitor(
+            100, ResourceLimits(max_cpu=50, interval=1, cpu_window=10),
+            clock=clock)
+    monitor.sampler.proc = proc
+    assert monitor.check() is None
+    # a busy core for 5s, then idle: 100% over the first 5s, 50% over 10s
+    clock.now += 5
+    set_ticks(proc, 101, 300 + 5 * CLOCK_TICKS, 100)
+    assert 'CPU at 100%' in monitor.check()
+    clock.now += 5
+    assert monitor.check() is None
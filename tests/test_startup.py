@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+import pytest
+
+from chromeremote.chrome_browser import ChromeBrowser, ChromeStartupError
+
+
+def browser(tmp_path, **kwargs):
+    return ChromeBrowser(
+            socket=1, chrome_bin=sys.executable, work_dir=str(tmp_path),
+            **kwargs)
+
+
+def test_startup_delay_is_the_old_name_of_startup_timeout(tmp_path):
+    assert browser(tmp_path).startup_timeout == 30
+    with pytest.warns(DeprecationWarning):
+        old = browser(tmp_path, startup_delay=4)
+    assert old.startup_timeout == 4
+
+
+def test_exit_during_startup(tmp_path):
+    chrome = browser(tmp_path)
+    chrome.chrome_process = subprocess.Popen([sys.executable, '-c', ''])
+    chrome.chrome_process.wait()
+    with pytest.raises(ChromeStartupError, match='exited'):
+        chrome._wait_until_ready()
+
+
+def test_not_ready_in_time(tmp_path):
+    chrome = browser(tmp_path, startup_timeout=0.1)
+    chrome.chrome_process = subprocess.Popen(
+            [sys.executable, '-c', 'import time; time.sleep(10)'],
+            start_new_session=True)
+    chrome.chrome_pid = chrome.chrome_process.pid
+    with pytest.raises(ChromeStartupError, match='not ready'):
+        chrome._wait_until_ready()
+    assert chrome.chrome_process.poll() is not None
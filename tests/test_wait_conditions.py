@@ -0,0 +1,89 @@
+import pytest
+
+from chromeremote.chrome_browser import ChromeBrowser
+from chromeremote.wait_conditions import (
+        AllOf, LoadEvent, NetworkIdle, Predicate, make_condition)
+
+
+LOAD = {'method': 'Page.loadEventFired', 'params': {}}
+
+
+class Browser(object):
+
+    def __init__(self, open_requests=0):
+        self.open_requests = ['r{}'.format(n) for n in range(open_requests)]
+
+
+def test_names():
+    assert isinstance(make_condition('load'), LoadEvent)
+    assert make_condition('networkidle2').max_inflight == 2
+    assert make_condition('networkIdle0').max_inflight == 0
+    assert isinstance(make_condition(lambda browser, event: True), Predicate)
+    with pytest.raises(ValueError):
+        make_condition('idle')
+    with pytest.raises(TypeError):
+        make_condition(3)
+
+
+def test_default_is_networkidle2(tmp_path):
+    browser = ChromeBrowser(chrome_bin='chrome', work_dir=str(tmp_path))
+    assert browser.wait_until == 'networkidle2'
+
+
+def test_load_event():
+    condition = LoadEvent()
+    condition.start(Browser(), 0)
+    assert not condition.done(Browser(), 0)
+    condition.on_event(LOAD, 1)
+    assert condition.done(Browser(), 1)
+
+
+def test_network_idle_waits_for_quiet_window():
+    condition = NetworkIdle(idle_time=0.5, max_inflight=2)
+    condition.start(Browser(), 0)
+    assert not condition.done(Browser(3), 0)
+    assert condition.next_check(0) is None
+    assert not condition.done(Browser(2), 1)
+    assert condition.next_check(1.2) == pytest.approx(0.3)
+    assert not condition.done(Browser(3), 1.2)
+    assert not condition.done(Browser(0), 1.3)
+    assert condition.done(Browser(0), 1.8)
+
+
+def test_network_idle_gives_up_after_load():
+    condition = NetworkIdle(idle_time=0.5, after_load=5.0)
+    busy = Browser(1)
+    condition.start(busy, 0)
+    condition.on_event(LOAD, 2)
+    assert not condition.done(busy, 6.9)
+    assert condition.next_check(6.9) == pytest.approx(0.1)
+    assert condition.done(busy, 7)
+
+
+def test_network_idle_without_after_load():
+    condition = NetworkIdle(after_load=None)
+    busy = Browser(1)
+    condition.start(busy, 0)
+    condition.on_event(LOAD, 0)
+    assert not condition.done(busy, 60)
+    assert condition.next_check(60) is None
+
+
+def test_all_of():
+    condition = AllOf('load', NetworkIdle(idle_time=0))
+    condition.start(Browser(), 0)
+    assert not condition.done(Browser(), 0)
+    condition.on_event(LOAD, 1)
+    assert condition.done(Browser(), 1)
+
+
+def test_predicate_sees_events():
+    seen = []
+    condition = Predicate(
+            lambda browser, event: seen.append(event) or event == LOAD)
+    condition.start(Browser(), 0)
+    condition.on_event({'method': 'Network.dataReceived'}, 0)
+    assert not condition.done(Browser(), 0)
+    condition.on_event(LOAD, 1)
+    assert condition.done(Browser(), 1)
+    assert seen[0] is None